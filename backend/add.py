@@ -1,7 +1,6 @@
 import sqlite3
 
-conn = sqlite3.connect("study.db")
-cursor = conn.cursor()
+from config import settings
 
 subjects = [
     "Mathematics",
@@ -22,14 +21,18 @@ subjects = [
     "Computer Science",
 ]
 
-for name in subjects:
-    try:
-        cursor.execute("INSERT INTO subjects (name) VALUES (?)", (name,))
-        print(f"Added: {name}")
-    except sqlite3.IntegrityError:
-        print(f"Already exists: {name}")
+if __name__ == "__main__":
+    conn = sqlite3.connect(settings.db_path)
+    cursor = conn.cursor()
 
-conn.commit()
-conn.close()
+    for name in subjects:
+        try:
+            cursor.execute("INSERT INTO subjects (name) VALUES (?)", (name,))
+            print(f"Added: {name}")
+        except sqlite3.IntegrityError:
+            print(f"Already exists: {name}")
 
-print("Done.")
\ No newline at end of file
+    conn.commit()
+    conn.close()
+
+    print("Done.")
\ No newline at end of file
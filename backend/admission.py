@@ -0,0 +1,204 @@
+# admission.py
+#
+# Admission control in front of every route, so a burst is turned away at
+# the door instead of piling up in the threadpool behind SQLite's lock.
+#
+# A request is let in when a slot is free under all of:
+#   - the global limit, settings.admission_max_in_flight (0 disables this module)
+#   - its class budget: settings.admission_max_writes for POST/PUT/PATCH/
+#     DELETE (SQLite has one writer per file), admission_max_reads otherwise
+# Otherwise it waits in its class's FIFO queue until a slot frees up or its
+# deadline (admission_queue_timeout_ms) passes. A full queue (each class
+# holds up to admission_max_queued, so a read burst cannot crowd out
+# writes) or a missed deadline is answered 503 with Retry-After. Waiting is
+# bounded and so is the work in flight, so admitted requests keep their
+# latency when offered load exceeds capacity.
+#
+# Requests carrying X-User-Id also draw from that user's token bucket
+# (admission_user_rate per second, admission_user_burst deep); an empty
+# bucket is answered 429 with Retry-After before the request queues.
+# Requests without it are only subject to the limits above.
+#
+# State is per worker process and lives on the event loop thread, so it
+# needs no locks. Outcomes are exported on /metrics (admission_*).
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+
+import metrics
+from config import settings
+
+EXEMPT_PATHS = {"/metrics", "/docs", "/openapi.json"}
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# POST, but no database write: /login only reads (password hashing has its own
+# limit, auth.py), a timer heartbeat only touches memory (timers.py)
+READ_PATHS = {"/login", "/timers/heartbeat"}
+MAX_BUCKETS = 10_000
+
+
+class QueueFull(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Limiter:
+    """Global in-flight limit with per-class budgets and bounded FIFO wait queues."""
+
+    def __init__(self, total: int, budgets: Dict[str, int], max_queued: int):
+        self.total = total
+        self.budgets = budgets
+        self.max_queued = max_queued
+        self.active = 0
+        self.in_use = {kind: 0 for kind in budgets}
+        self.queues: Dict[str, Deque[Tuple[float, asyncio.Future]]] = {kind: deque() for kind in budgets}
+
+    def queued(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def _fits(self, kind: str) -> bool:
+        return self.active < self.total and self.in_use[kind] < self.budgets[kind]
+
+    def _take(self, kind: str):
+        self.active += 1
+        self.in_use[kind] += 1
+
+    async def acquire(self, kind: str, timeout: float):
+        queue = self.queues[kind]
+        if not queue and self._fits(kind):
+            self._take(kind)
+            return
+        if len(queue) >= self.max_queued:
+            raise QueueFull()
+
+        entry = (time.monotonic(), asyncio.get_running_loop().create_future())
+        queue.append(entry)
+        try:
+            await asyncio.wait_for(entry[1], timeout)
+        except asyncio.TimeoutError:
+            if entry[1].done() and not entry[1].cancelled():
+                return  # handed a slot just as the wait ran out: keep it
+            if entry in queue:
+                queue.remove(entry)  # release() may already have dropped it
+            raise DeadlineExceeded()
+        except asyncio.CancelledError:
+            # The client went away while waiting; give back a slot handed over meanwhile
+            if entry[1].done() and not entry[1].cancelled():
+                self.release(kind)
+            elif entry in queue:
+                queue.remove(entry)
+            raise
+
+    def release(self, kind: str):
+        self.active -= 1
+        self.in_use[kind] -= 1
+        # Hand freed slots to the oldest waiters that fit
+        while self.active < self.total:
+            heads = [(q[0][0], k) for k, q in self.queues.items() if q and self.in_use[k] < self.budgets[k]]
+            if not heads:
+                break
+            _, kind = min(heads)
+            _, future = self.queues[kind].popleft()
+            if future.done():
+                continue  # timed out or cancelled; acquire() is about to give up on it
+            self._take(kind)
+            future.set_result(None)
+
+
+class TokenBuckets:
+    """Per-key token buckets, least recently seen evicted beyond MAX_BUCKETS."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str) -> Optional[float]:
+        """None if a token was taken, else the seconds until one is available."""
+        now = time.monotonic()
+        tokens, last = self.buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens >= 1:
+            self.buckets[key] = (tokens - 1, now)
+            wait = None
+        else:
+            self.buckets[key] = (tokens, now)
+            wait = (1 - tokens) / self.rate
+        if len(self.buckets) > MAX_BUCKETS:
+            self.buckets.popitem(last=False)
+        return wait
+
+
+def _user_key(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"x-user-id":
+            return value.decode("latin-1")
+    return None
+
+
+async def _reject(send, status: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+# ────────────────────────────────────────────────
+# ASGI middleware
+# ────────────────────────────────────────────────
+class AdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.enabled = settings.admission_max_in_flight > 0
+        self.limiter = Limiter(
+            settings.admission_max_in_flight,
+            {"read": settings.admission_max_reads, "write": settings.admission_max_writes},
+            settings.admission_max_queued,
+        )
+        self.timeout = settings.admission_queue_timeout_ms / 1000
+        self.buckets = TokenBuckets(settings.admission_user_rate, settings.admission_user_burst) \
+            if settings.admission_user_rate > 0 else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        kind = "write" if scope["method"] in WRITE_METHODS and scope["path"] not in READ_PATHS else "read"
+        user = _user_key(scope)
+        if self.buckets is not None and user is not None:
+            wait = self.buckets.take(user)
+            if wait is not None:
+                metrics.registry.admission(kind, "throttled")
+                await _reject(send, 429, "Too many requests, slow down", wait)
+                return
+
+        started = time.perf_counter()
+        try:
+            await self.limiter.acquire(kind, self.timeout)
+        except QueueFull:
+            metrics.registry.admission(kind, "queue_full")
+            await _reject(send, 503, "Server busy, try again shortly", self.timeout)
+            return
+        except DeadlineExceeded:
+            metrics.registry.admission(kind, "deadline", time.perf_counter() - started, self.limiter.queued())
+            await _reject(send, 503, "Server busy, try again shortly", self.timeout)
+            return
+        metrics.registry.admission(kind, "admitted", time.perf_counter() - started, self.limiter.queued())
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release(kind)
@@ -0,0 +1,215 @@
+# analytics.py
+#
+# Per-user study statistics on NumPy arrays.
+#
+# A user's sessions, hot and archived, are loaded once into three parallel
+# typed arrays sorted by day:
+#
+#   day      int32  days since 1970-01-01 (session_date's UTC day)
+#   subject  int16  subject_id
+#   minutes  int32  duration
+#
+# and every statistic is a vectorized pass over them: np.bincount for the
+# per-subject and per-day sums, a cumulative sum for the rolling average,
+# np.percentile for session lengths. The rows come from the storage layer
+# (Storage.session_days); SQLiteStorage turns hot sessions' dates into day
+# numbers in SQL (julianday), so no per-row Python parsing happens for them.
+#
+# Arrays are cached per user (settings.analytics_cache_size, least recently
+# used evicted) together with the user's data version (Storage.data_version),
+# which every session write bumps in the shard, whichever worker made it;
+# a read whose version differs reloads. A load on the caller's connection
+# sees one snapshot; any other load is cached only if the version was the
+# same before and after it, so cached arrays are exactly the sessions at
+# their version. invalidate() only frees the entry in this process early. The cached arrays don't depend on the date, so
+# windows ending today stay correct across midnight.
+#
+#   python analytics.py stats 42 --days 30     # one user's statistics as JSON
+#   python bench_analytics.py                  # against the pandas path
+import argparse
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from storage import get_storage
+
+DEFAULT_DAYS = 90
+MAX_DAYS = 3650
+ROLLING_DAYS = 7
+PERCENTILES = (50, 90, 99)
+MAX_CACHED_USERS = settings.analytics_cache_size
+
+
+class SessionArrays:
+    """One user's sessions as parallel typed arrays, sorted by day."""
+
+    def __init__(self, day: np.ndarray, subject: np.ndarray, minutes: np.ndarray):
+        order = np.argsort(day, kind="stable")
+        self.day = day[order].astype(np.int32)
+        # subject ids are small; fall back to int32 rather than wrap around
+        fits = not len(subject) or subject.max() <= np.iinfo(np.int16).max
+        self.subject = subject[order].astype(np.int16 if fits else np.int32)
+        self.minutes = minutes[order].astype(np.int32)
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+
+def load(user_id: int, db=None) -> SessionArrays:
+    """
+    Reads the user's hot and archived sessions into arrays (no cache)
+    through the storage layer; with SQLiteStorage, on `db` (a connection
+    to the user's shard, inside the caller's transaction) if given.
+    """
+    store = get_storage()
+    rows = store.session_days(user_id) if db is None else store.session_days(user_id, db)
+    columns = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    return SessionArrays(columns[:, 0], columns[:, 1], columns[:, 2])
+
+
+def _today_number() -> int:
+    # session_date is written with SQLite's datetime('now'), i.e. UTC
+    return int(np.datetime64(datetime.now(timezone.utc).date(), "D").astype(np.int64))
+
+
+def _dates(numbers: np.ndarray) -> list:
+    return numbers.astype("datetime64[D]").astype(str).tolist()
+
+
+# ────────────────────────────────────────────────
+# Statistics
+# ────────────────────────────────────────────────
+def summarize(arrays: SessionArrays, days: int = DEFAULT_DAYS, today: Optional[int] = None) -> Dict:
+    """
+    Totals over all sessions, plus daily and weekly series for the `days`
+    days ending `today` (a day number; default the current UTC day). The
+    rolling average is over the ROLLING_DAYS days ending on each day, empty
+    days included; the first week may be partial.
+    """
+    end = _today_number() if today is None else today
+    start = end - days + 1
+    day, subject, minutes = arrays.day, arrays.subject, arrays.minutes
+    count = len(arrays)
+
+    # Per subject, over all time
+    sessions_by_subject = np.bincount(subject, minlength=1)
+    minutes_by_subject = np.bincount(subject, weights=minutes, minlength=1).astype(np.int64)
+    subject_ids = np.flatnonzero(sessions_by_subject)
+    subject_ids = subject_ids[np.argsort(-minutes_by_subject[subject_ids], kind="stable")]
+
+    # Per day, with ROLLING_DAYS - 1 extra days in front for the first averages;
+    # day is sorted, so the window is one slice
+    first = start - (ROLLING_DAYS - 1)
+    lo, hi = np.searchsorted(day, [first, end + 1])
+    daily = np.bincount(day[lo:hi] - first, weights=minutes[lo:hi],
+                        minlength=end - first + 1).astype(np.int64)
+    running = np.concatenate(([0], np.cumsum(daily)))
+    rolling = (running[ROLLING_DAYS:] - running[:-ROLLING_DAYS]) / ROLLING_DAYS
+    daily = daily[ROLLING_DAYS - 1:]
+
+    # Per week (Monday first; day 0 was a Thursday)
+    window = np.arange(start, end + 1)
+    weeks = (window + 3) // 7
+    weekly = np.bincount(weeks - weeks[0], weights=daily).astype(np.int64)
+    week_starts = (weeks[0] + np.arange(len(weekly))) * 7 - 3
+
+    if count:
+        lengths = np.percentile(minutes, PERCENTILES)
+        mean = float(minutes.mean())
+    else:
+        lengths, mean = np.zeros(len(PERCENTILES)), 0.0
+
+    return {
+        "total_minutes": int(minutes.sum(dtype=np.int64)),
+        "sessions": count,
+        "active_days": int(np.count_nonzero(np.diff(day))) + 1 if count else 0,
+        "first_date": _dates(day[:1])[0] if count else None,
+        "last_date": _dates(day[-1:])[0] if count else None,
+        "session_minutes": {"mean": round(mean, 1),
+                            **{f"p{p}": round(float(v), 1) for p, v in zip(PERCENTILES, lengths)}},
+        "subjects": [
+            {"subject_id": int(s), "minutes": int(minutes_by_subject[s]), "sessions": int(sessions_by_subject[s])}
+            for s in subject_ids
+        ],
+        "daily": [
+            {"date": d, "minutes": m, "rolling_avg": round(r, 1)}
+            for d, m, r in zip(_dates(window), daily.tolist(), rolling.tolist())
+        ],
+        "weekly": [
+            {"week_start": d, "minutes": m}
+            for d, m in zip(_dates(week_starts), weekly.tolist())
+        ],
+    }
+
+
+# ────────────────────────────────────────────────
+# Per-user array cache
+# ────────────────────────────────────────────────
+_arrays: "OrderedDict[int, Tuple[int, SessionArrays]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def data_version(user_id: int, db=None) -> int:
+    store = get_storage()
+    return store.data_version(user_id) if db is None else store.data_version(user_id, db)
+
+
+def get_arrays(user_id: int, db=None) -> SessionArrays:
+    """
+    The user's cached arrays, loaded (on `db`, if given) when not cached or
+    cached under an older data version.
+    """
+    version = data_version(user_id, db)
+    with _lock:
+        entry = _arrays.get(user_id)
+        if entry is not None and entry[0] == version:
+            _arrays.move_to_end(user_id)
+            return entry[1]
+
+    arrays = load(user_id, db)
+    if db is None and data_version(user_id) != version:
+        return arrays  # a write landed during the load
+    with _lock:
+        entry = _arrays.get(user_id)
+        if entry is None or entry[0] <= version:
+            _arrays[user_id] = (version, arrays)
+            _arrays.move_to_end(user_id)
+            while len(_arrays) > MAX_CACHED_USERS:
+                _arrays.popitem(last=False)
+    return arrays
+
+
+def user_stats(user_id: int, days: int = DEFAULT_DAYS) -> Dict:
+    return summarize(get_arrays(user_id), days)
+
+
+def invalidate(user_id: int):
+    """Drop the user's arrays after a session was added, changed or removed."""
+    with _lock:
+        _arrays.pop(user_id, None)
+
+
+def invalidate_all():
+    with _lock:
+        _arrays.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-user study statistics")
+    commands = parser.add_subparsers(dest="command", required=True)
+    stats_parser = commands.add_parser("stats")
+    stats_parser.add_argument("user_id", type=int)
+    stats_parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(json.dumps(user_stats(args.user_id, args.days), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+# archive.py
+#
+# Cold tier for old study sessions.
+#
+# Sessions older than settings.archive_after_days leave study_sessions (and
+# its indexes) for two tables in the same shard file:
+#
+#   study_sessions_archive  one row per (user, month): the month's sessions
+#                           as zlib-compressed JSON columns, with their count
+#                           and minutes
+#   session_rollups         minutes and session count per (user, day,
+#                           subject), for totals that don't need the sessions
+#
+# so the hot table and its indexes hold only recent months and stay in the
+# page cache. Sessions move a few (user, month)s at a time, in short
+# transactions of about settings.archive_batch_rows sessions within the same
+# file, so a session is always in exactly one tier; a month that already
+# has an archive row (archiving runs repeatedly) is decoded, extended and
+# re-encoded.
+#
+# Full-history reads go through this module: SQLiteStorage.list_sessions
+# appends archived_sessions(), goal_progress.reconcile adds
+# archived_minutes(), and analytics.py reads decode_columns(). Each month
+# also keeps the range of its session ids, so SQLiteStorage finds an
+# archived session by id in one decoded month and edits or deletes it by
+# re-encoding that month (update_session(), delete_session()). Notes of
+# archived sessions are also kept in archived_notes, which the search index
+# covers like the hot table (search.py); a run first brings months archived
+# before either existed up to date (backfill()). The planner and the
+# leaderboards only read recent windows, which archive_after_days keeps hot.
+#
+#   python archive.py run                      # archive per settings.archive_after_days
+#   python archive.py run --older-than-days 365 --dry-run
+#   python archive.py stats
+#   python archive.py verify                   # rollups and counts against the payloads
+import argparse
+import json
+import sys
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import database
+from config import settings
+
+COLUMNS = ["id", "subject_id", "duration", "notes", "session_date"]
+
+# The planner's pace window (30 days) and the monthly leaderboards read only
+# the hot table, so they must never reach archived days
+MIN_AGE_DAYS = 60
+
+
+def encode(sessions: List[Dict]) -> bytes:
+    """Sessions as compressed JSON columns (repeated values compress well column-wise)."""
+    columns = {name: [s[name] for s in sessions] for name in COLUMNS}
+    return zlib.compress(json.dumps(columns, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_columns(payload: bytes) -> Dict[str, list]:
+    """The payload's columns as stored, for readers that want arrays rather than rows."""
+    return json.loads(zlib.decompress(payload))
+
+
+def decode(payload: bytes) -> List[Dict]:
+    columns = decode_columns(payload)
+    return [dict(zip(COLUMNS, values)) for values in zip(*(columns[name] for name in COLUMNS))]
+
+
+def cutoff_for(days: int) -> str:
+    """Sessions dated before this are archived; whole days, in session_date's format."""
+    day = datetime.now(timezone.utc).date() - timedelta(days=days)
+    return f"{day.isoformat()} 00:00:00"
+
+
+# ────────────────────────────────────────────────
+# Reading the cold tier
+# ────────────────────────────────────────────────
+def archived_sessions(cursor, user_id: int, month: Optional[str] = None) -> List[Dict]:
+    """
+    The user's archived sessions (or one 'YYYY-MM' month of them), newest
+    first, shaped like SQLiteStorage.list_sessions rows.
+    """
+    cursor.execute(
+        """
+        SELECT payload FROM study_sessions_archive
+        WHERE user_id = ? AND (? IS NULL OR month = ?)
+        ORDER BY month DESC
+        """,
+        (user_id, month, month)
+    )
+    sessions = []
+    for (payload,) in cursor.fetchall():
+        month_sessions = decode(payload)
+        month_sessions.sort(key=lambda s: (s["session_date"], s["id"]), reverse=True)
+        sessions.extend(dict(s, user_id=user_id) for s in month_sessions)
+    return sessions
+
+
+def archived_minutes(cursor, user_id: int, subject_id: int, since: str) -> int:
+    """Minutes of archived sessions of a subject dated at or after `since`."""
+    day = since[:10]
+    cursor.execute(
+        "SELECT COALESCE(SUM(minutes), 0) FROM session_rollups WHERE user_id = ? AND day > ? AND subject_id = ?",
+        (user_id, day, subject_id)
+    )
+    total = cursor.fetchone()[0]
+    # Rollups are per day; the day `since` falls on needs the sessions' times
+    cursor.execute(
+        "SELECT 1 FROM session_rollups WHERE user_id = ? AND day = ? AND subject_id = ?",
+        (user_id, day, subject_id)
+    )
+    if cursor.fetchone():
+        total += sum(
+            s["duration"] for s in archived_sessions(cursor, user_id, since[:7])
+            if s["subject_id"] == subject_id and s["session_date"] >= since
+        )
+    return total
+
+
+# ────────────────────────────────────────────────
+# Moving sessions
+# ────────────────────────────────────────────────
+def archive_month(cursor, user_id: int, month: str, cutoff: str) -> int:
+    """Moves the user's hot sessions of `month` dated before `cutoff`; the caller commits."""
+    cursor.execute(
+        f"""
+        SELECT {', '.join(COLUMNS)} FROM study_sessions
+        WHERE user_id = ? AND session_date >= ? AND session_date < MIN(?, ?)
+        """,
+        (user_id, f"{month}-01", _next_month(month), cutoff)
+    )
+    sessions = [dict(row) for row in cursor.fetchall()]
+    if not sessions:
+        return 0
+
+    cursor.execute("SELECT payload FROM study_sessions_archive WHERE user_id = ? AND month = ?", (user_id, month))
+    row = cursor.fetchone()
+    _store_month(cursor, user_id, month, (decode(row[0]) if row else []) + sessions)
+
+    rollups: Dict[tuple, List[int]] = defaultdict(lambda: [0, 0])
+    for s in sessions:
+        totals = rollups[(s["session_date"][:10], s["subject_id"])]
+        totals[0] += 1
+        totals[1] += s["duration"]
+    _add_rollups(cursor, [(user_id, day, subject_id, n, minutes) for (day, subject_id), (n, minutes) in rollups.items()])
+
+    # Out of the hot search index first, then back in through archived_notes
+    cursor.executemany("DELETE FROM study_sessions WHERE id = ?", [(s["id"],) for s in sessions])
+    cursor.executemany(
+        "INSERT INTO archived_notes (id, user_id, notes) VALUES (?, ?, ?)",
+        [(s["id"], user_id, s["notes"]) for s in sessions if s["notes"]]
+    )
+    return len(sessions)
+
+
+def _store_month(cursor, user_id: int, month: str, sessions: List[Dict]):
+    """Writes a month's archive row from its sessions, or drops it once none are left."""
+    if not sessions:
+        cursor.execute("DELETE FROM study_sessions_archive WHERE user_id = ? AND month = ?", (user_id, month))
+        return
+    ids = [s["id"] for s in sessions]
+    cursor.execute(
+        """
+        INSERT OR REPLACE INTO study_sessions_archive (user_id, month, sessions, minutes, payload, min_id, max_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (user_id, month, len(sessions), sum(s["duration"] for s in sessions), encode(sessions), min(ids), max(ids))
+    )
+
+
+def _add_rollups(cursor, rows: List[tuple]):
+    """Adds (user_id, day, subject_id, sessions, minutes) to the rollups; negative counts remove sessions."""
+    cursor.executemany(
+        """
+        INSERT INTO session_rollups (user_id, day, subject_id, sessions, minutes)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, day, subject_id)
+        DO UPDATE SET sessions = sessions + excluded.sessions, minutes = minutes + excluded.minutes
+        """,
+        rows
+    )
+    cursor.executemany(
+        "DELETE FROM session_rollups WHERE user_id = ? AND day = ? AND subject_id = ? AND sessions <= 0",
+        [row[:3] for row in rows if row[3] < 0]
+    )
+
+
+def _next_month(month: str) -> str:
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year + number // 12}-{number % 12 + 1:02d}-01"
+
+
+def run(older_than_days: int, dry_run: bool = False) -> Dict:
+    cutoff = cutoff_for(older_than_days)
+    result = {"cutoff": cutoff, "shards": []}
+    for shard in range(database.SHARD_COUNT):
+        db = database.get_db(shard=shard)
+        started = time.perf_counter()
+        moved = months = 0
+        try:
+            # One pass to find the work, then short transactions of whole (user, month)s
+            todo = db.execute(
+                """
+                SELECT user_id, substr(session_date, 1, 7) AS month, COUNT(*)
+                FROM study_sessions WHERE session_date < ?
+                GROUP BY user_id, month
+                """,
+                (cutoff,)
+            ).fetchall()
+            if not dry_run and backfill(db.cursor()):
+                db.commit()
+            in_transaction = 0
+            for user_id, month, count in todo:
+                months += 1
+                if dry_run:
+                    moved += count
+                    continue
+                in_transaction += archive_month(db.cursor(), user_id, month, cutoff)
+                if in_transaction >= settings.archive_batch_rows:
+                    db.commit()
+                    moved += in_transaction
+                    in_transaction = 0
+                    time.sleep(settings.archive_pause_ms / 1000)
+            db.commit()
+            moved += in_transaction
+        finally:
+            db.close()
+        result["shards"].append({"shard": shard, "user_months": months, "sessions": moved,
+                                 "duration_s": round(time.perf_counter() - started, 3)})
+        print(f"shard {shard}: {'would archive' if dry_run else 'archived'} {moved:,} sessions "
+              f"in {months:,} user-months", file=sys.stderr)
+    return result
+
+
+# ────────────────────────────────────────────────
+# Editing archived sessions
+# ────────────────────────────────────────────────
+def _find(cursor, user_id: int, session_id: int) -> Optional[Tuple[str, List[Dict], int]]:
+    """(month, the month's sessions, the session's index in them) for one of the user's archived sessions."""
+    cursor.execute(
+        """
+        SELECT month FROM study_sessions_archive
+        WHERE user_id = ? AND (min_id IS NULL OR ? BETWEEN min_id AND max_id)
+        ORDER BY month DESC
+        """,
+        (user_id, session_id)
+    )
+    for (month,) in cursor.fetchall():
+        cursor.execute("SELECT payload FROM study_sessions_archive WHERE user_id = ? AND month = ?", (user_id, month))
+        sessions = decode(cursor.fetchone()[0])
+        for i, s in enumerate(sessions):
+            if s["id"] == session_id:
+                return month, sessions, i
+    return None
+
+
+def archived_session(cursor, user_id: int, session_id: int) -> Optional[Dict]:
+    """One of the user's archived sessions, shaped like SQLiteStorage.get_session's, or None."""
+    found = _find(cursor, user_id, session_id)
+    if found is None:
+        return None
+    _, sessions, i = found
+    return dict(sessions[i], user_id=user_id)
+
+
+def update_session(cursor, user_id: int, session_id: int, changes: Dict) -> Optional[Dict]:
+    """
+    Applies `changes` (subject_id, duration, notes) to an archived session
+    by re-encoding its month, with its rollups and searchable notes; the
+    caller commits. Returns the session as it was, or None if the user has
+    no such archived session.
+    """
+    found = _find(cursor, user_id, session_id)
+    if found is None:
+        return None
+    month, sessions, i = found
+    old = sessions[i]
+    sessions[i] = new = dict(old, **changes)
+    _store_month(cursor, user_id, month, sessions)
+    day = old["session_date"][:10]
+    _add_rollups(cursor, [(user_id, day, old["subject_id"], -1, -old["duration"]),
+                          (user_id, day, new["subject_id"], 1, new["duration"])])
+    if new["notes"] != old["notes"]:
+        cursor.execute("DELETE FROM archived_notes WHERE id = ?", (session_id,))
+        if new["notes"]:
+            cursor.execute("INSERT INTO archived_notes (id, user_id, notes) VALUES (?, ?, ?)",
+                           (session_id, user_id, new["notes"]))
+    return old
+
+
+def delete_session(cursor, user_id: int, session_id: int) -> Optional[Dict]:
+    """Removes an archived session as update_session() edits one; returns it, or None."""
+    found = _find(cursor, user_id, session_id)
+    if found is None:
+        return None
+    month, sessions, i = found
+    old = sessions.pop(i)
+    _store_month(cursor, user_id, month, sessions)
+    _add_rollups(cursor, [(user_id, old["session_date"][:10], old["subject_id"], -1, -old["duration"])])
+    cursor.execute("DELETE FROM archived_notes WHERE id = ?", (session_id,))
+    return old
+
+
+def backfill(cursor) -> int:
+    """
+    Months archived before their id ranges and archived_notes existed: sets
+    the former and indexes the notes. Returns the months updated.
+    """
+    cursor.execute("SELECT user_id, month, payload FROM study_sessions_archive WHERE min_id IS NULL")
+    rows = cursor.fetchall()
+    for user_id, month, payload in rows:
+        sessions = decode(payload)
+        _store_month(cursor, user_id, month, sessions)
+        cursor.executemany(
+            "INSERT OR IGNORE INTO archived_notes (id, user_id, notes) VALUES (?, ?, ?)",
+            [(s["id"], user_id, s["notes"]) for s in sessions if s["notes"]]
+        )
+    return len(rows)
+
+
+# ────────────────────────────────────────────────
+# Inspection
+# ────────────────────────────────────────────────
+def stats() -> List[Dict]:
+    out = []
+    for shard in range(database.SHARD_COUNT):
+        db = database.get_db(shard=shard)
+        try:
+            hot, oldest = db.execute("SELECT COUNT(*), MIN(session_date) FROM study_sessions").fetchone()
+            months, archived, payload_bytes = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(sessions), 0), COALESCE(SUM(length(payload)), 0) FROM study_sessions_archive"
+            ).fetchone()
+            rollups = db.execute("SELECT COUNT(*) FROM session_rollups").fetchone()[0]
+        finally:
+            db.close()
+        out.append({"shard": shard, "hot_sessions": hot, "oldest_hot": oldest, "archived_sessions": archived,
+                    "archive_rows": months, "archive_bytes": payload_bytes, "rollup_rows": rollups})
+    return out
+
+
+def verify() -> List[str]:
+    """Problems found: archive rows whose totals or rollups disagree with their payload."""
+    problems = []
+    for shard in range(database.SHARD_COUNT):
+        db = database.get_db(shard=shard)
+        try:
+            rollups: Dict[tuple, List[int]] = defaultdict(lambda: [0, 0])
+            for user_id, month, count, minutes, payload in db.execute(
+                "SELECT user_id, month, sessions, minutes, payload FROM study_sessions_archive"
+            ):
+                sessions = decode(payload)
+                if (count, minutes) != (len(sessions), sum(s["duration"] for s in sessions)):
+                    problems.append(f"shard {shard} user {user_id} {month}: totals disagree with payload")
+                for s in sessions:
+                    totals = rollups[(user_id, s["session_date"][:10], s["subject_id"])]
+                    totals[0] += 1
+                    totals[1] += s["duration"]
+            stored = {(u, d, s): [n, m] for u, d, s, n, m in db.execute(
+                "SELECT user_id, day, subject_id, sessions, minutes FROM session_rollups"
+            )}
+            for key in set(stored) | set(rollups):
+                if stored.get(key) != rollups.get(key):
+                    problems.append(f"shard {shard} rollup {key}: stored {stored.get(key)}, payload {rollups.get(key)}")
+        finally:
+            db.close()
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old study sessions to the compressed archive tier")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--older-than-days", type=int, default=settings.archive_after_days)
+    run_parser.add_argument("--dry-run", action="store_true")
+    commands.add_parser("stats")
+    commands.add_parser("verify")
+    args = parser.parse_args()
+    database.init_db()
+
+    if args.command == "run":
+        if args.older_than_days < MIN_AGE_DAYS:
+            parser.error(f"--older-than-days must be at least {MIN_AGE_DAYS}")
+        print(json.dumps(run(args.older_than_days, args.dry_run), indent=2))
+    elif args.command == "stats":
+        print(json.dumps(stats(), indent=2))
+    elif args.command == "verify":
+        problems = verify()
+        for problem in problems:
+            print(problem)
+        print("ok" if not problems else f"{len(problems)} problem(s)")
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
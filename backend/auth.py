@@ -0,0 +1,150 @@
+# auth.py
+#
+# Password hashing with scrypt, off the request threads.
+#
+# Hashes are stored in users.password as
+#   scrypt$<n>$<r>$<p>$<salt, base64>$<key, base64>
+# and cost tens of milliseconds of CPU each (settings.password_hash_n), so
+# they run on a small dedicated thread pool instead of the shared threadpool
+# the sync endpoints use: hashlib.scrypt releases the GIL, so the pool's
+# threads hash in parallel without the fork and pickling cost of processes.
+# At most settings.password_hash_queue jobs may be queued or running; past
+# that hash_async/verify_async raise Overloaded immediately, so a login storm
+# is shed (503) instead of holding every request thread in line.
+#
+# Passwords stored before hashing (plaintext) and hashes with another cost
+# still verify; verify returns needs_rehash for them and the login endpoint
+# stores a fresh hash. Latency, queue wait and rejections are exported on
+# /metrics (password_hash_*).
+#
+#   python auth.py hash secret          # print a hash with the current cost
+#   python auth.py bench --runs 20      # time hash and verify
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+
+import metrics
+from config import settings
+
+SCHEME = "scrypt"
+SALT_BYTES = 16
+KEY_BYTES = 32
+R = 8
+P = 1
+
+
+class Overloaded(Exception):
+    """More hashing jobs are waiting than settings.password_hash_queue allows."""
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _derive(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # scrypt needs 128 * n * r bytes; leave room above hashlib's 32 MiB default
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r, dklen=KEY_BYTES)
+
+
+def hash_password(password: str) -> str:
+    """Hash with the configured cost, on the calling thread."""
+    salt = os.urandom(SALT_BYTES)
+    n = settings.password_hash_n
+    key = _derive(password, salt, n, R, P)
+    return f"{SCHEME}${n}${R}${P}${_b64(salt)}${_b64(key)}"
+
+
+def verify_password(password: str, stored: str) -> Tuple[bool, bool]:
+    """
+    Returns (matches, needs_rehash), on the calling thread. needs_rehash is
+    True for a match against plaintext or a hash with another cost.
+    """
+    parts = stored.split("$")
+    if len(parts) != 6 or parts[0] != SCHEME:
+        # Stored before passwords were hashed
+        return hmac.compare_digest(stored.encode("utf-8"), password.encode("utf-8")), True
+    _, n, r, p, salt, key = parts
+    n, r, p = int(n), int(r), int(p)
+    matches = hmac.compare_digest(_derive(password, base64.b64decode(salt), n, r, p), base64.b64decode(key))
+    return matches, matches and (n, r, p) != (settings.password_hash_n, R, P)
+
+
+# ────────────────────────────────────────────────
+# Dedicated pool
+# ────────────────────────────────────────────────
+_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="password-hash")
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _timed(operation: str, queued_at: float, fn, *args):
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        metrics.registry.password_hash(operation, time.perf_counter() - started, started - queued_at)
+
+
+def _release(_future):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+        metrics.registry.password_hash_queue(_pending)
+
+
+async def _submit(operation: str, fn, *args):
+    global _pending
+    with _pending_lock:
+        if _pending >= settings.password_hash_queue:
+            metrics.registry.password_hash_rejected(operation)
+            raise Overloaded()
+        _pending += 1
+        metrics.registry.password_hash_queue(_pending)
+    future = _executor.submit(_timed, operation, time.perf_counter(), fn, *args)
+    future.add_done_callback(_release)
+    return await asyncio.wrap_future(future)
+
+
+async def hash_async(password: str) -> str:
+    """hash_password on the hashing pool; Overloaded when its queue is full."""
+    return await _submit("hash", hash_password, password)
+
+
+async def verify_async(password: str, stored: str) -> Tuple[bool, bool]:
+    """verify_password on the hashing pool; Overloaded when its queue is full."""
+    return await _submit("verify", verify_password, password, stored)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Password hashing tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("hash").add_argument("password")
+    commands.add_parser("bench").add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "hash":
+        print(hash_password(args.password))
+    elif args.command == "bench":
+        stored = hash_password("benchmark")
+        for name, fn in (("hash", lambda: hash_password("benchmark")),
+                         ("verify", lambda: verify_password("benchmark", stored))):
+            samples = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                fn()
+                samples.append((time.perf_counter() - started) * 1000)
+            print(f"{name:>6}: median {statistics.median(samples):.1f} ms, max {max(samples):.1f} ms "
+                  f"(n={settings.password_hash_n}, r={R}, p={P})")
+
+
+if __name__ == "__main__":
+    main()
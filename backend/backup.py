@@ -0,0 +1,221 @@
+# backup.py
+#
+# Online backups of the live database (every shard) with SQLite's backup API.
+#
+# The copy runs in small page steps with a sleep between them. A step holds
+# a read lock on the source for as long as it takes to copy its pages, so
+# the longest step is an upper bound on how long a writer can be made to
+# wait; it is reported as max_step_ms. A write from another connection
+# restarts the copy from the first page; after --max-restarts the rest is
+# copied in one step instead, so a busy database still gets a backup.
+#
+# Every run writes backups/<UTC timestamp>/ holding one file per shard and a
+# manifest.json with per-shard page counts, restarts, step timings and the
+# integrity_check result of the finished copy. Runs beyond --keep are
+# deleted, oldest first. Shards are copied one after another, so a sharded
+# backup is consistent per shard, not across shards.
+#
+#   python backup.py run                       # one backup now
+#   python backup.py schedule --every 3600     # backup every hour, forever
+#   python backup.py list
+#   python backup.py verify backups/20261019T120000Z
+#   python backup.py restore backups/20261019T120000Z   # with the API stopped
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from config import settings
+from database import SHARD_COUNT, shard_path
+
+
+class TooManyRestarts(Exception):
+    pass
+
+
+def integrity_check(path: str) -> str:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    finally:
+        conn.close()
+    return "ok" if problems == ["ok"] else "; ".join(problems[:10])
+
+
+def copy_database(source_path: str, target_path: str, pages: int, sleep_s: float,
+                  max_restarts: int, label: str = "") -> Dict:
+    """
+    Copies one database file with the backup API in steps of `pages` pages.
+    Returns the run's statistics.
+    """
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    stats = {"source": source_path, "file": os.path.basename(target_path), "pages": 0,
+             "steps": 0, "restarts": 0, "max_step_ms": 0.0, "final_step": False}
+    state = {"remaining": None, "last": time.perf_counter(), "reported": 0.0}
+
+    def progress(status, remaining, total):
+        now = time.perf_counter()
+        step_ms = (now - state["last"]) * 1000
+        stats["steps"] += 1
+        stats["pages"] = total
+        stats["max_step_ms"] = max(stats["max_step_ms"], step_ms)
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            stats["restarts"] += 1
+            if stats["restarts"] > max_restarts:
+                raise TooManyRestarts()
+        state["remaining"] = remaining
+        if now - state["reported"] >= 1 or remaining == 0:
+            done = 100 * (total - remaining) / total if total else 100
+            print(f"  {label}: {done:5.1f}% of {total:,} pages", file=sys.stderr)
+            state["reported"] = now
+        # The step has released its read lock by now: give writers a window
+        if remaining and sleep_s:
+            time.sleep(sleep_s)
+        state["last"] = time.perf_counter()
+
+    started = time.perf_counter()
+    try:
+        try:
+            source.backup(target, pages=pages, progress=progress, sleep=sleep_s)
+        except TooManyRestarts:
+            # Writers keep invalidating the copy: finish in a single step
+            stats["final_step"] = True
+            step_started = time.perf_counter()
+            source.backup(target, pages=-1)
+            stats["max_step_ms"] = max(stats["max_step_ms"], (time.perf_counter() - step_started) * 1000)
+    finally:
+        target.close()
+        source.close()
+    stats["duration_s"] = round(time.perf_counter() - started, 3)
+    stats["max_step_ms"] = round(stats["max_step_ms"], 3)
+    stats["integrity"] = integrity_check(target_path)
+    return stats
+
+
+def run_backup(backup_dir: str, pages: int, sleep_s: float, max_restarts: int, keep: int) -> Dict:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    run_dir = os.path.join(backup_dir, stamp)
+    suffix = 1
+    while os.path.exists(run_dir):
+        run_dir = os.path.join(backup_dir, f"{stamp}-{suffix}")
+        suffix += 1
+    os.makedirs(run_dir)
+    print(f"Backing up {SHARD_COUNT} shard(s) to {run_dir}", file=sys.stderr)
+
+    manifest = {"created": stamp, "shard_count": SHARD_COUNT, "pages_per_step": pages,
+                "sleep_ms": sleep_s * 1000, "shards": []}
+    started = time.perf_counter()
+    for shard in range(SHARD_COUNT):
+        source = shard_path(shard)
+        target = os.path.join(run_dir, os.path.basename(source))
+        manifest["shards"].append(copy_database(source, target, pages, sleep_s, max_restarts, f"shard {shard}"))
+    manifest["duration_s"] = round(time.perf_counter() - started, 3)
+    manifest["max_step_ms"] = max(s["max_step_ms"] for s in manifest["shards"])
+    manifest["ok"] = all(s["integrity"] == "ok" for s in manifest["shards"])
+
+    with open(os.path.join(run_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    if not manifest["ok"]:
+        print(f"Integrity check FAILED for {run_dir}", file=sys.stderr)
+    prune(backup_dir, keep)
+    return manifest
+
+
+def list_backups(backup_dir: str) -> List[str]:
+    """Completed runs (those with a manifest), oldest first."""
+    if not os.path.isdir(backup_dir):
+        return []
+    return sorted(
+        os.path.join(backup_dir, name) for name in os.listdir(backup_dir)
+        if os.path.exists(os.path.join(backup_dir, name, "manifest.json"))
+    )
+
+
+def prune(backup_dir: str, keep: int):
+    runs = list_backups(backup_dir)
+    for run_dir in runs[:max(0, len(runs) - keep)]:
+        shutil.rmtree(run_dir)
+        print(f"Removed old backup {run_dir}", file=sys.stderr)
+
+
+def verify(run_dir: str) -> bool:
+    with open(os.path.join(run_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    ok = True
+    for shard in manifest["shards"]:
+        result = integrity_check(os.path.join(run_dir, shard["file"]))
+        print(f"{shard['file']}: {result}")
+        ok = ok and result == "ok"
+    return ok
+
+
+def restore(run_dir: str, pages: int):
+    """Copies a verified backup over the live files (stop the API first)."""
+    with open(os.path.join(run_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest["shard_count"] != SHARD_COUNT:
+        raise SystemExit(f"Backup has {manifest['shard_count']} shard(s), configuration has {SHARD_COUNT}")
+    if not verify(run_dir):
+        raise SystemExit("Backup failed verification; nothing restored")
+    for shard, entry in enumerate(manifest["shards"]):
+        source = sqlite3.connect(os.path.join(run_dir, entry["file"]))
+        target = sqlite3.connect(shard_path(shard))
+        try:
+            source.backup(target, pages=pages)
+        finally:
+            target.close()
+            source.close()
+        print(f"Restored {shard_path(shard)}", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Online backups of the study database")
+    parser.add_argument("--dir", default=settings.backup_dir, help="backup root directory")
+    parser.add_argument("--pages", type=int, default=settings.backup_pages_per_step, help="pages copied per step")
+    parser.add_argument("--sleep-ms", type=float, default=settings.backup_sleep_ms, help="pause between steps")
+    parser.add_argument("--max-restarts", type=int, default=20, help="then finish in one step")
+    parser.add_argument("--keep", type=int, default=settings.backup_keep, help="completed backups to keep")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("run")
+    schedule = commands.add_parser("schedule")
+    schedule.add_argument("--every", type=float, required=True, help="seconds between backups")
+    commands.add_parser("list")
+    commands.add_parser("verify").add_argument("run_dir")
+    commands.add_parser("restore").add_argument("run_dir")
+    args = parser.parse_args(argv)
+    sleep_s = args.sleep_ms / 1000
+
+    if args.command == "run":
+        manifest = run_backup(args.dir, args.pages, sleep_s, args.max_restarts, args.keep)
+        print(json.dumps(manifest, indent=2))
+        sys.exit(0 if manifest["ok"] else 1)
+    elif args.command == "schedule":
+        while True:
+            started = time.monotonic()
+            try:
+                manifest = run_backup(args.dir, args.pages, sleep_s, args.max_restarts, args.keep)
+                print(f"Backup {manifest['created']}: {manifest['duration_s']}s, "
+                      f"longest step {manifest['max_step_ms']} ms, ok={manifest['ok']}", file=sys.stderr)
+            except (sqlite3.Error, OSError) as e:
+                print(f"Backup failed: {e}", file=sys.stderr)
+            time.sleep(max(0.0, args.every - (time.monotonic() - started)))
+    elif args.command == "list":
+        for run_dir in list_backups(args.dir):
+            with open(os.path.join(run_dir, "manifest.json")) as f:
+                manifest = json.load(f)
+            print(f"{run_dir}  shards={manifest['shard_count']}  ok={manifest['ok']}  "
+                  f"{manifest['duration_s']}s  max_step={manifest['max_step_ms']}ms")
+    elif args.command == "verify":
+        sys.exit(0 if verify(args.run_dir) else 1)
+    elif args.command == "restore":
+        restore(args.run_dir, args.pages)
+
+
+if __name__ == "__main__":
+    main()
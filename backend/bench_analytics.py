@@ -0,0 +1,126 @@
+# bench_analytics.py
+#
+# Times one user's dashboard statistics two ways for growing session counts:
+#
+#   pandas  what the dashboard page did: a DataFrame built from the /study
+#           JSON dicts, to_datetime on the dates, subject names mapped per
+#           row, then groupby sums (plus the weekly, rolling and percentile
+#           figures the engine also returns)
+#   numpy   analytics.py: day numbers, subjects and minutes read from SQLite
+#           into typed arrays (load), then summarize() on the cached arrays
+#
+# Both produce the same numbers; the script checks that before timing.
+#
+#   python bench_analytics.py [sizes...]     # default 10k 100k 1M
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+import analytics
+from storage import DAY_SQL
+
+SIZES = [10_000, 100_000, 1_000_000]
+SUBJECTS = 40
+HISTORY_DAYS = 3 * 365
+DAYS = analytics.DEFAULT_DAYS
+
+
+def make_sessions(count: int, rng: random.Random):
+    end = datetime.now(timezone.utc).replace(tzinfo=None)
+    return [
+        {
+            "id": i + 1,
+            "user_id": 1,
+            "subject_id": rng.randint(1, SUBJECTS),
+            "duration": int(rng.lognormvariate(3.5, 0.6)) + 1,
+            "notes": None,
+            "session_date": (end - timedelta(seconds=rng.randint(0, HISTORY_DAYS * 86400))).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        for i in range(count)
+    ]
+
+
+def pandas_summary(sessions, subject_map):
+    df = pd.DataFrame(sessions)
+    df["session_date"] = pd.to_datetime(df["session_date"])
+    df = df.sort_values("session_date", ascending=False)
+    df["subject_name"] = df["subject_id"].map(subject_map).fillna(df["subject_id"].astype(str))
+
+    today = pd.Timestamp(datetime.now(timezone.utc).date())
+    window = pd.date_range(today - pd.Timedelta(days=DAYS + analytics.ROLLING_DAYS - 2), today)
+    daily = df.groupby(df["session_date"].dt.normalize())["duration"].sum().reindex(window, fill_value=0)
+    rolling = daily.rolling(analytics.ROLLING_DAYS).mean().iloc[analytics.ROLLING_DAYS - 1:]
+    daily = daily.iloc[analytics.ROLLING_DAYS - 1:]
+    return {
+        "total_minutes": int(df["duration"].sum()),
+        "by_subject": df.groupby("subject_name")["duration"].sum(),
+        "daily": daily,
+        "rolling": rolling,
+        "weekly": daily.groupby(daily.index.to_period("W-SUN")).sum(),
+        "percentiles": np.percentile(df["duration"], analytics.PERCENTILES),
+    }
+
+
+def load_arrays(db: sqlite3.Connection) -> analytics.SessionArrays:
+    """SQLiteStorage.session_days() + analytics.load() against the benchmark's database."""
+    hot = np.array(
+        db.execute(f"SELECT {DAY_SQL}, subject_id, duration FROM study_sessions WHERE user_id = 1").fetchall(),
+        dtype=np.int64
+    ).reshape(-1, 3)
+    return analytics.SessionArrays(hot[:, 0], hot[:, 1], hot[:, 2])
+
+
+def check(expected, summary, subject_map):
+    assert expected["total_minutes"] == summary["total_minutes"]
+    assert {subject_map[s["subject_id"]]: s["minutes"] for s in summary["subjects"]} == expected["by_subject"].to_dict()
+    assert [d["minutes"] for d in summary["daily"]] == expected["daily"].tolist()
+    assert np.allclose([d["rolling_avg"] for d in summary["daily"]], expected["rolling"].round(1))
+    assert [w["minutes"] for w in summary["weekly"]] == expected["weekly"].tolist()
+    assert np.allclose([summary["session_minutes"][f"p{p}"] for p in analytics.PERCENTILES],
+                       expected["percentiles"].round(1))
+
+
+def timed(fn, runs: int) -> float:
+    """Median wall time of `fn` over `runs` runs, in milliseconds."""
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return sorted(samples)[len(samples) // 2]
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or SIZES
+    rng = random.Random(42)
+    subject_map = {i: f"Subject {i}" for i in range(1, SUBJECTS + 1)}
+    print(f"{DAYS}-day window, {SUBJECTS} subjects, {HISTORY_DAYS} days of history")
+    for size in sizes:
+        sessions = make_sessions(size, rng)
+        db = sqlite3.connect(":memory:")
+        db.execute("CREATE TABLE study_sessions (id INTEGER PRIMARY KEY, user_id INTEGER, subject_id INTEGER, "
+                   "duration INTEGER, notes TEXT, session_date TEXT)")
+        db.executemany("INSERT INTO study_sessions VALUES (:id, :user_id, :subject_id, :duration, :notes, :session_date)",
+                       sessions)
+        db.execute("CREATE INDEX idx_user ON study_sessions(user_id)")
+
+        arrays = load_arrays(db)
+        check(pandas_summary(sessions, subject_map), analytics.summarize(arrays, DAYS), subject_map)
+
+        runs = 3 if size >= 1_000_000 else 10
+        pandas_ms = timed(lambda: pandas_summary(sessions, subject_map), runs)
+        load_ms = timed(lambda: load_arrays(db), runs)
+        summary_ms = timed(lambda: analytics.summarize(arrays, DAYS), runs)
+        print(f"  {size:>9,} sessions: pandas {pandas_ms:8.1f} ms | numpy load {load_ms:7.1f} ms, "
+              f"summarize {summary_ms:6.2f} ms | {pandas_ms / (load_ms + summary_ms):5.1f}x uncached, "
+              f"{pandas_ms / summary_ms:6.0f}x cached")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# bench_planner.py
+#
+# Times the study planner on a user with hundreds of goals over a full
+# year horizon. Exits non-zero if a full plan takes longer than the budget.
+#
+#   python bench_planner.py [goals] [runs]
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from planner import HORIZON_DAYS, StudyPlan
+
+BUDGET_MS = 100.0
+
+
+def make_goals(count: int, start: date, rng: random.Random):
+    return [
+        {
+            "id": i + 1,
+            "title": f"Goal {i + 1}",
+            "target_date": start + timedelta(days=rng.randint(-10, HORIZON_DAYS)) if rng.random() < 0.9 else None,
+            "remaining": rng.randint(30, 3000),
+        }
+        for i in range(count)
+    ]
+
+
+def timed(fn, runs: int) -> float:
+    """Worst-case wall time of `fn` over `runs` runs, in milliseconds."""
+    worst = 0.0
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        worst = max(worst, (time.perf_counter() - t0) * 1000)
+    return worst
+
+
+def main():
+    goal_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rng = random.Random(42)
+    start = date.today()
+    goals = make_goals(goal_count, start, rng)
+    capacity = [rng.choice([0, 60, 90, 120, 180]) for _ in range(HORIZON_DAYS)]
+
+    def full_plan():
+        plan = StudyPlan(goals, capacity, start)
+        plan.goal_summary()
+        plan.schedule()
+
+    plan = StudyPlan(goals, capacity, start)
+
+    def log_session():
+        plan.record_minutes(rng.randint(10, 90))
+
+    def log_goal_session():
+        plan.record_minutes(rng.randint(10, 90), goal_id=rng.randint(1, goal_count))
+
+    full_ms = timed(full_plan, runs)
+    log_ms = timed(log_session, runs * 50)
+    goal_ms = timed(log_goal_session, runs * 50)
+
+    print(f"{goal_count} goals, {HORIZON_DAYS} days, {runs} runs")
+    print(f"  full plan (build + summary + schedule): {full_ms:8.3f} ms worst")
+    print(f"  log session, head of queue:             {log_ms:8.3f} ms worst")
+    print(f"  log session, specific goal:             {goal_ms:8.3f} ms worst")
+
+    if full_ms > BUDGET_MS:
+        print(f"FAIL: full plan exceeded {BUDGET_MS:.0f} ms budget")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
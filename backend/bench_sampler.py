@@ -0,0 +1,44 @@
+# bench_sampler.py
+#
+# Times practice-quiz draws and answer updates on the weighted sampler for
+# growing bank sizes. Per-draw time should stay flat (O(n log size)).
+#
+#   python bench_sampler.py [draw size]
+import random
+import sys
+import time
+from array import array
+
+from sampler import WeightedSampler
+
+SIZES = [1_000, 10_000, 100_000, 500_000]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rng = random.Random(42)
+    print(f"draw size {n}")
+    for size in SIZES:
+        card_ids = array("q", range(1, size + 1))
+        weights = array("d", (rng.random() for _ in range(size)))
+
+        t0 = time.perf_counter()
+        sampler = WeightedSampler(card_ids, weights)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        runs = 1000
+        t0 = time.perf_counter()
+        for _ in range(runs):
+            sampler.sample(n, rng)
+        draw_us = (time.perf_counter() - t0) / runs * 1e6
+
+        t0 = time.perf_counter()
+        for _ in range(runs):
+            sampler.update(rng.randint(1, size), rng.random())
+        update_us = (time.perf_counter() - t0) / runs * 1e6
+
+        print(f"  {size:>8} cards: build {build_ms:8.1f} ms, draw {draw_us:7.1f} us, answer update {update_us:5.1f} us")
+
+
+if __name__ == "__main__":
+    main()
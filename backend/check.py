@@ -1,6 +1,8 @@
 import sqlite3
 
-conn = sqlite3.connect("study.db")
+from config import settings
+
+conn = sqlite3.connect(settings.db_path)
 cursor = conn.cursor()
 
 try:
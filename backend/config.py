@@ -0,0 +1,222 @@
+# config.py
+#
+# Runtime settings for the API, scripts and benchmarks.
+#
+# Values are resolved once, at import, from (lowest to highest priority):
+#   1. the profile named by STUDY_PROFILE: dev (default), bench or prod
+#   2. a JSON file named by STUDY_CONFIG_FILE holding any subset of fields
+#   3. STUDY_<FIELD> environment variables, e.g. STUDY_DB_PATH=/data/study.db
+#
+# `settings` is frozen; GET /admin/config shows the effective values and
+# where each one came from. A relative db_path is resolved against the
+# working directory at startup, as before.
+#
+#   STUDY_PROFILE=prod STUDY_POOL_SIZE=32 uvicorn main:app --workers 4
+import json
+import os
+from dataclasses import asdict, dataclass, fields
+from typing import Dict
+
+JOURNAL_MODES = {"", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SYNCHRONOUS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+TEMP_STORE = {"DEFAULT", "FILE", "MEMORY"}
+STORAGE_BACKENDS = {"sqlite", "memory"}
+
+
+@dataclass(frozen=True)
+class Settings:
+    profile: str = "dev"
+    storage_backend: str = "sqlite"  # users/subjects/sessions/goals; see storage.py
+
+    # ── SQLite ──────────────────────────────────────
+    db_path: str = "study.db"
+    shard_count: int = 1            # SQLite files users are spread over; see database.py
+    pool_size: int = 4              # idle connections kept per process; 0 disables pooling
+    busy_timeout_s: float = 5.0     # how long a transaction start or COMMIT retries while the database is locked
+    journal_mode: str = ""          # applied once at startup; "" leaves the file's mode alone
+    synchronous: str = "FULL"
+    cache_size_kib: int = 2000      # page cache per connection
+    mmap_size_mb: int = 0
+    temp_store: str = "DEFAULT"
+
+    # ── in-process caches ───────────────────────────
+    planner_cache_size: int = 1024  # users with a cached study plan
+    sampler_cache_size: int = 256   # (user, subject) practice banks
+    sampler_cache_ttl_s: float = 600
+    analytics_cache_size: int = 512  # users with cached session arrays (analytics.py)
+
+    # ── slow-query detector ─────────────────────────
+    slow_query_ms: float = 100
+    slow_query_large_table_rows: int = 10_000
+
+    # ── batching and paging ─────────────────────────
+    bulk_batch_rows: int = 50_000   # rows per transaction in bulk loads (seed.py)
+    default_page_size: int = 20
+    max_page_size: int = 500
+
+    # ── backups (backup.py) ─────────────────────────
+    backup_dir: str = "backups"
+    backup_keep: int = 7
+    backup_pages_per_step: int = 256
+    backup_sleep_ms: float = 10
+
+    # ── executors ───────────────────────────────────
+    threadpool_size: int = 40       # worker threads for sync endpoints
+
+    # ── user purge (purge.py) ───────────────────────
+    purge_batch_rows: int = 500     # rows per delete transaction
+    purge_pause_ms: float = 20      # between batches, so other writers get the lock
+    purge_poll_s: float = 5         # API worker thread's queue poll; 0 leaves it to `purge.py run`
+    purge_stale_s: int = 60         # a running job without a heartbeat this long is taken over
+
+    # ── session archive (archive.py) ────────────────
+    archive_after_days: int = 365   # sessions older than this move to the compressed tier
+    archive_batch_rows: int = 2000  # sessions moved per transaction
+    archive_pause_ms: float = 10    # between transactions
+
+    # ── live timers (timers.py) ─────────────────────
+    timer_checkpoint_s: float = 10      # last heartbeats saved this often; 0 keeps them in memory only
+    timer_idle_timeout_s: float = 120   # a timer without heartbeats this long is stopped
+
+    # ── daily goal reminders (reminders.py) ─────────
+    reminder_sink: str = "log"              # log, file:<path>, webhook:<url>, or a reminders.register_sink name
+    reminder_max_scheduled: int = 100_000   # reminders held in memory; 0 disables reminders
+
+    # ── admission control (admission.py) ────────────
+    admission_max_in_flight: int = 32        # requests being handled at once; 0 disables admission control
+    admission_max_reads: int = 28
+    admission_max_writes: int = 8
+    admission_max_queued: int = 128          # waiting per class beyond this is answered 503
+    admission_queue_timeout_ms: float = 500  # longest wait for a slot before 503
+    admission_user_rate: float = 20          # requests/s per X-User-Id; 0 disables the 429 limit
+    admission_user_burst: int = 40
+
+    # ── password hashing (auth.py) ──────────────────
+    password_hash_n: int = 16_384   # scrypt cost; a power of two, changing it rehashes on login
+    password_hash_workers: int = 2  # dedicated hashing threads
+    password_hash_queue: int = 64   # jobs queued or running before logins get 503
+
+
+PROFILES: Dict[str, Dict] = {
+    "dev": {},
+    "bench": {
+        "pool_size": 16,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size_kib": 65_536,
+        "mmap_size_mb": 256,
+        "temp_store": "MEMORY",
+        "slow_query_ms": 50,
+        "threadpool_size": 64,
+        "password_hash_workers": 4,
+        "admission_max_in_flight": 56,
+        "admission_max_reads": 48,
+        "admission_user_rate": 0,           # load generators reuse a few user ids
+    },
+    "prod": {
+        "pool_size": 16,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size_kib": 65_536,
+        "mmap_size_mb": 256,
+        "temp_store": "MEMORY",
+        "slow_query_ms": 250,
+        "max_page_size": 200,
+        "threadpool_size": 64,
+        "password_hash_workers": 4,
+        "admission_max_in_flight": 56,
+        "admission_max_reads": 48,
+    },
+}
+
+ENV_PREFIX = "STUDY_"
+
+
+def _coerce(name: str, kind: type, value):
+    try:
+        if kind is int and isinstance(value, str):
+            return int(value.replace("_", ""))
+        return kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value for {name}: {value!r} (expected {kind.__name__})")
+
+
+def _validate(s: Settings):
+    if s.storage_backend not in STORAGE_BACKENDS:
+        raise ValueError(f"storage_backend must be one of {sorted(STORAGE_BACKENDS)}")
+    if s.journal_mode.upper() not in JOURNAL_MODES:
+        raise ValueError(f"journal_mode must be one of {sorted(JOURNAL_MODES - {''})} or empty")
+    if s.synchronous.upper() not in SYNCHRONOUS:
+        raise ValueError(f"synchronous must be one of {sorted(SYNCHRONOUS)}")
+    if s.temp_store.upper() not in TEMP_STORE:
+        raise ValueError(f"temp_store must be one of {sorted(TEMP_STORE)}")
+    for name in ("pool_size", "cache_size_kib", "mmap_size_mb", "planner_cache_size", "sampler_cache_size",
+                 "analytics_cache_size"):
+        if getattr(s, name) < 0:
+            raise ValueError(f"{name} must not be negative")
+    if not 1 <= s.shard_count <= 1024:
+        raise ValueError("shard_count must be between 1 and 1024")
+    for name in ("bulk_batch_rows", "backup_keep", "backup_pages_per_step", "default_page_size", "max_page_size",
+                 "purge_batch_rows", "purge_stale_s", "threadpool_size", "archive_after_days",
+                 "archive_batch_rows", "password_hash_workers", "password_hash_queue"):
+        if getattr(s, name) < 1:
+            raise ValueError(f"{name} must be at least 1")
+    for name in ("admission_max_in_flight", "admission_max_queued", "admission_user_rate",
+                 "purge_pause_ms", "purge_poll_s", "archive_pause_ms", "timer_checkpoint_s",
+                 "reminder_max_scheduled"):
+        if getattr(s, name) < 0:
+            raise ValueError(f"{name} must not be negative")
+    for name in ("admission_max_reads", "admission_max_writes", "admission_user_burst"):
+        if getattr(s, name) < 1:
+            raise ValueError(f"{name} must be at least 1")
+    if s.admission_queue_timeout_ms <= 0:
+        raise ValueError("admission_queue_timeout_ms must be positive")
+    if s.timer_idle_timeout_s <= 0:
+        raise ValueError("timer_idle_timeout_s must be positive")
+    if s.password_hash_n < 2 or s.password_hash_n & (s.password_hash_n - 1):
+        raise ValueError("password_hash_n must be a power of two greater than 1")
+    if s.default_page_size > s.max_page_size:
+        raise ValueError("default_page_size must not exceed max_page_size")
+
+
+def load(environ=os.environ):
+    """Returns (Settings, {field: source}) for the given environment."""
+    profile = environ.get(ENV_PREFIX + "PROFILE", "dev")
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile {profile!r}; choose one of {', '.join(PROFILES)}")
+
+    kinds = {f.name: f.type for f in fields(Settings)}
+    values = {"profile": profile}
+    sources = {name: "default" for name in kinds}
+    sources["profile"] = "env" if ENV_PREFIX + "PROFILE" in environ else "default"
+
+    layers = [(f"profile:{profile}", PROFILES[profile])]
+    path = environ.get(ENV_PREFIX + "CONFIG_FILE")
+    if path:
+        with open(path) as f:
+            layers.append((f"file:{path}", json.load(f)))
+    layers.append(("env", {
+        name: environ[ENV_PREFIX + name.upper()]
+        for name in kinds
+        if name != "profile" and ENV_PREFIX + name.upper() in environ
+    }))
+
+    for source, layer in layers:
+        for name, value in layer.items():
+            if name not in kinds or name == "profile":
+                raise ValueError(f"Unknown setting {name!r} in {source}")
+            values[name] = _coerce(name, kinds[name], value)
+            sources[name] = source
+
+    values["db_path"] = os.path.abspath(values.get("db_path", Settings.db_path))
+    result = Settings(**values)
+    _validate(result)
+    return result, sources
+
+
+settings, sources = load()
+
+
+def describe() -> Dict:
+    """Effective settings and their sources, for the admin endpoint."""
+    return {"settings": asdict(settings), "sources": sources}
@@ -0,0 +1,17 @@
+# conftest.py
+#
+# pytest setup for the backend tests: settings are read once at import
+# (config.py), so point the database at a throwaway directory before any
+# test module imports the app.
+#
+#   cd backend && python -m pytest -q
+import os
+import shutil
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="study-tests-")
+os.environ["STUDY_DB_PATH"] = os.path.join(_workdir, "study.db")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_workdir, ignore_errors=True)
@@ -0,0 +1,83 @@
+# dashboard.py
+#
+# Everything the dashboard page renders, in one response: the subject map,
+# the analytics summary (totals and chart series, see analytics.py) and the
+# first page of the user's sessions and goals.
+#
+# All of it is read on one connection to the user's shard inside one read
+# transaction, so the parts agree with each other: subjects are replicated
+# to every shard, and a deferred BEGIN holds one snapshot (WAL) or a shared
+# lock (rollback journal) until the last SELECT. Cached session arrays are
+# used only if their data version is the one inside the transaction (every
+# session write bumps it, in whichever worker), so they match what the
+# transaction sees; otherwise they are reloaded on it. Other storage
+# backends are read through the storage interface, one call per part.
+from typing import Dict
+
+import analytics
+import archive
+import storage
+from config import settings
+from database import get_db
+
+
+def build(user_id: int, days: int = analytics.DEFAULT_DAYS, limit: int = 20) -> Dict:
+    if settings.storage_backend != "sqlite":
+        return _build_from_storage(user_id, days, limit)
+
+    db = get_db(user_id)
+    try:
+        db.execute("BEGIN")
+        subjects = [dict(row) for row in db.execute("SELECT id, name FROM subjects ORDER BY name")]
+        stats = analytics.summarize(analytics.get_arrays(user_id, db), days)
+
+        # Newest first; archived sessions are all older than the hot ones
+        sessions = [dict(row) for row in db.execute(
+            """
+            SELECT id, user_id, subject_id, duration, notes, session_date
+            FROM study_sessions
+            WHERE user_id = ?
+            ORDER BY session_date DESC, id DESC
+            LIMIT ?
+            """,
+            (user_id, limit)
+        )]
+        if len(sessions) < limit and len(sessions) < stats["sessions"]:
+            sessions += archive.archived_sessions(db.cursor(), user_id)[:limit - len(sessions)]
+
+        # Same order as GET /goals/
+        goals = [dict(row) for row in db.execute(
+            """
+            SELECT id, user_id, title, category, progress, target_date, type, streak, last_done,
+                   subject_id, target_minutes, logged_minutes, remind_at
+            FROM goals
+            WHERE user_id = ?
+            ORDER BY type, target_date DESC, id
+            LIMIT ?
+            """,
+            (user_id, limit)
+        )]
+        goals_total = db.execute("SELECT COUNT(*) FROM goals WHERE user_id = ?", (user_id,)).fetchone()[0]
+        db.commit()
+    finally:
+        db.close()
+
+    return {
+        "subjects": subjects,
+        "stats": stats,
+        "sessions": sessions,
+        "goals": goals,
+        "goals_total": goals_total,
+    }
+
+
+def _build_from_storage(user_id: int, days: int, limit: int) -> Dict:
+    store = storage.get_storage()
+    goals = store.list_goals(user_id)
+    return {
+        "subjects": store.list_subjects(),
+        "stats": analytics.user_stats(user_id, days),
+        "sessions": store.list_sessions(user_id)[:limit],
+        "goals": goals[:limit],
+        "goals_total": len(goals),
+    }
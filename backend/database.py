@@ -1,25 +1,256 @@
+import os
+import queue
 import sqlite3
+from typing import List, Optional, Sequence
 
+from config import settings
+from metrics import InstrumentedConnection
 
-def get_db():
+# ────────────────────────────────────────────────
+# Sharding
+#
+# With shard_count > 1, each user's rows (sessions, goals, decks, cards,
+# reviews) live in one of N SQLite files chosen by a jump consistent hash
+# of user_id, so writes for different users take different file locks.
+# Shard 0 is settings.db_path itself and also holds the global tables
+# (users, groups, leaderboards); subjects are replicated to every shard as
+# reference data. Growing N only moves users onto the new shards, see
+# rebalance.py. Every shard allocates AUTOINCREMENT ids from its own range,
+# so ids stay unique across files and a row's shard is id // ID_RANGE.
+# ────────────────────────────────────────────────
+SHARD_COUNT = settings.shard_count
+GLOBAL_SHARD = 0
+ID_RANGE = 1 << 40
+SHARDED_TABLES = ["study_sessions", "goals", "decks", "cards", "card_reviews"]
+# The cold tier of study_sessions (archive.py), per user like the above but
+# without ids of their own
+ARCHIVE_TABLES = ["study_sessions_archive", "session_rollups", "archived_notes"]
+
+# Stored in PRAGMA user_version once a shard's tables and columns are in
+# place, so a restarted worker skips the DDL and column checks below.
+# Bump it with every change to _init_shard.
+SCHEMA_VERSION = 10
+
+# One-minute buckets of the leaderboards' rank counts (leaderboards.py),
+# enough for the longest board: a 31-day month is 44640 minutes
+LEADERBOARD_BUCKETS = 1 << 16
+
+
+def shard_for(user_id: int, shard_count: int = SHARD_COUNT) -> int:
+    """Jump consistent hash (Lamping & Veach) of user_id onto [0, shard_count)."""
+    key = user_id & 0xFFFFFFFFFFFFFFFF
+    b, j = -1, 0
+    while j < shard_count:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def shard_of_id(row_id: int) -> int:
+    return min(row_id // ID_RANGE, SHARD_COUNT - 1)
+
+
+def shard_path(shard: int) -> str:
+    """study.db, study.shard1.db, study.shard2.db, ..."""
+    if shard == GLOBAL_SHARD:
+        return settings.db_path
+    stem, ext = os.path.splitext(settings.db_path)
+    return f"{stem}.shard{shard}{ext}"
+
+
+# Idle connections ready for reuse, one pool per shard; close() puts a
+# connection back into its shard's pool
+_pools: "List[queue.LifoQueue[PooledConnection]]" = [
+    queue.LifoQueue(maxsize=settings.pool_size) for _ in range(SHARD_COUNT)
+]
+
+
+class PooledConnection(InstrumentedConnection):
+    def close(self):
+        """Returns the connection to the pool (rolled back), or really closes it."""
+        try:
+            if self.in_transaction:
+                self.rollback()
+            _pools[self.shard].put_nowait(self)
+        except (sqlite3.Error, queue.Full):
+            super().close()
+
+
+def close_pools():
+    """Closes every idle pooled connection (before journal mode changes, backups, ...)."""
+    for pool in _pools:
+        while True:
+            try:
+                conn = pool.get_nowait()
+            except queue.Empty:
+                break
+            sqlite3.Connection.close(conn)
+
+
+def connect(shard: int = GLOBAL_SHARD):
+    """Opens a new connection with the configured per-connection pragmas."""
+    conn = sqlite3.connect(
+        shard_path(shard), check_same_thread=False, timeout=0,
+        factory=PooledConnection if settings.pool_size else InstrumentedConnection
+    )
+    conn.shard = shard
+    conn.execute(f"PRAGMA synchronous = {settings.synchronous}")
+    conn.execute(f"PRAGMA cache_size = -{settings.cache_size_kib}")
+    conn.execute(f"PRAGMA temp_store = {settings.temp_store}")
+    if settings.mmap_size_mb:
+        conn.execute(f"PRAGMA mmap_size = {settings.mmap_size_mb * 1024 * 1024}")
+    return conn
+
+
+def get_db(user_id: Optional[int] = None, shard: Optional[int] = None):
     """
     Returns a connection to the database with row_factory set to sqlite3.Row
-    (so fetchone/fetchall return dict-like objects).
+    (so fetchone/fetchall return dict-like objects). Statements are timed
+    for /metrics, and lock waits are retried (and counted) by the connection
+    itself rather than by SQLite's built-in busy timeout, at transaction
+    start and COMMIT only, where that timeout would wait. Connections come
+    from a small per-process pool; close() hands them back.
+
+    Pass the user_id for queries on a user's own rows; without it (or an
+    explicit shard) the connection is to the global shard.
     """
-    conn = sqlite3.connect("study.db", check_same_thread=False)
+    if shard is None:
+        shard = shard_for(user_id) if user_id is not None else GLOBAL_SHARD
+    try:
+        conn = _pools[shard].get_nowait()
+    except queue.Empty:
+        conn = connect(shard)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+def fan_out(sql: str, params=()) -> List[List[sqlite3.Row]]:
+    """Runs a read-only query on every shard; returns the rows of each, by shard."""
+    results: List[List[sqlite3.Row]] = []
+    for shard in range(SHARD_COUNT):
+        db = get_db(shard=shard)
+        try:
+            results.append(db.execute(sql, params).fetchall())
+        finally:
+            db.close()
+    return results
+
+
+def replicate_subjects():
+    """Copies the subjects table from the global shard to every other shard."""
+    if SHARD_COUNT == 1:
+        return
+    db = get_db()
+    rows = [tuple(row) for row in db.execute("SELECT id, name FROM subjects").fetchall()]
+    db.close()
+    for shard in range(1, SHARD_COUNT):
+        conn = get_db(shard=shard)
+        try:
+            conn.execute("DELETE FROM subjects")
+            conn.executemany("INSERT INTO subjects (id, name) VALUES (?, ?)", rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def bump_data_version(cursor, user_id: int):
+    """
+    Marks the user's sessions or goals as changed; call it inside the
+    transaction that changes them, on the user's shard (see
+    user_data_versions in _init_shard).
+    """
+    cursor.execute(
+        """
+        INSERT INTO user_data_versions (user_id, version) VALUES (?, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+        """,
+        (user_id,)
+    )
+
+
+def data_version(conn, user_id: int) -> int:
+    """The user's current data version (0 before their first write), on `conn` to their shard."""
+    row = conn.execute("SELECT version FROM user_data_versions WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def bump_card_version(cursor, user_id: int):
+    """
+    Marks the user's set of cards as changed (a card or deck added or
+    removed); call it inside that transaction, on the user's shard.
+    Answers don't count: the sampler reads those back by last_reviewed.
+    """
+    cursor.execute(
+        """
+        INSERT INTO user_data_versions (user_id, version, card_version) VALUES (?, 0, 1)
+        ON CONFLICT (user_id) DO UPDATE SET card_version = card_version + 1
+        """,
+        (user_id,)
+    )
+
+
+def card_version(conn, user_id: int) -> int:
+    row = conn.execute("SELECT card_version FROM user_data_versions WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def rebuild_leaderboard_counts(cursor, periods: Optional[Sequence[str]] = None):
+    """
+    Recomputes leaderboard_counts from leaderboard_scores, for the boards of
+    `periods` or all of them; on the global shard, inside the caller's
+    transaction. Every scored member adds one to each node on the path from
+    their bucket to the root.
+    """
+    where = f"period IN ({', '.join('?' * len(periods))})" if periods else "1"
+    params = list(periods or ())
+    cursor.execute(f"DELETE FROM leaderboard_counts WHERE {where}", params)
+    cursor.execute(
+        f"""
+        WITH RECURSIVE path (group_id, period, subject_id, node) AS (
+            SELECT group_id, period, subject_id, MIN(minutes, {LEADERBOARD_BUCKETS})
+            FROM leaderboard_scores
+            WHERE minutes > 0 AND {where}
+            UNION ALL
+            SELECT group_id, period, subject_id, node + (node & -node)
+            FROM path
+            WHERE node + (node & -node) <= {LEADERBOARD_BUCKETS}
+        )
+        INSERT INTO leaderboard_counts (group_id, period, subject_id, node, members)
+        SELECT group_id, period, subject_id, node, COUNT(*)
+        FROM path
+        GROUP BY group_id, period, subject_id, node
+        """,
+        params
+    )
+
+
 def init_db():
     """
-    Creates all required tables if they don't exist, and adds missing columns.
-    Safe to call multiple times.
+    Creates all required tables on every shard if they don't exist, and adds
+    missing columns. Safe to call multiple times.
     """
-    conn = get_db()
+    for shard in range(SHARD_COUNT):
+        _init_shard(shard)
+    replicate_subjects()
+
+
+def _init_shard(shard: int):
+    conn = get_db(shard=shard)
     cursor = conn.cursor()
 
     try:
+        if settings.journal_mode:
+            cursor.execute(f"PRAGMA journal_mode = {settings.journal_mode}")
+
+        cursor.execute("PRAGMA user_version")
+        if cursor.fetchone()[0] == SCHEMA_VERSION:
+            return
+
+        # Take the write lock up front so workers starting together don't
+        # race between the column checks and the ALTERs below
+        cursor.execute("BEGIN IMMEDIATE")
+
         # Users table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -78,6 +309,118 @@ def init_db():
             )
         """)
 
+        # Quiz decks - one per subject (or several), owned by a user
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS decks (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id     INTEGER NOT NULL,
+                subject_id  INTEGER NOT NULL,
+                name        TEXT NOT NULL,
+                created_at  TEXT NOT NULL,
+                FOREIGN KEY (user_id)    REFERENCES users(id) ON DELETE CASCADE,
+                FOREIGN KEY (subject_id) REFERENCES subjects(id) ON DELETE RESTRICT
+            )
+        """)
+
+        # Cards with their SM-2 scheduling state
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS cards (
+                id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                deck_id      INTEGER NOT NULL,
+                user_id      INTEGER NOT NULL,
+                front        TEXT NOT NULL,
+                back         TEXT NOT NULL,
+                ease         REAL NOT NULL DEFAULT 2.5,
+                interval     INTEGER NOT NULL DEFAULT 0,
+                repetitions  INTEGER NOT NULL DEFAULT 0,
+                next_due     TEXT NOT NULL,
+                review_count INTEGER NOT NULL DEFAULT 0,
+                lapse_count  INTEGER NOT NULL DEFAULT 0,
+                last_reviewed TEXT,
+                FOREIGN KEY (deck_id) REFERENCES decks(id) ON DELETE CASCADE,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+        """)
+
+        # Review log
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS card_reviews (
+                id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                card_id      INTEGER NOT NULL,
+                user_id      INTEGER NOT NULL,
+                grade        INTEGER NOT NULL,
+                reviewed_at  TEXT NOT NULL,
+                FOREIGN KEY (card_id) REFERENCES cards(id) ON DELETE CASCADE
+            )
+        """)
+
+        # "What is due now" is a range scan on (user_id, next_due)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cards_user_due ON cards(user_id, next_due)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cards_deck_due ON cards(deck_id, next_due)")
+        cursor.execute("DROP INDEX IF EXISTS idx_decks_user")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_decks_user_subject ON decks(user_id, subject_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_card_reviews_card ON card_reviews(card_id)")
+
+        # Study groups (e.g. a class) and their members
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS study_groups (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                name        TEXT NOT NULL,
+                owner_id    INTEGER NOT NULL,
+                created_at  TEXT NOT NULL,
+                FOREIGN KEY (owner_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+        """)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS group_members (
+                group_id   INTEGER NOT NULL,
+                user_id    INTEGER NOT NULL,
+                joined_at  TEXT NOT NULL,
+                PRIMARY KEY (group_id, user_id),
+                FOREIGN KEY (group_id) REFERENCES study_groups(id) ON DELETE CASCADE,
+                FOREIGN KEY (user_id)  REFERENCES users(id) ON DELETE CASCADE
+            )
+        """)
+
+        # Precomputed leaderboard minutes, maintained from session writes.
+        # period is '2026-W07' (ISO week) or '2026-02' (month);
+        # subject_id 0 is the all-subjects board.
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS leaderboard_scores (
+                group_id    INTEGER NOT NULL,
+                period      TEXT NOT NULL,
+                subject_id  INTEGER NOT NULL,
+                user_id     INTEGER NOT NULL,
+                minutes     INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (group_id, period, subject_id, user_id)
+            )
+        """)
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_group_members_user ON group_members(user_id)")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_leaderboard_rank
+            ON leaderboard_scores(group_id, period, subject_id, minutes DESC, user_id)
+        """)
+
+        # How many members of a board scored each number of minutes (bucket
+        # 1..LEADERBOARD_BUCKETS), kept as a Fenwick tree: node i holds the
+        # members of buckets i - lowbit(i) + 1 .. i. Adjusted with every
+        # score change, so "my rank" is one path of lookups (leaderboards.py).
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS leaderboard_counts (
+                group_id    INTEGER NOT NULL,
+                period      TEXT NOT NULL,
+                subject_id  INTEGER NOT NULL,
+                node        INTEGER NOT NULL,
+                members     INTEGER NOT NULL,
+                PRIMARY KEY (group_id, period, subject_id, node)
+            )
+        """)
+        if not cursor.execute("SELECT 1 FROM leaderboard_counts LIMIT 1").fetchone():
+            # Boards scored before the counts existed
+            rebuild_leaderboard_counts(cursor)
+
         # ────────────────────────────────────────────────
         # Add missing columns to goals table (safe ALTER)
         # ────────────────────────────────────────────────
@@ -99,8 +442,190 @@ def init_db():
             cursor.execute("ALTER TABLE goals ADD COLUMN last_done TEXT")
             print("Added column 'last_done' to goals table")
 
+        # Goals linked to a subject: progress follows logged study time,
+        # kept as a running total by goal_progress.add_minutes
+        if "subject_id" not in existing_columns:
+            cursor.execute("ALTER TABLE goals ADD COLUMN subject_id INTEGER")
+            print("Added column 'subject_id' to goals table")
+
+        if "target_minutes" not in existing_columns:
+            cursor.execute("ALTER TABLE goals ADD COLUMN target_minutes INTEGER")
+            print("Added column 'target_minutes' to goals table")
+
+        if "logged_minutes" not in existing_columns:
+            cursor.execute("ALTER TABLE goals ADD COLUMN logged_minutes INTEGER NOT NULL DEFAULT 0")
+            print("Added column 'logged_minutes' to goals table")
+
+        if "linked_since" not in existing_columns:
+            cursor.execute("ALTER TABLE goals ADD COLUMN linked_since TEXT")
+            print("Added column 'linked_since' to goals table")
+
+        # Daily goal reminders (reminders.py): the time of day to remind at,
+        # and the last day a reminder was sent
+        if "remind_at" not in existing_columns:
+            cursor.execute("ALTER TABLE goals ADD COLUMN remind_at TEXT")
+            print("Added column 'remind_at' to goals table")
+
+        if "reminded_on" not in existing_columns:
+            cursor.execute("ALTER TABLE goals ADD COLUMN reminded_on TEXT")
+            print("Added column 'reminded_on' to goals table")
+
+        # A user's sessions by date: linking a goal, reconciling it, and the
+        # planner's recent-pace queries
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_study_sessions_user_date ON study_sessions(user_id, session_date)")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_goals_user_subject
+            ON goals(user_id, subject_id) WHERE subject_id IS NOT NULL
+        """)
+
+        # reminders.py loads the goals to remind at startup from this alone
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_goals_reminders
+            ON goals(remind_at) WHERE type = 'daily' AND remind_at IS NOT NULL
+        """)
+
+        # Per-user deletes in purge.py's batches (and goal lists) by user_id
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_goals_user ON goals(user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_card_reviews_user ON card_reviews(user_id)")
+
+        # Deleted users whose rows purge.py still has to remove
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS purge_jobs (
+                id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id      INTEGER NOT NULL,
+                status       TEXT NOT NULL DEFAULT 'pending',
+                created_at   TEXT NOT NULL,
+                started_at   TEXT,
+                finished_at  TEXT,
+                heartbeat_at TEXT,
+                rows_deleted INTEGER NOT NULL DEFAULT 0,
+                step         TEXT,
+                attempts     INTEGER NOT NULL DEFAULT 0,
+                error        TEXT
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_purge_jobs_status ON purge_jobs(status, id)")
+
+        # Archived study sessions and their daily rollups (archive.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS study_sessions_archive (
+                user_id   INTEGER NOT NULL,
+                month     TEXT NOT NULL,
+                sessions  INTEGER NOT NULL,
+                minutes   INTEGER NOT NULL,
+                payload   BLOB NOT NULL,
+                PRIMARY KEY (user_id, month)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS session_rollups (
+                user_id     INTEGER NOT NULL,
+                day         TEXT NOT NULL,
+                subject_id  INTEGER NOT NULL,
+                sessions    INTEGER NOT NULL,
+                minutes     INTEGER NOT NULL,
+                PRIMARY KEY (user_id, day, subject_id)
+            )
+        """)
+        # Notes of archived sessions, also in their payload, for the search
+        # index (search.py); only sessions with notes have a row
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS archived_notes (
+                id       INTEGER PRIMARY KEY,
+                user_id  INTEGER NOT NULL,
+                notes    TEXT NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_archived_notes_user ON archived_notes(user_id)")
+
+        # Session id range of each archived month, so a session is found by id
+        # without decoding every month; NULL for months archived before these
+        cursor.execute("PRAGMA table_info(study_sessions_archive)")
+        archive_columns = [col[1] for col in cursor.fetchall()]
+        for column in ("min_id", "max_id"):
+            if column not in archive_columns:
+                cursor.execute(f"ALTER TABLE study_sessions_archive ADD COLUMN {column} INTEGER")
+                print(f"Added column '{column}' to study_sessions_archive table")
+
+        # A counter per user, bumped by every transaction that writes their
+        # sessions or goals (bump_data_version). The per-process caches built
+        # from those rows (analytics, planner, forecasting) remember the
+        # version they were built at and rebuild when it moved, so a write
+        # through one worker process is seen by every other one. card_version
+        # does the same for the set of cards the practice sampler draws from.
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_data_versions (
+                user_id       INTEGER PRIMARY KEY,
+                version       INTEGER NOT NULL,
+                card_version  INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("PRAGMA table_info(user_data_versions)")
+        if "card_version" not in [col[1] for col in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE user_data_versions ADD COLUMN card_version INTEGER NOT NULL DEFAULT 0")
+            print("Added column 'card_version' to user_data_versions table")
+
+        # Practice sampler banks (sampler.py): the card ids of one (user,
+        # subject) in ascending order and their weights, as raw int64 /
+        # float64 arrays, so a worker loads a bank without reading its cards
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sampler_banks (
+                user_id       INTEGER NOT NULL,
+                subject_id    INTEGER NOT NULL,
+                card_version  INTEGER NOT NULL,
+                built_at      REAL NOT NULL,
+                card_ids      BLOB NOT NULL,
+                weights       BLOB NOT NULL,
+                PRIMARY KEY (user_id, subject_id)
+            )
+        """)
+
+        # Running study timers, checkpointed from memory (timers.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS live_timers (
+                user_id        INTEGER PRIMARY KEY,
+                subject_id     INTEGER NOT NULL,
+                notes          TEXT,
+                started_at     TEXT NOT NULL,
+                elapsed_s      REAL NOT NULL DEFAULT 0,
+                segment_start  REAL,
+                last_beat      REAL NOT NULL
+            )
+        """)
+
+        # Answer stats used by the practice sampler
+        cursor.execute("PRAGMA table_info(cards)")
+        card_columns = [col[1] for col in cursor.fetchall()]
+
+        if "review_count" not in card_columns:
+            cursor.execute("ALTER TABLE cards ADD COLUMN review_count INTEGER NOT NULL DEFAULT 0")
+            print("Added column 'review_count' to cards table")
+
+        if "lapse_count" not in card_columns:
+            cursor.execute("ALTER TABLE cards ADD COLUMN lapse_count INTEGER NOT NULL DEFAULT 0")
+            print("Added column 'lapse_count' to cards table")
+
+        if "last_reviewed" not in card_columns:
+            cursor.execute("ALTER TABLE cards ADD COLUMN last_reviewed TEXT")
+            print("Added column 'last_reviewed' to cards table")
+
+        # The sampler catches up on recent answers with a range scan
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cards_user_reviewed ON cards(user_id, last_reviewed)")
+
+        if shard != GLOBAL_SHARD:
+            # Start this shard's ids at shard * ID_RANGE
+            for table in SHARDED_TABLES:
+                cursor.execute(
+                    """
+                    INSERT INTO sqlite_sequence (name, seq)
+                    SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+                    """,
+                    (table, shard * ID_RANGE, table)
+                )
+
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         conn.commit()
-        print("Database tables and columns initialized successfully")
+        print(f"Database tables and columns initialized successfully ({shard_path(shard)})")
 
     except sqlite3.Error as e:
         print(f"Error during init/migration: {e}")
@@ -0,0 +1,75 @@
+# fenwick.py
+#
+# Binary indexed tree shared by the planner (integer minutes) and the
+# practice sampler (float weights).
+from typing import List, Sequence, Union
+
+import numpy as np
+
+Number = Union[int, float]
+
+
+def build_tree(values: np.ndarray) -> np.ndarray:
+    """
+    The internal array of FenwickTree(values) (index 0 unused), built level
+    by level with NumPy: node i adds itself into i + lowbit(i) once all the
+    nodes below it are complete, i.e. in order of lowbit.
+    """
+    n = len(values)
+    tree = np.zeros(n + 1, dtype=np.float64)
+    tree[1:] = values
+    step = 1
+    while 2 * step <= n:
+        tree[2 * step::2 * step] += tree[step:n + 1 - step:2 * step]
+        step *= 2
+    return tree
+
+
+class FenwickTree:
+    """Prefix sums over a fixed-size list with O(log n) point updates."""
+
+    def __init__(self, values: List[Number]):
+        self.n = len(values)
+        self.tree = [0] + list(values)
+        for i in range(1, self.n + 1):
+            j = i + (i & -i)
+            if j <= self.n:
+                self.tree[j] += self.tree[i]
+
+    @classmethod
+    def from_tree(cls, tree: Sequence[Number]) -> "FenwickTree":
+        """Wraps an already built internal array (see build_tree)."""
+        self = cls.__new__(cls)
+        self.n = len(tree) - 1
+        self.tree = tree
+        return self
+
+    def add(self, index: int, delta: Number):
+        i = index + 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, count: int) -> Number:
+        """Sum of the first `count` values."""
+        total = 0
+        i = count
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def search(self, target: Number) -> int:
+        """Smallest index whose inclusive prefix sum is > target (n if none)."""
+        pos = 0
+        step = 1 << self.n.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+    def total(self) -> Number:
+        return self.prefix(self.n)
@@ -0,0 +1,216 @@
+# forecasting.py
+#
+# Completion forecasts for a user's milestone goals.
+#
+# A goal linked to a subject and target_minutes (goal_progress.py) has a
+# measurable remainder: target_minutes - logged_minutes. Its pace is
+# the study time on its subject per day over the last FIT_DAYS days.
+# Progress on any other goal is set by hand, so its remainder is its
+# remaining percent of its effort (target_minutes, or GOAL_MINUTES as the
+# planner assumes) and its pace is the user's study time per day on all
+# subjects. All of a user's goals are fitted at once:
+#
+#   Y       rows x FIT_DAYS matrix of daily minutes, one per subject of a
+#           linked goal plus one for all subjects, from np.bincount over
+#           the user's cached session arrays (analytics.py) on the window
+#   lstsq   one np.linalg.lstsq of Y against [1, t], giving every row's
+#           intercept and slope (trend, minutes/day per day) together
+#   pace    the fitted line at today, floored at 0 (minutes/day)
+#
+# The estimated completion is the day the remainder runs out at that pace,
+# today included: today + ceil(remainder / pace) - 1 (none at pace 0). The
+# planner schedules linked goals at the same pace (planner.py), so its
+# finish date is this date.
+# With a target_date the goal is on_track if that is on or before the
+# target and at_risk otherwise, or overdue once the target has passed; without
+# one it is no_deadline. Goals at 100% are done. A goal is untracked only
+# when there is nothing to fit it on: it is not linked and the user logged
+# no session in the window (basis says which fit a forecast came from).
+#
+# Forecasts are cached per user under the user's data version, which every
+# session and goal write bumps in the shard (Storage.data_version), so a
+# write in any worker makes the next read refit; invalidate() only frees
+# the entry in this process early. They also expire at midnight UTC, when
+# "today" moves.
+#
+#   python forecasting.py goals 42     # one user's forecasts as JSON
+import argparse
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import analytics
+from config import settings
+from storage import get_storage
+
+FIT_DAYS = 28
+GOAL_MINUTES = 600  # assumed effort of a goal without target_minutes
+MAX_CACHED_USERS = settings.analytics_cache_size
+GOAL_FIELDS = ["id", "title", "progress", "target_date", "type", "subject_id", "target_minutes", "logged_minutes"]
+
+
+def _today_number() -> int:
+    # session days are UTC (analytics.py)
+    return int(np.datetime64(datetime.now(timezone.utc).date(), "D").astype(np.int64))
+
+
+def _day_number(value: Optional[str]) -> Optional[int]:
+    """A target_date's day number; None when missing or not a date."""
+    if not value:
+        return None
+    try:
+        return int(np.datetime64(value[:10], "D").astype(np.int64))
+    except ValueError:
+        return None
+
+
+def _date(number: int) -> str:
+    return str(np.datetime64(number, "D"))
+
+
+def daily_minutes(arrays: analytics.SessionArrays, subject_ids: np.ndarray, today: int) -> np.ndarray:
+    """
+    len(subject_ids) + 1 rows of minutes per day over the FIT_DAYS days
+    ending today: one per entry of `subject_ids`, then one for all subjects.
+    """
+    first = today - FIT_DAYS + 1
+    lo, hi = np.searchsorted(arrays.day, [first, today + 1])
+    day, subject, minutes = arrays.day[lo:hi] - first, arrays.subject[lo:hi], arrays.minutes[lo:hi]
+    overall = np.bincount(day, weights=minutes, minlength=FIT_DAYS)
+    if not len(subject_ids):
+        return overall[None, :]
+
+    # Rows for the distinct subjects, then one row per entry
+    subjects = np.unique(subject_ids)
+    row = np.searchsorted(subjects, subject).clip(max=len(subjects) - 1)
+    wanted = subjects[row] == subject
+    daily = np.bincount(row[wanted] * FIT_DAYS + day[wanted], weights=minutes[wanted],
+                        minlength=len(subjects) * FIT_DAYS).reshape(len(subjects), FIT_DAYS)
+    return np.vstack([daily[np.searchsorted(subjects, subject_ids)], overall])
+
+
+def fit(y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(pace, trend) per row of `y`: least-squares lines evaluated at today (floored at 0) and their slopes."""
+    t = np.arange(FIT_DAYS)
+    (intercept, slope), *_ = np.linalg.lstsq(np.column_stack([np.ones(FIT_DAYS), t]), y.T, rcond=None)
+    return np.maximum(intercept + slope * (FIT_DAYS - 1), 0.0), slope
+
+
+def fit_pace(arrays: analytics.SessionArrays, subject_ids: np.ndarray, today: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(pace, trend) of the daily minutes on each entry of `subject_ids` over the FIT_DAYS days ending today."""
+    pace, trend = fit(daily_minutes(arrays, subject_ids, today))
+    return pace[:-1], trend[:-1]
+
+
+def forecast(goals: List[Dict], arrays: analytics.SessionArrays, today: Optional[int] = None) -> List[Dict]:
+    """Forecasts for the milestone goals among `goals` (GOAL_FIELDS rows), in their order."""
+    today = _today_number() if today is None else today
+    goals = [g for g in goals if (g["type"] or "milestone") == "milestone"]
+    if not goals:
+        return []
+
+    linked = np.array([g["subject_id"] is not None and bool(g["target_minutes"]) for g in goals])
+    progress = np.array([g["progress"] or 0 for g in goals])
+    target = np.array([_day_number(g["target_date"]) for g in goals], dtype=float)  # NaN: no deadline
+    effort = np.array([g["target_minutes"] or GOAL_MINUTES for g in goals], dtype=float)
+    logged = np.array([g["logged_minutes"] or 0 for g in goals], dtype=float)
+    remaining = np.where(linked, np.maximum(effort - logged, 0),
+                         np.round(effort * np.maximum(100 - progress, 0) / 100))
+
+    # One fit for the linked goals' subjects and the user's study overall
+    subject_ids = np.array([g["subject_id"] for g in goals], dtype=object)[linked].astype(np.int64)
+    y = daily_minutes(arrays, subject_ids, today)
+    fitted_pace, fitted_trend = fit(y)
+    pace, trend = np.full(len(goals), fitted_pace[-1]), np.full(len(goals), fitted_trend[-1])
+    pace[linked], trend[linked] = fitted_pace[:-1], fitted_trend[:-1]
+    tracked = linked | (y[-1].sum() > 0)
+
+    done = (progress >= 100) | (linked & (remaining == 0))
+    moving = tracked & ~done & (pace > 0)
+    eta = np.full(len(goals), np.nan)
+    eta[moving] = today + np.ceil(remaining[moving] / pace[moving]) - 1  # today included
+    has_target = ~np.isnan(target)
+    days_left = target - today
+    with np.errstate(invalid="ignore"):
+        status = np.select(
+            [done, has_target & (days_left < 0), ~tracked, ~has_target, moving & (eta <= target)],
+            ["done", "overdue", "untracked", "no_deadline", "on_track"],
+            "at_risk"
+        )
+        required = np.where(tracked & ~done & has_target & (days_left >= 0),
+                            remaining / np.maximum(days_left + 1, 1), np.nan)  # today included
+
+    return [
+        {
+            "goal_id": g["id"],
+            "title": g["title"],
+            "status": str(status[i]),
+            "progress": int(progress[i]),
+            "target_date": g["target_date"],
+            "basis": ("subject" if linked[i] else "overall") if tracked[i] else None,
+            "remaining_minutes": int(remaining[i]) if tracked[i] else None,
+            "pace": round(float(pace[i]), 1) if tracked[i] else None,
+            "trend": round(float(trend[i]), 2) if tracked[i] else None,
+            "required_pace": None if np.isnan(required[i]) else round(float(required[i]), 1),
+            "estimated_completion": None if np.isnan(eta[i]) else _date(int(eta[i])),
+        }
+        for i, g in enumerate(goals)
+    ]
+
+
+# ────────────────────────────────────────────────
+# Per-user forecast cache
+# ────────────────────────────────────────────────
+_forecasts: "OrderedDict[int, Tuple[int, int, List[Dict]]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def user_forecasts(user_id: int) -> List[Dict]:
+    today = _today_number()
+    # read first: sessions and goals loaded after it are at least that new
+    version = analytics.data_version(user_id)
+    with _lock:
+        cached = _forecasts.get(user_id)
+        if cached is not None and cached[:2] == (today, version):
+            _forecasts.move_to_end(user_id)
+            return cached[2]
+
+    result = forecast(get_storage().list_goals(user_id, GOAL_FIELDS), analytics.get_arrays(user_id), today)
+    with _lock:
+        cached = _forecasts.get(user_id)
+        if cached is None or cached[:2] <= (today, version):
+            _forecasts[user_id] = (today, version, result)
+            _forecasts.move_to_end(user_id)
+            while len(_forecasts) > MAX_CACHED_USERS:
+                _forecasts.popitem(last=False)
+    return result
+
+
+def invalidate(user_id: int):
+    """Drop the user's forecasts in this process (other workers go by the data version)."""
+    with _lock:
+        _forecasts.pop(user_id, None)
+
+
+def invalidate_all():
+    with _lock:
+        _forecasts.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Completion forecasts for milestone goals")
+    commands = parser.add_subparsers(dest="command", required=True)
+    goals_parser = commands.add_parser("goals")
+    goals_parser.add_argument("user_id", type=int)
+    args = parser.parse_args()
+
+    if args.command == "goals":
+        print(json.dumps(user_forecasts(args.user_id), indent=2))
+
+
+if __name__ == "__main__":
+    main()
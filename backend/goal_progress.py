@@ -0,0 +1,143 @@
+# goal_progress.py
+#
+# Milestone goals linked to a subject and a target number of minutes.
+#
+# A linked goal keeps a running total, goals.logged_minutes, of the study
+# time logged for its subject in sessions dated at or after it was linked
+# (goals.linked_since), and its progress is that total as a percentage of
+# target_minutes. Every session write adjusts the totals in the same
+# transaction, via the (user_id, subject_id) index on goals, so a write
+# costs one indexed UPDATE and reads never sum study_sessions. Goals and
+# sessions share the user's shard. Anything that writes sessions around
+# this (bulk loads, manual edits, a crash between shards in rebalance.py)
+# is repaired by reconcile():
+#
+#   python goal_progress.py reconcile            # every user, every shard
+#   python goal_progress.py reconcile --user 42
+import argparse
+import json
+from typing import Dict, Optional
+
+import archive
+import database
+
+# Percentage for `logged` of `target` minutes, as the UPDATEs below compute it
+PROGRESS_SQL = "MIN(100, MAX(0, {logged} * 100 / target_minutes))"
+
+
+def progress_for(logged: int, target: int) -> int:
+    return min(100, max(0, logged * 100 // target)) if target else 0
+
+
+def add_minutes(cursor, user_id: int, subject_id: int, minutes: int, session_date: str):
+    """
+    Apply a session's minutes (negative to remove them) to the user's goals
+    linked to its subject since before the session. Runs on the caller's
+    cursor, inside its transaction; `cursor` must be on the user's shard.
+    """
+    if not minutes:
+        return
+    cursor.execute(
+        f"""
+        UPDATE goals
+        SET logged_minutes = logged_minutes + ?1,
+            progress = {PROGRESS_SQL.format(logged="(logged_minutes + ?1)")}
+        WHERE user_id = ?2 AND subject_id = ?3 AND linked_since <= ?4
+        """,
+        (minutes, user_id, subject_id, session_date)
+    )
+
+
+def link(cursor, goal_id: int, relinked: bool):
+    """
+    After a goal was linked or its subject or target changed: restart the
+    total when the subject changed (only sessions from now on count), then
+    recompute the percentage. session_date has one-second resolution, so
+    sessions already logged in the linking second are counted too, as
+    reconcile() would.
+    """
+    if relinked:
+        cursor.execute(
+            """
+            UPDATE goals
+            SET linked_since = datetime('now'),
+                logged_minutes = (
+                    SELECT COALESCE(SUM(s.duration), 0) FROM study_sessions s
+                    WHERE s.user_id = goals.user_id AND s.subject_id = goals.subject_id
+                      AND s.session_date >= datetime('now')
+                )
+            WHERE id = ?
+            """,
+            (goal_id,)
+        )
+    cursor.execute(
+        f"UPDATE goals SET progress = {PROGRESS_SQL.format(logged='logged_minutes')} WHERE id = ? AND target_minutes > 0",
+        (goal_id,)
+    )
+
+
+def reconcile(user_id: Optional[int] = None) -> Dict:
+    """
+    Recompute every linked goal's total from study_sessions and fix the
+    ones that drifted. Each shard is checked under its write lock, so no
+    session write can land between the sum and the fix.
+    """
+    shards = [database.shard_for(user_id)] if user_id is not None else range(database.SHARD_COUNT)
+    checked = 0
+    repaired = []
+    for shard in shards:
+        db = database.get_db(shard=shard)
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            rows = db.execute(
+                """
+                SELECT g.id, g.user_id, g.subject_id, g.linked_since, g.logged_minutes,
+                       COALESCE(SUM(s.duration), 0) AS actual
+                FROM goals g
+                LEFT JOIN study_sessions s
+                  ON s.user_id = g.user_id AND s.subject_id = g.subject_id AND s.session_date >= g.linked_since
+                WHERE g.subject_id IS NOT NULL AND (?1 IS NULL OR g.user_id = ?1)
+                GROUP BY g.id
+                """,
+                (user_id,)
+            ).fetchall()
+            checked += len(rows)
+            drifted = []
+            stale_users = set()
+            for row in rows:
+                # Goals linked before the archive cutoff count archived sessions too
+                actual = row["actual"] + archive.archived_minutes(
+                    db.cursor(), row["user_id"], row["subject_id"], row["linked_since"])
+                if actual != row["logged_minutes"]:
+                    drifted.append((actual, row["id"]))
+                    stale_users.add(row["user_id"])
+            db.executemany(
+                f"""
+                UPDATE goals
+                SET logged_minutes = ?1, progress = {PROGRESS_SQL.format(logged="?1")}
+                WHERE id = ?2
+                """,
+                drifted
+            )
+            for stale_user in stale_users:
+                database.bump_data_version(db, stale_user)
+            db.commit()
+            repaired.extend(goal_id for _, goal_id in drifted)
+        finally:
+            db.close()
+    return {"checked": checked, "repaired": len(repaired), "goal_ids": repaired}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Linked goal progress maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("reconcile").add_argument("--user", type=int, help="only this user's goals")
+    args = parser.parse_args()
+
+    if args.command == "reconcile":
+        database.init_db()
+        print(json.dumps(reconcile(args.user), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# import_budget.py
+#
+# Cold-start budget for the API and the Streamlit pages. Workers are
+# recycled often, so every start pays these costs again.
+#
+# Each target is timed in a fresh interpreter (median of --runs):
+#   api           `import main` plus the startup hook (init_db, init_search)
+#                 on an already initialized database, as for a recycled worker
+#   <page>.py     the module-level imports of frontend/app.py and each
+#                 frontend/pages/*.py, with streamlit and requests already
+#                 loaded (as they are in the Streamlit server). Imports
+#                 inside functions or branches are lazy and not counted.
+# A target over its budget fails the run (exit 1) and lists its heaviest
+# imports from `python -X importtime`.
+#
+#   python import_budget.py
+#   python import_budget.py api --runs 5 --budget api=600
+import argparse
+import ast
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+FRONTEND_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "frontend")
+
+# Milliseconds; "page" is the default for every page without its own entry
+BUDGETS_MS = {
+    "api": 1000,
+    "page": 150,
+}
+
+PAGE_PRELOAD = ["streamlit", "requests"]
+MARKER = "--- timed ---"
+
+API_CODE = """
+import asyncio, sys, time
+print({marker!r}, file=sys.stderr, flush=True)
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+asyncio.run(main.startup_event())
+done = time.perf_counter()
+print(f"{{(done - started) * 1000:.3f}} import={{(imported - started) * 1000:.1f}} startup={{(done - imported) * 1000:.1f}}")
+"""
+
+PAGE_CODE = """
+import sys, time
+for name in {preload!r}:
+    try:
+        __import__(name)
+    except ImportError:
+        pass
+print({marker!r}, file=sys.stderr, flush=True)
+started = time.perf_counter()
+{imports}
+print(f"{{(time.perf_counter() - started) * 1000:.3f}}")
+"""
+
+
+def page_files() -> List[str]:
+    pages_dir = os.path.join(FRONTEND_DIR, "pages")
+    pages = sorted(os.path.join(pages_dir, name) for name in os.listdir(pages_dir) if name.endswith(".py"))
+    return [os.path.join(FRONTEND_DIR, "app.py")] + pages
+
+
+def module_imports(path: str) -> str:
+    """The page's module-level import statements, as source."""
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    nodes = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return "\n".join(ast.unparse(node) for node in nodes) or "pass"
+
+
+def run_once(code: str, cwd: str, env: Dict[str, str], importtime: bool = False) -> Tuple[Optional[str], str]:
+    """Returns (stdout's last line or None on failure, stderr after the marker)."""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    result = subprocess.run(command, cwd=cwd, env=env, capture_output=True, text=True)
+    stderr = result.stderr.split(MARKER, 1)[-1]
+    if result.returncode != 0:
+        return None, stderr
+    return result.stdout.strip().splitlines()[-1], stderr
+
+
+def heaviest_imports(importtime_log: str, limit: int = 8) -> List[Tuple[int, str]]:
+    """Imports by cumulative microseconds, down to the modules they import directly."""
+    found = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth > 1:
+            continue
+        found.append((int(cumulative), "  " * depth + name.strip()))
+    return sorted(found, reverse=True)[:limit]
+
+
+def measure(name: str, code: str, cwd: str, env: Dict[str, str], runs: int, budget: float) -> bool:
+    samples = []
+    for _ in range(runs):
+        line, stderr = run_once(code, cwd, env)
+        if line is None:
+            error = stderr.strip().splitlines()[-1] if stderr.strip() else "failed"
+            print(f"  {name:<22} ERROR  {error}")
+            return False
+        value, *detail = line.split()
+        samples.append((float(value), " ".join(detail)))
+
+    median, detail = sorted(samples)[(len(samples) - 1) // 2]
+    ok = median <= budget
+    print(f"  {name:<22} {median:8.1f} ms  (budget {budget:.0f} ms)  {'ok' if ok else 'OVER'}  {detail}")
+    if not ok:
+        _, log = run_once(code, cwd, env, importtime=True)
+        for cumulative, module in heaviest_imports(log):
+            print(f"      {cumulative / 1000:8.1f} ms  {module}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when cold-start import time exceeds its budget")
+    parser.add_argument("targets", nargs="*", help="api and/or page file names (default: all)")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per target (median)")
+    parser.add_argument("--budget", action="append", default=[], metavar="TARGET=MS",
+                        help="override a budget, e.g. api=600, page=200 or dashboard.py=100")
+    args = parser.parse_args()
+
+    budgets = dict(BUDGETS_MS)
+    for item in args.budget:
+        target, _, ms = item.partition("=")
+        budgets[target] = float(ms)
+
+    ok = True
+    with tempfile.TemporaryDirectory(prefix="study-import-budget-") as tmp:
+        # A database initialized beforehand, as a recycled worker would find it
+        api_env = dict(os.environ, STUDY_DB_PATH=os.path.join(tmp, "study.db"), PYTHONPATH=BACKEND_DIR)
+        page_env = dict(os.environ, PYTHONPATH=FRONTEND_DIR)
+
+        if not args.targets or "api" in args.targets:
+            print("backend")
+            run_once(API_CODE.format(marker=MARKER), tmp, api_env)
+            ok &= measure("api", API_CODE.format(marker=MARKER), tmp, api_env, args.runs, budgets["api"])
+
+        pages = [path for path in page_files()
+                 if not args.targets or os.path.basename(path) in args.targets]
+        if pages:
+            print("frontend")
+        for path in pages:
+            name = os.path.basename(path)
+            code = PAGE_CODE.format(preload=PAGE_PRELOAD, marker=MARKER, imports=module_imports(path))
+            ok &= measure(name, code, FRONTEND_DIR, page_env, args.runs, budgets.get(name, budgets["page"]))
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+# leaderboards.py
+#
+# Weekly and monthly study-minute leaderboards for study groups.
+#
+# Scores live in leaderboard_scores, one row per (group, period, subject,
+# user): a session adds its minutes to the member's rows in each of their
+# groups, for its week and month, on both the subject board and the
+# all-subjects board (subject_id 0). Reads never touch study_sessions:
+#   - top K is a range scan of idx_leaderboard_rank, already in rank order
+#   - "my rank" is one plus the members scoring more than me, read from
+#     leaderboard_counts: per board, a Fenwick tree over one-minute buckets
+#     (database.LEADERBOARD_BUCKETS) of how many members scored each number
+#     of minutes. The members above me are the tree's total minus its
+#     prefix sum up to my bucket, one IN lookup of at most 17 nodes by
+#     primary key however large the board. Every score change moves the
+#     member between buckets in the same transaction, updating the nodes
+#     on the path from each bucket to the root.
+# Both tables are shared by every worker process, so rankings are
+# consistent no matter which worker served the write.
+#
+# Group tables live on the global shard. A session write updates the
+# boards in one global transaction after its own transaction on the user's
+# shard has committed (apply()), and only when the user is in a group at
+# all, so a failed session write never reaches the boards. A board update
+# lost after its session committed is repaired by reconcile(), which
+# recomputes the current week and month from the sessions:
+#
+#   python leaderboards.py reconcile            # every member
+#   python leaderboards.py reconcile --user 42
+import argparse
+import json
+import sqlite3
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import database
+
+ALL_SUBJECTS = 0
+BUCKETS = database.LEADERBOARD_BUCKETS
+
+
+def period_keys(day: date) -> Tuple[str, str]:
+    """(ISO week key, month key) for a date, e.g. ('2026-W07', '2026-02')."""
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}", f"{day.year}-{day.month:02d}"
+
+
+def current_period(kind: str) -> str:
+    week, month = period_keys(datetime.now(timezone.utc).date())
+    return week if kind == "week" else month
+
+
+def _move_counts(cursor, moves: Iterable[Tuple[int, str, int, int, int]]):
+    """
+    Move members between buckets of leaderboard_counts, for score changes
+    of (group_id, period, subject_id, old minutes, new minutes). Members
+    without minutes are not counted.
+    """
+    deltas: Dict[Tuple[int, str, int, int], int] = defaultdict(int)
+    for group_id, period, subject_id, old, new in moves:
+        for minutes, step in ((old, -1), (new, 1)):
+            node = min(minutes, BUCKETS)
+            while 0 < node <= BUCKETS:
+                deltas[(group_id, period, subject_id, node)] += step
+                node += node & -node
+    cursor.executemany(
+        """
+        INSERT INTO leaderboard_counts (group_id, period, subject_id, node, members)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (group_id, period, subject_id, node)
+        DO UPDATE SET members = members + excluded.members
+        """,
+        [(*key, delta) for key, delta in deltas.items() if delta]
+    )
+
+
+def _members_above(cursor, group_id: int, period: str, subject_id: int, minutes: int) -> int:
+    """Members of the board scoring more than `minutes`: total minus the prefix sum up to its bucket."""
+    path = []
+    node = min(max(minutes, 0), BUCKETS)
+    while node > 0:
+        path.append(node)
+        node -= node & -node
+    nodes = set(path) | {BUCKETS}
+    cursor.execute(
+        f"""
+        SELECT node, members FROM leaderboard_counts
+        WHERE group_id = ? AND period = ? AND subject_id = ? AND node IN ({', '.join('?' * len(nodes))})
+        """,
+        (group_id, period, subject_id, *nodes)
+    )
+    members = dict(cursor.fetchall())
+    return members.get(BUCKETS, 0) - sum(members.get(node, 0) for node in path)
+
+
+def add_minutes(cursor, user_id: int, subject_id: int, minutes: int, session_date: Optional[str] = None):
+    """
+    Apply a session's minutes (negative to remove them) to every leaderboard
+    the user is on. Runs on the caller's cursor, inside its transaction;
+    `cursor` must be on the global shard.
+    """
+    if not minutes:
+        return
+    # Most users are in no group: skip the write (and its lock) entirely
+    cursor.execute("SELECT 1 FROM group_members WHERE user_id = ? LIMIT 1", (user_id,))
+    if cursor.fetchone() is None:
+        return
+    day = date.fromisoformat(session_date[:10]) if session_date else datetime.now(timezone.utc).date()
+    moves = []
+    for period in period_keys(day):
+        for subject in (subject_id, ALL_SUBJECTS):
+            cursor.execute(
+                """
+                INSERT INTO leaderboard_scores (group_id, period, subject_id, user_id, minutes)
+                SELECT group_id, ?1, ?2, user_id, ?3 FROM group_members WHERE user_id = ?4
+                ON CONFLICT (group_id, period, subject_id, user_id)
+                DO UPDATE SET minutes = minutes + excluded.minutes
+                RETURNING group_id, minutes
+                """,
+                (period, subject, minutes, user_id)
+            )
+            moves += [(group_id, period, subject, total - minutes, total) for group_id, total in cursor.fetchall()]
+    _move_counts(cursor, moves)
+
+
+def apply(user_id: int, changes: List[Tuple[int, int, str]]):
+    """
+    Apply a committed session write, as (subject_id, minutes, session_date)
+    changes, to the user's boards in one transaction on the global shard.
+    Call it after the session's transaction has committed; a board update
+    that fails is logged and left to reconcile().
+    """
+    # An edit that keeps the subject, day and duration changes no score
+    net: Dict[Tuple[int, str], int] = defaultdict(int)
+    for subject_id, minutes, session_date in changes:
+        net[(subject_id, session_date)] += minutes
+    if not any(net.values()):
+        return
+    db = database.get_db()
+    try:
+        cursor = db.cursor()
+        for (subject_id, session_date), minutes in net.items():
+            add_minutes(cursor, user_id, subject_id, minutes, session_date)
+        db.commit()
+    except sqlite3.Error as e:
+        db.rollback()
+        print(f"Leaderboard update for user {user_id}: {e}", file=sys.stderr)
+    finally:
+        db.close()
+
+
+def backfill_member(cursor, group_id: int, user_id: int):
+    """
+    Seed a new member's current week and month scores from their sessions.
+    `cursor` is on the global shard; sessions are read from the user's shard.
+    """
+    sessions_db = None
+    reader = cursor
+    if database.shard_for(user_id) != cursor.connection.shard:
+        sessions_db = database.get_db(user_id)
+        reader = sessions_db.cursor()
+    try:
+        _backfill(cursor, reader, group_id, user_id)
+    finally:
+        if sessions_db:
+            sessions_db.close()
+
+
+def _backfill(cursor, reader, group_id: int, user_id: int):
+    today = datetime.now(timezone.utc).date()
+    week_key, month_key = period_keys(today)
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+
+    cursor.execute(
+        """
+        SELECT period, subject_id, minutes FROM leaderboard_scores
+        WHERE group_id = ? AND user_id = ? AND period IN (?, ?)
+        """,
+        (group_id, user_id, week_key, month_key)
+    )
+    old = {(period, subject_id): minutes for period, subject_id, minutes in cursor.fetchall()}
+    for period, start in ((week_key, week_start), (month_key, month_start)):
+        reader.execute(
+            """
+            SELECT subject_id, SUM(duration)
+            FROM study_sessions
+            WHERE user_id = ? AND session_date >= ?
+            GROUP BY subject_id
+            """,
+            (user_id, start.isoformat())
+        )
+        per_subject = reader.fetchall()
+        rows = [(group_id, period, subject_id, user_id, total) for subject_id, total in per_subject]
+        total = sum(t for _, t in per_subject)
+        if total:
+            rows.append((group_id, period, ALL_SUBJECTS, user_id, total))
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO leaderboard_scores (group_id, period, subject_id, user_id, minutes)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            rows
+        )
+        _move_counts(cursor, [(group_id, period, subject_id, old.get((period, subject_id), 0), minutes)
+                              for group_id, period, subject_id, _, minutes in rows])
+
+
+def remove_member(cursor, group_id: int, user_id: int):
+    cursor.execute(
+        "DELETE FROM leaderboard_scores WHERE group_id = ? AND user_id = ? RETURNING period, subject_id, minutes",
+        (group_id, user_id)
+    )
+    _move_counts(cursor, [(group_id, period, subject_id, minutes, 0)
+                          for period, subject_id, minutes in cursor.fetchall()])
+
+
+def get_leaderboard(cursor, group_id: int, user_id: int, period: str,
+                    subject_id: int = ALL_SUBJECTS, limit: int = 10) -> Dict:
+    cursor.execute(
+        """
+        SELECT ls.user_id, u.username, ls.minutes
+        FROM leaderboard_scores ls
+        JOIN users u ON u.id = ls.user_id
+        WHERE ls.group_id = ? AND ls.period = ? AND ls.subject_id = ? AND ls.minutes > 0
+        ORDER BY ls.minutes DESC, ls.user_id
+        LIMIT ?
+        """,
+        (group_id, period, subject_id, limit)
+    )
+    top: List[Dict] = []
+    for row in cursor.fetchall():
+        # Competition ranking: ties share a rank
+        if top and top[-1]["minutes"] == row["minutes"]:
+            rank = top[-1]["rank"]
+        else:
+            rank = len(top) + 1
+        top.append({"rank": rank, "user_id": row["user_id"], "username": row["username"], "minutes": row["minutes"]})
+
+    cursor.execute(
+        """
+        SELECT minutes FROM leaderboard_scores
+        WHERE group_id = ? AND period = ? AND subject_id = ? AND user_id = ?
+        """,
+        (group_id, period, subject_id, user_id)
+    )
+    row = cursor.fetchone()
+    my_minutes = row["minutes"] if row else 0
+    my_rank = _members_above(cursor, group_id, period, subject_id, my_minutes) + 1
+
+    return {
+        "period": period,
+        "subject_id": subject_id,
+        "top": top,
+        "me": {"rank": my_rank, "user_id": user_id, "minutes": my_minutes},
+    }
+
+
+def reconcile(user_id: Optional[int] = None) -> Dict:
+    """
+    Recompute members' current week and month scores from their sessions
+    and fix the ones that drifted, with their rank counts. Each shard's
+    members are checked with that shard and the global shard write-locked,
+    so no session write or board update can land between the sum and the
+    fix.
+    """
+    today = datetime.now(timezone.utc).date()
+    week_key, month_key = period_keys(today)
+    week_start = (today - timedelta(days=today.weekday())).isoformat()
+    month_start = today.replace(day=1).isoformat()
+
+    db = database.get_db()
+    try:
+        memberships = defaultdict(list)
+        for row in db.execute(
+            "SELECT user_id, group_id FROM group_members WHERE ?1 IS NULL OR user_id = ?1", (user_id,)
+        ):
+            memberships[row["user_id"]].append(row["group_id"])
+    finally:
+        db.close()
+    by_shard = defaultdict(list)
+    for member in memberships:
+        by_shard[database.shard_for(member)].append(member)
+
+    checked = 0
+    repaired = []
+    for shard, members in by_shard.items():
+        board_db = database.get_db()
+        sessions_db = board_db if shard == database.GLOBAL_SHARD else database.get_db(shard=shard)
+        try:
+            # Shard first, as session writes take it before the board's
+            sessions_db.execute("BEGIN IMMEDIATE")
+            if sessions_db is not board_db:
+                board_db.execute("BEGIN IMMEDIATE")
+            placeholders = ", ".join("?" * len(members))
+            actual: Dict[Tuple[int, str, int], int] = defaultdict(int)
+            for row in sessions_db.execute(
+                f"""
+                SELECT user_id, subject_id,
+                       SUM(CASE WHEN session_date >= ?1 THEN duration ELSE 0 END) AS week,
+                       SUM(CASE WHEN session_date >= ?2 THEN duration ELSE 0 END) AS month
+                FROM study_sessions
+                WHERE session_date >= MIN(?1, ?2) AND user_id IN ({placeholders})
+                GROUP BY user_id, subject_id
+                """,
+                (week_start, month_start, *members)
+            ):
+                for period, minutes in ((week_key, row["week"]), (month_key, row["month"])):
+                    actual[(row["user_id"], period, row["subject_id"])] += minutes
+                    actual[(row["user_id"], period, ALL_SUBJECTS)] += minutes
+
+            scores = {
+                (row["group_id"], row["user_id"], row["period"], row["subject_id"]): row["minutes"]
+                for row in board_db.execute(
+                    f"""
+                    SELECT group_id, user_id, period, subject_id, minutes FROM leaderboard_scores
+                    WHERE period IN (?, ?) AND user_id IN ({placeholders})
+                    """,
+                    (week_key, month_key, *members)
+                )
+            }
+            expected = {
+                (group_id, member, period, subject_id): minutes
+                for (member, period, subject_id), minutes in actual.items()
+                for group_id in memberships[member]
+            }
+            checked += len(scores.keys() | expected.keys())
+            drifted = [
+                (key, scores.get(key, 0), expected.get(key, 0))
+                for key in scores.keys() | expected.keys()
+                if scores.get(key, 0) != expected.get(key, 0)
+            ]
+            board_db.executemany(
+                """
+                INSERT INTO leaderboard_scores (group_id, user_id, period, subject_id, minutes)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (group_id, period, subject_id, user_id) DO UPDATE SET minutes = excluded.minutes
+                """,
+                [(*key, new) for key, _, new in drifted]
+            )
+            _move_counts(board_db, [(group_id, period, subject_id, old, new)
+                                    for (group_id, _, period, subject_id), old, new in drifted])
+            board_db.commit()
+            if sessions_db is not board_db:
+                sessions_db.rollback()
+            repaired.extend(drifted)
+        finally:
+            board_db.close()
+            if sessions_db is not board_db:
+                sessions_db.close()
+    return {
+        "checked": checked,
+        "repaired": len(repaired),
+        "user_ids": sorted({user for (_, user, _, _), _, _ in repaired}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leaderboard maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("reconcile").add_argument("--user", type=int, help="only this member's scores")
+    args = parser.parse_args()
+
+    if args.command == "reconcile":
+        database.init_db()
+        print(json.dumps(reconcile(args.user), indent=2))
+
+
+if __name__ == "__main__":
+    main()
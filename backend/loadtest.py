@@ -0,0 +1,496 @@
+# loadtest.py
+#
+# HTTP load-test harness for the Study Goal API.
+#
+# Starts the app with uvicorn on a fresh database in a temporary directory
+# (or targets --base-url), seeds users, then runs scripted user journeys from
+# async HTTP clients and reports throughput and per-endpoint p50/p95/p99
+# latency as JSON. Every route in the app's OpenAPI schema is exercised;
+# routes a run did not reach are listed under "uncovered_routes".
+#
+# Runs are reproducible for a given --seed, and the SQLite settings the
+# server ran with are recorded in the report, so runs against different
+# settings can be compared side by side.
+#
+#   python loadtest.py --concurrency 32 --duration 30
+#   python loadtest.py --rate 200 --duration 60 --out run.json --label wal
+#   python loadtest.py --workers 4 --env STUDY_PROFILE=bench --label 4w-bench
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SUBJECTS = [
+    "Mathematics", "Programming", "Art", "Music", "Philosophy", "Economics",
+    "Psychology", "Sociology", "Biology", "Physics", "Geography", "English",
+    "History", "Chemistry", "Literature", "Computer Science",
+]
+WORDS = [
+    "derivatives", "integrals", "recursion", "sorting", "photosynthesis",
+    "mitochondria", "renaissance", "baroque", "inflation", "supply", "demand",
+    "kinematics", "entropy", "sonnet", "grammar", "vectors", "matrices",
+]
+
+
+# ────────────────────────────────────────────────
+# Measurement
+# ────────────────────────────────────────────────
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.failures: Dict[str, int] = defaultdict(int)
+        self.journeys: Dict[str, int] = defaultdict(int)
+
+    def record(self, route: str, status: Optional[int], seconds: float):
+        if status is None:
+            self.failures[route] += 1
+            return
+        self.latencies[route].append(seconds)
+        self.statuses[route][status] += 1
+
+    def report(self, elapsed: float) -> Dict:
+        endpoints = {}
+        total = 0
+        for route in sorted(set(self.latencies) | set(self.failures)):
+            values = sorted(self.latencies[route])
+            count = len(values)
+            total += count
+            # 429 and 503 are admission control shedding load, not failures
+            shed = sum(n for status, n in self.statuses[route].items() if status in (429, 503))
+            errors = sum(n for status, n in self.statuses[route].items() if status >= 500 and status != 503)
+            endpoints[route] = {
+                "count": count,
+                "throughput_rps": round(count / elapsed, 2),
+                "server_errors": errors,
+                "shed": shed,
+                "transport_failures": self.failures[route],
+                "status_codes": {str(k): v for k, v in sorted(self.statuses[route].items())},
+                "latency_ms": {
+                    "mean": round(sum(values) / count * 1000, 3) if count else 0.0,
+                    "p50": round(percentile(values, 50) * 1000, 3),
+                    "p95": round(percentile(values, 95) * 1000, 3),
+                    "p99": round(percentile(values, 99) * 1000, 3),
+                    "max": round(values[-1] * 1000, 3) if count else 0.0,
+                },
+            }
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "journeys": dict(sorted(self.journeys.items())),
+            "endpoints": endpoints,
+        }
+
+
+class Api:
+    """Thin async client that times every call under its route template."""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder):
+        self.client = client
+        self.recorder = recorder
+
+    async def call(self, method: str, route: str, path: str, user_id: Optional[int] = None, **kwargs):
+        headers = {"X-User-Id": str(user_id)} if user_id is not None else None
+        t0 = time.perf_counter()
+        try:
+            r = await self.client.request(method, path, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(f"{method} {route}", None, time.perf_counter() - t0)
+            return None
+        self.recorder.record(f"{method} {route}", r.status_code, time.perf_counter() - t0)
+        return r
+
+
+def json_or(r, default):
+    if r is None or r.status_code >= 300:
+        return default
+    try:
+        return r.json()
+    except ValueError:
+        return default
+
+
+# ────────────────────────────────────────────────
+# Scripted journeys
+# ────────────────────────────────────────────────
+class VirtualUser:
+    def __init__(self, index: int, user_id: int, username: str):
+        self.index = index
+        self.user_id = user_id
+        self.username = username
+        self.daily_goal_id: Optional[int] = None
+        self.deck_id: Optional[int] = None
+
+
+async def daily_journey(api: Api, ctx: Dict, user: VirtualUser, rng: random.Random):
+    """The core flow: log in, log a session, look at sessions, tick daily goals."""
+    await api.call("POST", "/login", "/login", json={"username": user.username, "password": "loadtest"})
+    await api.call("POST", "/study/", "/study/", user.user_id, json={
+        "user_id": user.user_id,
+        "subject_id": rng.choice(ctx["subject_ids"]),
+        "duration": rng.choice([15, 25, 30, 45, 60, 90]),
+        "notes": " ".join(rng.sample(WORDS, 4)),
+    })
+    await api.call("GET", "/study/", "/study/", user.user_id)
+    await api.call("GET", "/study/stats", "/study/stats", user.user_id, params={"days": 30})
+    await api.call("GET", "/dashboard", "/dashboard", user.user_id)
+    await api.call("GET", "/goals/", "/goals/", user.user_id)
+    await api.call("GET", "/goals/forecast", "/goals/forecast", user.user_id)
+    if user.daily_goal_id:
+        await api.call("POST", "/goals/{goal_id}/mark-daily", f"/goals/{user.daily_goal_id}/mark-daily", user.user_id)
+    await api.call("GET", "/users/me", "/users/me", user.user_id)
+
+
+async def planning_journey(api: Api, ctx: Dict, user: VirtualUser, rng: random.Random):
+    await api.call("GET", "/subjects/", "/subjects/")
+    await api.call("GET", "/planner/", "/planner/", user.user_id, params={"days": 14})
+    await api.call("GET", "/search", "/search", user.user_id, params={"q": rng.choice(WORDS)[:4], "prefix": True})
+
+
+async def quiz_journey(api: Api, ctx: Dict, user: VirtualUser, rng: random.Random):
+    await api.call("GET", "/decks/", "/decks/", user.user_id)
+    if not user.deck_id:
+        return
+    card = json_or(await api.call(
+        "POST", "/decks/{deck_id}/cards", f"/decks/{user.deck_id}/cards", user.user_id,
+        json={"front": f"What is {rng.choice(WORDS)}?", "back": rng.choice(WORDS)}
+    ), None)
+    await api.call("GET", "/decks/{deck_id}/cards", f"/decks/{user.deck_id}/cards", user.user_id)
+    due = json_or(await api.call("GET", "/quizzes/due", "/quizzes/due", user.user_id, params={"limit": 10}), [])
+    if due:
+        await api.call("POST", "/quizzes/reviews", "/quizzes/reviews", user.user_id,
+                       json=[{"card_id": c["id"], "grade": rng.randint(0, 5)} for c in due])
+    await api.call("GET", "/quizzes/practice", "/quizzes/practice", user.user_id,
+                   params={"subject_id": ctx["subject_ids"][0], "n": 5})
+    if card and rng.random() < 0.5:
+        await api.call("DELETE", "/cards/{card_id}", f"/cards/{card['id']}", user.user_id)
+
+
+async def edit_journey(api: Api, ctx: Dict, user: VirtualUser, rng: random.Random):
+    subject_id = rng.choice(ctx["subject_ids"])
+    await api.call("POST", "/study/", "/study/", user.user_id, json={
+        "user_id": user.user_id, "subject_id": subject_id, "duration": 20, "notes": "to edit",
+    })
+    sessions = json_or(await api.call("GET", "/study/", "/study/", user.user_id), [])
+    if sessions:
+        session_id = sessions[0]["id"]
+        await api.call("PUT", "/study/{session_id}", f"/study/{session_id}", user.user_id, json={
+            "user_id": user.user_id, "subject_id": subject_id, "duration": 35, "notes": "edited",
+        })
+        await api.call("DELETE", "/study/{session_id}", f"/study/{session_id}", user.user_id)
+
+    goal = json_or(await api.call("POST", "/goals/", "/goals/", user.user_id, json={
+        "user_id": user.user_id, "title": f"Finish {rng.choice(WORDS)}", "progress": 10,
+        "target_date": "2030-01-01", "type": "milestone", "subject_id": subject_id, "target_minutes": 600,
+    }), None)
+    if goal:
+        await api.call("PUT", "/goals/{goal_id}", f"/goals/{goal['id']}", user.user_id, json={
+            "user_id": user.user_id, "title": "Updated goal", "progress": 40,
+        })
+        await api.call("DELETE", "/goals/{goal_id}", f"/goals/{goal['id']}", user.user_id)
+
+
+async def group_journey(api: Api, ctx: Dict, user: VirtualUser, rng: random.Random):
+    await api.call("GET", "/groups/", "/groups/", user.user_id)
+    for period in ("week", "month"):
+        await api.call("GET", "/groups/{group_id}/leaderboard", f"/groups/{ctx['group_id']}/leaderboard",
+                       user.user_id, params={"period": period})
+
+
+async def timer_journey(api: Api, ctx: Dict, user: VirtualUser, rng: random.Random):
+    """An open timer page: start, a few heartbeats, a pause, then stop (409/404 if another journey has the timer)."""
+    await api.call("POST", "/timers/start", "/timers/start", user.user_id,
+                   json={"subject_id": rng.choice(ctx["subject_ids"]), "notes": rng.choice(WORDS)})
+    for _ in range(rng.randint(2, 5)):
+        await api.call("POST", "/timers/heartbeat", "/timers/heartbeat", user.user_id)
+    await api.call("POST", "/timers/pause", "/timers/pause", user.user_id)
+    await api.call("GET", "/timers/current", "/timers/current", user.user_id)
+    await api.call("POST", "/timers/resume", "/timers/resume", user.user_id)
+    await api.call("POST", "/timers/heartbeat", "/timers/heartbeat", user.user_id)
+    await api.call("POST", "/timers/stop", "/timers/stop", user.user_id)
+
+
+async def admin_journey(api: Api, ctx: Dict, user: VirtualUser, rng: random.Random):
+    """Rare writes: new accounts, subjects, decks and group churn."""
+    n = next(ctx["counter"])
+    extra = json_or(await api.call("POST", "/users/", "/users/", json={
+        "username": f"lt_extra_{ctx['run_id']}_{n}", "email": f"lt_extra_{ctx['run_id']}_{n}@example.com",
+        "password": "loadtest",
+    }), None)
+    if extra:
+        await api.call("POST", "/study/", "/study/", extra["id"], json={
+            "user_id": extra["id"], "subject_id": ctx["subject_ids"][0], "duration": 30,
+        })
+        deleted = json_or(await api.call("DELETE", "/users/me", "/users/me", extra["id"]), {})
+        if deleted.get("purge_job_id"):
+            await api.call("GET", "/admin/purges/{job_id}", f"/admin/purges/{deleted['purge_job_id']}")
+        await api.call("GET", "/admin/purges", "/admin/purges", params={"limit": 10})
+    subject = json_or(await api.call("POST", "/subjects/", "/subjects/", json={"name": f"LT {ctx['run_id']} {n}"}), None)
+    if subject:
+        await api.call("PUT", "/subjects/{subject_id}", f"/subjects/{subject['id']}",
+                       json={"name": f"LT {ctx['run_id']} {n} renamed"})
+        await api.call("DELETE", "/subjects/{subject_id}", f"/subjects/{subject['id']}")
+
+    deck = json_or(await api.call("POST", "/decks/", "/decks/", user.user_id,
+                                  json={"subject_id": ctx["subject_ids"][0], "name": "Scratch"}), None)
+    if deck:
+        await api.call("DELETE", "/decks/{deck_id}", f"/decks/{deck['id']}", user.user_id)
+
+    await api.call("POST", "/admin/goals/reconcile", "/admin/goals/reconcile", params={"user_id": user.user_id})
+
+    group = json_or(await api.call("POST", "/groups/", "/groups/", user.user_id, json={"name": f"Scratch {n}"}), None)
+    if group and user.index != 0:
+        await api.call("DELETE", "/groups/{group_id}/membership", f"/groups/{ctx['group_id']}/membership", user.user_id)
+        await api.call("POST", "/groups/{group_id}/join", f"/groups/{ctx['group_id']}/join", user.user_id)
+
+
+JOURNEYS = [
+    (daily_journey, 50),
+    (planning_journey, 10),
+    (quiz_journey, 15),
+    (edit_journey, 10),
+    (group_journey, 10),
+    (timer_journey, 10),
+    (admin_journey, 5),
+]
+
+
+# ────────────────────────────────────────────────
+# Setup (not measured)
+# ────────────────────────────────────────────────
+async def seed(client: httpx.AsyncClient, user_count: int, run_id: str) -> Dict:
+    for name in SUBJECTS:
+        await client.post("/subjects/", json={"name": name})
+    subjects = (await client.get("/subjects/")).json()
+    subject_ids = [s["id"] for s in subjects if s["name"] in SUBJECTS]
+
+    users = []
+    for i in range(user_count):
+        username = f"lt_{run_id}_{i}"
+        r = await client.post("/users/", json={
+            "username": username, "email": f"{username}@example.com", "password": "loadtest",
+        })
+        r.raise_for_status()
+        user = VirtualUser(i, r.json()["id"], username)
+        headers = {"X-User-Id": str(user.user_id)}
+
+        r = await client.post("/goals/", headers=headers, json={
+            "user_id": user.user_id, "title": "Study every day", "type": "daily", "remind_at": f"{i % 24:02d}:00",
+        })
+        user.daily_goal_id = r.json().get("id")
+        await client.post("/goals/", headers=headers, json={
+            "user_id": user.user_id, "title": "Finish the course", "progress": 20,
+            "target_date": "2030-06-01", "type": "milestone",
+        })
+        r = await client.post("/decks/", headers=headers, json={"subject_id": subject_ids[0], "name": "Core"})
+        if r.status_code == 201:
+            user.deck_id = r.json()["id"]
+            for k in range(5):
+                await client.post(f"/decks/{user.deck_id}/cards", headers=headers,
+                                  json={"front": f"Question {k}", "back": f"Answer {k}"})
+        users.append(user)
+
+    r = await client.post("/groups/", headers={"X-User-Id": str(users[0].user_id)}, json={"name": f"Class {run_id}"})
+    group_id = r.json()["id"]
+    for user in users[1:]:
+        await client.post(f"/groups/{group_id}/join", headers={"X-User-Id": str(user.user_id)})
+
+    return {"users": users, "subject_ids": subject_ids, "group_id": group_id}
+
+
+# ────────────────────────────────────────────────
+# Load generation
+# ────────────────────────────────────────────────
+async def run_journey(api: Api, ctx: Dict, rng: random.Random):
+    journey = rng.choices([j for j, _ in JOURNEYS], weights=[w for _, w in JOURNEYS])[0]
+    user = rng.choice(ctx["users"])
+    api.recorder.journeys[journey.__name__] += 1
+    await journey(api, ctx, user, rng)
+
+
+async def closed_loop(api: Api, ctx: Dict, concurrency: int, deadline: float, seed_value: int):
+    async def worker(n: int):
+        rng = random.Random(seed_value * 1000 + n)
+        while time.perf_counter() < deadline:
+            await run_journey(api, ctx, rng)
+
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+
+
+async def open_loop(api: Api, ctx: Dict, rate: float, concurrency: int, deadline: float, seed_value: int) -> int:
+    """Poisson arrivals at `rate` journeys/s; arrivals beyond `concurrency` in flight are dropped."""
+    rng = random.Random(seed_value)
+    in_flight = set()
+    dropped = 0
+    next_arrival = time.perf_counter()
+    while True:
+        next_arrival += rng.expovariate(rate)
+        if next_arrival >= deadline:
+            break
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        if len(in_flight) >= concurrency:
+            dropped += 1
+            continue
+        task = asyncio.create_task(run_journey(api, ctx, random.Random(rng.random())))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return dropped
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str, workers: int, env_overrides: Dict[str, str]):
+    port = free_port()
+    env = dict(os.environ, **env_overrides)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir, env=env,
+        stdout=sys.stderr,  # keep stdout for the JSON report
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        if proc.poll() is not None:
+            raise RuntimeError("API server exited during startup")
+        try:
+            if httpx.get(f"{base_url}/subjects/", timeout=1).status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("API server did not become ready")
+
+
+def sqlite_settings(db_path: str) -> Dict:
+    if not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(db_path)
+    settings = {
+        "journal_mode": conn.execute("PRAGMA journal_mode").fetchone()[0],
+        "page_size": conn.execute("PRAGMA page_size").fetchone()[0],
+        "page_count": conn.execute("PRAGMA page_count").fetchone()[0],
+    }
+    conn.close()
+    return settings
+
+
+async def main_async(args) -> Dict:
+    run_id = f"{args.seed}_{int(time.time())}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        ctx = await seed(client, args.users, run_id)
+        ctx["run_id"] = run_id
+        ctx["counter"] = iter(range(10 ** 9))
+        openapi = (await client.get("/openapi.json")).json()
+
+        recorder = Recorder()
+        api = Api(client, recorder)
+        start = time.perf_counter()
+        deadline = start + args.duration
+        dropped = 0
+        if args.rate:
+            dropped = await open_loop(api, ctx, args.rate, args.concurrency, deadline, args.seed)
+        else:
+            await closed_loop(api, ctx, args.concurrency, deadline, args.seed)
+        elapsed = time.perf_counter() - start
+
+    report = recorder.report(elapsed)
+    all_routes = {
+        f"{method.upper()} {path}"
+        for path, methods in openapi.get("paths", {}).items()
+        for method in methods
+    }
+    report["uncovered_routes"] = sorted(all_routes - set(report["endpoints"]))
+    report["dropped_arrivals"] = dropped
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Study Goal API")
+    parser.add_argument("--base-url", help="target a running API instead of starting one")
+    parser.add_argument("--concurrency", type=int, default=16, help="max journeys in flight")
+    parser.add_argument("--rate", type=float, default=None, help="open-loop arrival rate (journeys/s); closed loop if omitted")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--users", type=int, default=50, help="virtual users to seed")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when starting the API")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="environment for the started API")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--label", default="", help="free-form name for this run")
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    env_overrides = dict(item.split("=", 1) for item in args.env)
+    proc = None
+    workdir = None
+    sqlite_report = None
+    try:
+        if not args.base_url:
+            workdir = tempfile.mkdtemp(prefix="study-loadtest-")
+            proc, args.base_url = start_server(workdir, args.workers, env_overrides)
+        try:
+            report = asyncio.run(main_async(args))
+        finally:
+            if proc:
+                proc.terminate()
+                proc.wait(timeout=10)
+        if workdir:
+            sqlite_report = sqlite_settings(os.path.join(workdir, env_overrides.get("STUDY_DB_PATH", "study.db")))
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report["config"] = {
+        "label": args.label,
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "duration_s": args.duration,
+        "users": args.users,
+        "workers": args.workers,
+        "seed": args.seed,
+        "env": env_overrides,
+    }
+    if sqlite_report is not None:
+        report["sqlite"] = sqlite_report
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
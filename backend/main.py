@@ -1,6 +1,7 @@
 # main.py
-from fastapi import FastAPI, HTTPException, Header, Response, status
-from database import get_db, init_db
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Header, Request, Response, status
+from fastapi.responses import PlainTextResponse
+from database import fan_out, get_db, init_db
 from schemas import (
     UserCreate,
     UserOut,
@@ -10,136 +11,206 @@ from schemas import (
     Subject,
     SubjectCreate,
     GoalCreate,
-    GoalOut
+    GoalOut,
+    GoalForecast,
+    StudyPlanOut,
+    StudyStatsOut,
+    DashboardOut,
+    TimerStart,
+    TimerOut,
+    TimerStopOut,
+    DeckCreate,
+    DeckOut,
+    CardCreate,
+    CardOut,
+    CardReview,
+    CardSchedule,
+    SearchResults,
+    GroupCreate,
+    GroupOut,
+    LeaderboardOut,
+    SlowQueryReport
 )
-from typing import List
+from typing import Dict, List, Optional
+import admission
+import analytics
+import dashboard
+import forecasting
+import auth
+import goal_progress
+import leaderboards
+import metrics
+import planner
+import purge
+import quizzes
+import reminders
+import sampler
+import search
+import slowlog
+import storage
 import sqlite3
+import timers
 from datetime import datetime, date
+import anyio.to_thread
+import hashlib
+import json
+import config
+import database
+from config import settings
+from storage import get_storage
 
 app = FastAPI(title="Study Goal API")
+# Outermost last: metrics also count the requests admission control turns away
+app.add_middleware(admission.AdmissionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 @app.on_event("startup")
 async def startup_event():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.threadpool_size
     init_db()
+    search.init_search()
+    if settings.storage_backend == "sqlite":
+        purge.start_worker()
+        reminders.start()
+    timers.recover()
+    timers.start_worker()
+
+
+def _check_limit(limit: int):
+    """Page-size bounds shared by every endpoint that takes a `limit`."""
+    if limit < 1 or limit > settings.max_page_size:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.max_page_size}")
+
+
+def _parse_fields(fields: Optional[str], model) -> Optional[List[str]]:
+    """`fields=id,duration` checked against the response model; None means every field."""
+    if fields is None:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(names) - set(model.model_fields))
+    if not names or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}" if unknown
+            else f"fields must name some of: {', '.join(model.model_fields)}"
+        )
+    return names
+
+
+def _list_response(request: Request, rows: List[Dict], model, fields: Optional[List[str]]) -> Response:
+    """
+    A list endpoint's JSON with an ETag. Projected rows (fields=) go out as
+    read; full rows through the response model. The ETag covers the body,
+    so each field set is cached separately and a current copy gets a 304.
+    """
+    if fields is None:
+        rows = [model(**row).model_dump() for row in rows]
+    body = json.dumps(rows, separators=(",", ":")).encode()
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "X-User-Id"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _check_days(days: int):
+    """Statistics window bounds for /study/stats and /dashboard."""
+    if not 1 <= days <= analytics.MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {analytics.MAX_DAYS}")
 
 # ────────────────────────────────────────────────
 # Subjects CRUD (unchanged)
 # ────────────────────────────────────────────────
 
 @app.get("/subjects/", response_model=List[Subject])
-def get_subjects():
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("SELECT id, name FROM subjects ORDER BY name")
-    rows = cursor.fetchall()
-    db.close()
-    return [{"id": row["id"], "name": row["name"]} for row in rows]
+def get_subjects(request: Request, fields: Optional[str] = None):
+    names = _parse_fields(fields, Subject)
+    try:
+        return _list_response(request, get_storage().list_subjects(names), Subject, names)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
 @app.post("/subjects/", response_model=Subject, status_code=201)
 def create_subject(subject: SubjectCreate):
-    db = get_db()
-    cursor = db.cursor()
     try:
-        cursor.execute("INSERT INTO subjects (name) VALUES (?)", (subject.name,))
-        db.commit()
-        subject_id = cursor.lastrowid
-        cursor.execute("SELECT id, name FROM subjects WHERE id = ?", (subject_id,))
-        row = cursor.fetchone()
-        return {"id": row["id"], "name": row["name"]}
-    except sqlite3.IntegrityError:
+        return get_storage().create_subject(subject.name)
+    except storage.Conflict:
         raise HTTPException(status_code=400, detail="Subject name already exists")
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        db.close()
 
 
 @app.put("/subjects/{subject_id}", response_model=Subject)
 def update_subject(subject_id: int, subject: SubjectCreate):
-    db = get_db()
-    cursor = db.cursor()
     try:
-        cursor.execute("UPDATE subjects SET name = ? WHERE id = ?", (subject.name, subject_id))
-        db.commit()
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Subject not found")
-        cursor.execute("SELECT id, name FROM subjects WHERE id = ?", (subject_id,))
-        row = cursor.fetchone()
-        return {"id": row["id"], "name": row["name"]}
-    except sqlite3.IntegrityError:
+        return get_storage().update_subject(subject_id, subject.name)
+    except storage.NotFound:
+        raise HTTPException(status_code=404, detail="Subject not found")
+    except storage.Conflict:
         raise HTTPException(status_code=400, detail="Subject name already exists")
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        db.close()
 
 
 @app.delete("/subjects/{subject_id}", status_code=204)
 def delete_subject(subject_id: int):
-    db = get_db()
-    cursor = db.cursor()
     try:
-        cursor.execute("DELETE FROM subjects WHERE id = ?", (subject_id,))
-        db.commit()
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Subject not found")
+        get_storage().delete_subject(subject_id)
         return Response(status_code=204)
+    except storage.NotFound:
+        raise HTTPException(status_code=404, detail="Subject not found")
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        db.close()
 
 # ────────────────────────────────────────────────
 # Your existing endpoints (unchanged)
 # ────────────────────────────────────────────────
 
-@app.post("/users/", response_model=UserOut, status_code=201)
-def create_user(user: UserCreate):
-    db = get_db()
-    cursor = db.cursor()
-    try:
-        cursor.execute(
-            """
-            INSERT INTO users (username, email, password, created_at)
-            VALUES (?, ?, ?, datetime('now'))
-            """,
-            (user.username, user.email, user.password)
-        )
-        db.commit()
-        user_id = cursor.lastrowid
-
-        cursor.execute(
-            "SELECT id, username, email FROM users WHERE id = ?",
-            (user_id,)
-        )
-        row = cursor.fetchone()
+def _hashing_overloaded():
+    return HTTPException(status_code=503, detail="Too many logins in progress, try again shortly",
+                         headers={"Retry-After": "1"})
 
-        return {"id": row[0], "username": row[1], "email": row[2]}
 
-    except sqlite3.IntegrityError:
+# Hashing runs on auth.py's own pool and the queries on the threadpool, so
+# neither blocks the event loop nor holds a request thread while it waits
+@app.post("/users/", response_model=UserOut, status_code=201)
+async def create_user(user: UserCreate):
+    try:
+        password = await auth.hash_async(user.password)
+        return await anyio.to_thread.run_sync(get_storage().create_user, user.username, user.email, password)
+    except auth.Overloaded:
+        raise _hashing_overloaded()
+    except storage.Conflict:
         raise HTTPException(status_code=400, detail="Username or email already taken")
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        db.close()
 
 
 @app.get("/users/me", response_model=UserOut)
 def get_current_user(x_user_id: int = Header(..., alias="X-User-Id")):
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute(
-        "SELECT id, username, email FROM users WHERE id = ?",
-        (x_user_id,)
-    )
-    row = cursor.fetchone()
-    db.close()
-
-    if not row:
+    user = get_storage().get_user(x_user_id)
+    if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return {"id": row[0], "username": row[1], "email": row[2]}
+    return user
+
+
+@app.delete("/users/me", status_code=202)
+def delete_current_user(x_user_id: int = Header(..., alias="X-User-Id")):
+    """The account is gone at once; its data is purged in the background (GET /admin/purges/{id})."""
+    try:
+        job_id = get_storage().delete_user(x_user_id)
+    except storage.NotFound:
+        raise HTTPException(status_code=404, detail="User not found")
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    planner.invalidate(x_user_id)
+    analytics.invalidate(x_user_id)
+    forecasting.invalidate(x_user_id)
+    timers.discard(x_user_id)
+    reminders.cancel_user(x_user_id)
+    return {"message": "User deleted", "purge_job_id": job_id}
 
 
 @app.post("/study/", status_code=201)
@@ -150,56 +221,54 @@ def create_study_session(
     if session.user_id != x_user_id:
         raise HTTPException(status_code=403, detail="You can only create sessions for yourself")
 
-    db = get_db()
-    cursor = db.cursor()
     try:
-        cursor.execute(
-            """
-            INSERT INTO study_sessions
-            (user_id, subject_id, duration, notes, session_date)
-            VALUES (?, ?, ?, ?, datetime('now'))
-            """,
-            (session.user_id, session.subject_id, session.duration, session.notes)
-        )
-        db.commit()
+        get_storage().create_session(x_user_id, session.subject_id, session.duration, session.notes)
+        planner.record_session(x_user_id, session.duration, session.subject_id)
+        analytics.invalidate(x_user_id)
         return Response(status_code=201)
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        db.close()
 
 
 @app.get("/study/", response_model=List[StudySessionOut])
-def get_my_study_sessions(x_user_id: int = Header(..., alias="X-User-Id")):
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute(
-        """
-        SELECT id, user_id, subject_id, duration, notes, session_date
-        FROM study_sessions
-        WHERE user_id = ?
-        ORDER BY session_date DESC
-        """,
-        (x_user_id,)
-    )
-    rows = cursor.fetchall()
-    db.close()
+def get_my_study_sessions(
+    request: Request,
+    fields: Optional[str] = None,
+    x_user_id: int = Header(..., alias="X-User-Id")
+):
+    """`fields=id,session_date,duration` returns (and reads) only those fields."""
+    names = _parse_fields(fields, StudySessionOut)
+    return _list_response(request, get_storage().list_sessions(x_user_id, names), StudySessionOut, names)
 
-    sessions: List[StudySessionOut] = []
-
-    for row in rows:
-        sessions.append(
-            StudySessionOut(
-                id=row[0],
-                user_id=row[1],
-                subject_id=row[2],
-                duration=row[3],
-                notes=row[4],
-                session_date=row[5]
-            )
-        )
 
-    return sessions
+@app.get("/study/stats", response_model=StudyStatsOut)
+def get_my_study_stats(
+    days: int = analytics.DEFAULT_DAYS,
+    x_user_id: int = Header(..., alias="X-User-Id")
+):
+    """Totals, per-subject sums, daily and weekly series for the last `days` days, session length percentiles."""
+    _check_days(days)
+
+    try:
+        return analytics.user_stats(x_user_id, days)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.get("/dashboard", response_model=DashboardOut)
+def get_my_dashboard(
+    days: int = analytics.DEFAULT_DAYS,
+    limit: int = settings.default_page_size,
+    x_user_id: int = Header(..., alias="X-User-Id")
+):
+    """Subjects, statistics (as /study/stats) and the first `limit` sessions and goals, from one snapshot."""
+    _check_days(days)
+    _check_limit(limit)
+
+    try:
+        return dashboard.build(x_user_id, days, limit)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
 @app.put("/study/{session_id}", status_code=200)
@@ -208,51 +277,28 @@ def update_study_session(
     updates: StudySessionCreate,
     x_user_id: int = Header(..., alias="X-User-Id")
 ):
-    db = get_db()
-    cursor = db.cursor()
-
-    # Check ownership
-    cursor.execute(
-        "SELECT user_id FROM study_sessions WHERE id = ?",
-        (session_id,)
-    )
-    row = cursor.fetchone()
-    if not row:
-        db.close()
-        raise HTTPException(status_code=404, detail="Session not found")
-
-    if row["user_id"] != x_user_id:
-        db.close()
-        raise HTTPException(status_code=403, detail="You can only edit your own sessions")
-
-    # Build update query
-    fields = []
-    values = []
-    if updates.subject_id is not None:
-        fields.append("subject_id = ?")
-        values.append(updates.subject_id)
-    if updates.duration is not None:
-        fields.append("duration = ?")
-        values.append(updates.duration)
-    if updates.notes is not None:
-        fields.append("notes = ?")
-        values.append(updates.notes)
-
-    if not fields:
-        db.close()
-        raise HTTPException(status_code=400, detail="No fields to update")
-
-    values.append(session_id)
-    query = f"UPDATE study_sessions SET {', '.join(fields)} WHERE id = ?"
+    changes = {
+        name: value
+        for name, value in (("subject_id", updates.subject_id), ("duration", updates.duration), ("notes", updates.notes))
+        if value is not None
+    }
 
     try:
-        cursor.execute(query, values)
-        db.commit()
+        store = get_storage()
+        # Check ownership
+        store.get_session(x_user_id, session_id)
+        if not changes:
+            raise HTTPException(status_code=400, detail="No fields to update")
+        store.update_session(x_user_id, session_id, changes)
+        planner.invalidate(x_user_id)
+        analytics.invalidate(x_user_id)
         return {"message": "Session updated successfully"}
+    except storage.NotFound:
+        raise HTTPException(status_code=404, detail="Session not found")
+    except storage.Forbidden:
+        raise HTTPException(status_code=403, detail="You can only edit your own sessions")
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        db.close()
 
 
 @app.delete("/study/{session_id}", status_code=204)
@@ -260,57 +306,105 @@ def delete_study_session(
     session_id: int,
     x_user_id: int = Header(..., alias="X-User-Id")
 ):
-    db = get_db()
-    cursor = db.cursor()
-
-    cursor.execute(
-        "SELECT user_id FROM study_sessions WHERE id = ?",
-        (session_id,)
-    )
-    row = cursor.fetchone()
-    if not row:
-        db.close()
-        raise HTTPException(status_code=404, detail="Session not found")
-
-    if row["user_id"] != x_user_id:
-        db.close()
-        raise HTTPException(status_code=403, detail="You can only delete your own sessions")
-
     try:
-        cursor.execute("DELETE FROM study_sessions WHERE id = ?", (session_id,))
-        db.commit()
+        get_storage().delete_session(x_user_id, session_id)
+        planner.invalidate(x_user_id)
+        analytics.invalidate(x_user_id)
         return Response(status_code=204)
+    except storage.NotFound:
+        raise HTTPException(status_code=404, detail="Session not found")
+    except storage.Forbidden:
+        raise HTTPException(status_code=403, detail="You can only delete your own sessions")
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        db.close()
+
+
+async def _rehash_password(user_id: int, password: str):
+    """Upgrade a plaintext or old-cost password; on failure the next login tries again."""
+    try:
+        hashed = await auth.hash_async(password)
+        await anyio.to_thread.run_sync(get_storage().set_password, user_id, hashed)
+    except (auth.Overloaded, storage.StorageError, sqlite3.Error):
+        pass
 
 
 @app.post("/login")
-def login(credentials: Login):
-    user = get_user_by_username(credentials.username)
+async def login(credentials: Login, background_tasks: BackgroundTasks):
+    user = await anyio.to_thread.run_sync(get_storage().get_user_by_username, credentials.username)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if user["password"] != credentials.password:
+    try:
+        matches, needs_rehash = await auth.verify_async(credentials.password, user["password"])
+    except auth.Overloaded:
+        raise _hashing_overloaded()
+    if not matches:
         raise HTTPException(status_code=401, detail="Incorrect password")
+    if needs_rehash:
+        background_tasks.add_task(_rehash_password, user["id"], credentials.password)
 
     return {"message": "Login successful", "user_id": user["id"]}
 
 
-def get_user_by_username(username: str):
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute(
-        "SELECT id, username, password FROM users WHERE username = ?",
-        (username,)
-    )
-    row = cursor.fetchone()
-    db.close()
+# ────────────────────────────────────────────────
+# Live study timers (heartbeats stay in memory, see timers.py)
+# ────────────────────────────────────────────────
+@app.post("/timers/start", response_model=TimerOut, status_code=201)
+def start_timer(timer: TimerStart, x_user_id: int = Header(..., alias="X-User-Id")):
+    try:
+        return timers.start(x_user_id, timer.subject_id, timer.notes)
+    except timers.AlreadyRunning:
+        raise HTTPException(status_code=409, detail="A timer is already running; stop it first")
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-    if row:
-        return {"id": row[0], "username": row[1], "password": row[2]}
-    return None
+
+# async: no I/O, so no threadpool hop for the most frequent request
+@app.post("/timers/heartbeat", response_model=TimerOut)
+async def timer_heartbeat(x_user_id: int = Header(..., alias="X-User-Id")):
+    try:
+        return timers.heartbeat(x_user_id)
+    except timers.NoTimer:
+        raise HTTPException(status_code=404, detail="No timer running")
+
+
+@app.post("/timers/pause", response_model=TimerOut)
+def pause_timer(x_user_id: int = Header(..., alias="X-User-Id")):
+    try:
+        return timers.pause(x_user_id)
+    except timers.NoTimer:
+        raise HTTPException(status_code=404, detail="No timer running")
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.post("/timers/resume", response_model=TimerOut)
+def resume_timer(x_user_id: int = Header(..., alias="X-User-Id")):
+    try:
+        return timers.resume(x_user_id)
+    except timers.NoTimer:
+        raise HTTPException(status_code=404, detail="No timer running")
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.post("/timers/stop", response_model=TimerStopOut)
+def stop_timer(x_user_id: int = Header(..., alias="X-User-Id")):
+    """Turns the timer into a study session (none if it ran under half a minute)."""
+    try:
+        return timers.stop(x_user_id)
+    except timers.NoTimer:
+        raise HTTPException(status_code=404, detail="No timer running")
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.get("/timers/current", response_model=TimerOut)
+async def get_current_timer(x_user_id: int = Header(..., alias="X-User-Id")):
+    try:
+        return timers.current(x_user_id)
+    except timers.NoTimer:
+        raise HTTPException(status_code=404, detail="No timer running")
 
 
 # ────────────────────────────────────────────────
@@ -325,136 +419,333 @@ def create_goal(
     if goal.user_id != x_user_id:
         raise HTTPException(status_code=403, detail="You can only create goals for yourself")
 
-    db = get_db()
-    cursor = db.cursor()
+    goal_type = getattr(goal, "type", "milestone")  # default milestone
+    if goal_type not in ["milestone", "daily"]:
+        raise HTTPException(status_code=400, detail="Invalid goal type (milestone or daily)")
+    _check_goal_link(goal_type, goal.subject_id, goal.target_minutes)
+    remind_at = goal.remind_at or None
+    _check_remind_at(goal_type, remind_at)
+
+    try:
+        goal_id = get_storage().create_goal(
+            x_user_id,
+            goal.title,
+            goal.category,
+            goal.progress if goal_type == "milestone" else 0,
+            goal.target_date,
+            goal_type,
+            goal.subject_id,
+            goal.target_minutes,
+            remind_at
+        )
+        planner.invalidate(x_user_id)
+        forecasting.invalidate(x_user_id)
+        reminders.schedule(x_user_id, goal_id, goal_type, remind_at, None)
+        return {"id": goal_id, "message": "Goal created"}
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+def _check_goal_link(goal_type: str, subject_id: Optional[int], target_minutes: Optional[int]):
+    """A linked goal is a milestone with both a subject and a positive target."""
+    if subject_id is None and target_minutes is None:
+        return
+    if goal_type != "milestone":
+        raise HTTPException(status_code=400, detail="Only milestone goals can be linked to a subject")
+    if subject_id is None or target_minutes is None or target_minutes < 1:
+        raise HTTPException(status_code=400, detail="Linked goals need a subject_id and target_minutes >= 1")
+
+
+def _check_remind_at(goal_type: str, remind_at: Optional[str]):
+    """Reminders are for daily goals, at an 'HH:MM' time of day."""
+    if remind_at is None:
+        return
+    if goal_type != "daily":
+        raise HTTPException(status_code=400, detail="Only daily goals can have a reminder")
+    if not reminders.TIME_OF_DAY.match(remind_at):
+        raise HTTPException(status_code=400, detail="remind_at must be a time of day as HH:MM")
+
+
+@app.get("/goals/", response_model=List[GoalOut])
+def get_my_goals(
+    request: Request,
+    fields: Optional[str] = None,
+    x_user_id: int = Header(..., alias="X-User-Id")
+):
+    """`fields=id,title,progress` returns (and reads) only those fields."""
+    names = _parse_fields(fields, GoalOut)
+    return _list_response(request, get_storage().list_goals(x_user_id, names), GoalOut, names)
+
+
+@app.get("/goals/forecast", response_model=List[GoalForecast])
+def get_my_goal_forecasts(x_user_id: int = Header(..., alias="X-User-Id")):
+    """Estimated completion and on_track / at_risk status of every milestone goal, from recent study pace."""
+    try:
+        return forecasting.user_forecasts(x_user_id)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.put("/goals/{goal_id}", status_code=200)
+def update_goal(
+    goal_id: int,
+    updates: GoalCreate,
+    x_user_id: int = Header(..., alias="X-User-Id")
+):
+    changes = {
+        name: getattr(updates, name)
+        for name in ("title", "category", "progress", "target_date", "subject_id", "target_minutes", "remind_at")
+        if getattr(updates, name) is not None
+    }
+    if changes.get("remind_at") == "":
+        changes["remind_at"] = None  # clears the reminder
+
     try:
-        goal_type = getattr(goal, "type", "milestone")  # default milestone
-        if goal_type not in ["milestone", "daily"]:
-            raise HTTPException(status_code=400, detail="Invalid goal type (milestone or daily)")
+        store = get_storage()
+        row = store.get_goal(x_user_id, goal_id)
+        subject_id = changes.get("subject_id", row["subject_id"])
+        if "subject_id" in changes or "target_minutes" in changes:
+            _check_goal_link(row["type"], subject_id, changes.get("target_minutes", row["target_minutes"]))
+        if subject_id is not None:
+            changes.pop("progress", None)  # derived from logged minutes
+        if "remind_at" in changes:
+            _check_remind_at(row["type"], changes["remind_at"])
+        if not changes:
+            raise HTTPException(status_code=400, detail="No fields to update")
+        store.update_goal(x_user_id, goal_id, changes)
+        planner.invalidate(x_user_id)
+        forecasting.invalidate(x_user_id)
+        reminders.schedule(x_user_id, goal_id, row["type"], changes.get("remind_at", row["remind_at"]),
+                           row["last_done"])
+        return {"message": "Goal updated"}
+    except storage.NotFound:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    except storage.Forbidden:
+        raise HTTPException(status_code=403, detail="You can only edit your own goals")
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+
+@app.delete("/goals/{goal_id}", status_code=204)
+def delete_goal(goal_id: int, x_user_id: int = Header(..., alias="X-User-Id")):
+    try:
+        get_storage().delete_goal(x_user_id, goal_id)
+        planner.invalidate(x_user_id)
+        forecasting.invalidate(x_user_id)
+        reminders.cancel(goal_id)
+        return Response(status_code=204)
+    except storage.NotFound:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    except storage.Forbidden:
+        raise HTTPException(status_code=403, detail="You can only delete your own goals")
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+# ────────────────────────────────────────────────
+# Mark daily goal as done (streak logic)
+# ────────────────────────────────────────────────
+@app.post("/goals/{goal_id}/mark-daily", status_code=200)
+def mark_daily_goal_done(
+    goal_id: int,
+    x_user_id: int = Header(..., alias="X-User-Id")
+):
+    store = get_storage()
+    try:
+        row = store.get_goal(x_user_id, goal_id)
+    except storage.NotFound:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    except storage.Forbidden:
+        raise HTTPException(status_code=403, detail="You can only mark your own goals")
+    if row["type"] != "daily":
+        raise HTTPException(status_code=400, detail="Only daily goals can be marked done")
+
+    today = datetime.now().date().isoformat()
+    last_done = row["last_done"]
+    current_streak = row["streak"]
+
+    if last_done == today:
+        raise HTTPException(status_code=400, detail="Already marked done today")
+
+    new_streak = 1
+    if last_done:
+        last_date = datetime.fromisoformat(last_done).date()
+        days_diff = (datetime.now().date() - last_date).days
+        if days_diff == 1:
+            new_streak = current_streak + 1
+        # if days_diff > 1 → missed day(s) → streak resets to 1
+
+    try:
+        store.update_goal(x_user_id, goal_id, {"streak": new_streak, "last_done": today})
+        reminders.schedule(x_user_id, goal_id, row["type"], row["remind_at"], today)
+        return {"message": "Marked done", "streak": new_streak}
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+# ────────────────────────────────────────────────
+# Study planner
+# ────────────────────────────────────────────────
+
+@app.get("/planner/", response_model=StudyPlanOut)
+def get_study_plan(
+    daily_minutes: Optional[int] = None,
+    goal_minutes: int = planner.DEFAULT_GOAL_MINUTES,
+    days: int = 14,
+    x_user_id: int = Header(..., alias="X-User-Id")
+):
+    if daily_minutes is not None and daily_minutes < 0:
+        raise HTTPException(status_code=400, detail="daily_minutes must be >= 0")
+    if goal_minutes < 1:
+        raise HTTPException(status_code=400, detail="goal_minutes must be at least 1")
+
+    try:
+        return planner.get_plan(x_user_id, daily_minutes, goal_minutes, days)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+# ────────────────────────────────────────────────
+# Quizzes: decks, cards and spaced-repetition reviews
+# ────────────────────────────────────────────────
+
+def _get_owned_deck(cursor, deck_id: int, user_id: int):
+    cursor.execute("SELECT id, user_id FROM decks WHERE id = ?", (deck_id,))
+    row = cursor.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Deck not found")
+    if row["user_id"] != user_id:
+        raise HTTPException(status_code=403, detail="You can only use your own decks")
+    return row
+
+
+@app.post("/decks/", response_model=DeckOut, status_code=201)
+def create_deck(deck: DeckCreate, x_user_id: int = Header(..., alias="X-User-Id")):
+    db = get_db(x_user_id)
+    cursor = db.cursor()
+    try:
+        cursor.execute("SELECT id FROM subjects WHERE id = ?", (deck.subject_id,))
+        if not cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Subject not found")
         cursor.execute(
             """
-            INSERT INTO goals (user_id, title, category, progress, target_date, type, streak, last_done)
-            VALUES (?, ?, ?, ?, ?, ?, 0, NULL)
+            INSERT INTO decks (user_id, subject_id, name, created_at)
+            VALUES (?, ?, ?, datetime('now'))
             """,
-            (
-                goal.user_id,
-                goal.title,
-                goal.category,
-                goal.progress if goal_type == "milestone" else 0,
-                goal.target_date,
-                goal_type
-            )
+            (x_user_id, deck.subject_id, deck.name)
         )
         db.commit()
-        goal_id = cursor.lastrowid
-        return {"id": goal_id, "message": "Goal created"}
+        return {"id": cursor.lastrowid, "subject_id": deck.subject_id, "name": deck.name}
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
         db.close()
 
 
-@app.get("/goals/", response_model=List[GoalOut])
-def get_my_goals(x_user_id: int = Header(..., alias="X-User-Id")):
-    db = get_db()
+@app.get("/decks/", response_model=List[DeckOut])
+def get_my_decks(x_user_id: int = Header(..., alias="X-User-Id")):
+    db = get_db(x_user_id)
     cursor = db.cursor()
     cursor.execute(
         """
-        SELECT id, user_id, title, category, progress, target_date, type, streak, last_done
-        FROM goals
-        WHERE user_id = ?
-        ORDER BY type, target_date DESC
+        SELECT d.id, d.subject_id, d.name,
+               (SELECT COUNT(*) FROM cards c WHERE c.deck_id = d.id) AS card_count,
+               (SELECT COUNT(*) FROM cards c
+                WHERE c.deck_id = d.id AND c.next_due <= datetime('now')) AS due_count
+        FROM decks d
+        WHERE d.user_id = ?
+        ORDER BY d.name
         """,
         (x_user_id,)
     )
     rows = cursor.fetchall()
     db.close()
-
-    goals = []
-    for row in rows:
-        goals.append(
-            GoalOut(
-                id=row[0],
-                user_id=row[1],
-                title=row[2],
-                category=row[3],
-                progress=row[4],
-                target_date=row[5],
-                type=row[6],
-                streak=row[7],
-                last_done=row[8]
-            )
-        )
-    return goals
+    return [dict(row) for row in rows]
 
 
-@app.put("/goals/{goal_id}", status_code=200)
-def update_goal(
-    goal_id: int,
-    updates: GoalCreate,
-    x_user_id: int = Header(..., alias="X-User-Id")
-):
-    db = get_db()
+@app.delete("/decks/{deck_id}", status_code=204)
+def delete_deck(deck_id: int, x_user_id: int = Header(..., alias="X-User-Id")):
+    db = get_db(x_user_id)
     cursor = db.cursor()
-
-    cursor.execute("SELECT user_id FROM goals WHERE id = ?", (goal_id,))
-    row = cursor.fetchone()
-    if not row:
-        db.close()
-        raise HTTPException(status_code=404, detail="Goal not found")
-    if row["user_id"] != x_user_id:
-        db.close()
-        raise HTTPException(status_code=403, detail="You can only edit your own goals")
-
-    fields = []
-    values = []
-    if updates.title is not None:
-        fields.append("title = ?")
-        values.append(updates.title)
-    if updates.category is not None:
-        fields.append("category = ?")
-        values.append(updates.category)
-    if updates.progress is not None:
-        fields.append("progress = ?")
-        values.append(updates.progress)
-    if updates.target_date is not None:
-        fields.append("target_date = ?")
-        values.append(updates.target_date)
-
-    if not fields:
+    try:
+        _get_owned_deck(cursor, deck_id, x_user_id)
+        cursor.execute("DELETE FROM card_reviews WHERE card_id IN (SELECT id FROM cards WHERE deck_id = ?)", (deck_id,))
+        cursor.execute("DELETE FROM cards WHERE deck_id = ?", (deck_id,))
+        cursor.execute("DELETE FROM decks WHERE id = ?", (deck_id,))
+        database.bump_card_version(cursor, x_user_id)
+        db.commit()
+        return Response(status_code=204)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
         db.close()
-        raise HTTPException(status_code=400, detail="No fields to update")
 
-    values.append(goal_id)
-    query = f"UPDATE goals SET {', '.join(fields)} WHERE id = ?"
 
+@app.post("/decks/{deck_id}/cards", response_model=CardOut, status_code=201)
+def create_card(deck_id: int, card: CardCreate, x_user_id: int = Header(..., alias="X-User-Id")):
+    db = get_db(x_user_id)
+    cursor = db.cursor()
     try:
-        cursor.execute(query, values)
+        _get_owned_deck(cursor, deck_id, x_user_id)
+        cursor.execute(
+            """
+            INSERT INTO cards (deck_id, user_id, front, back, next_due)
+            VALUES (?, ?, ?, ?, datetime('now'))
+            """,
+            (deck_id, x_user_id, card.front, card.back)
+        )
+        card_id = cursor.lastrowid
+        database.bump_card_version(cursor, x_user_id)
         db.commit()
-        return {"message": "Goal updated"}
+        cursor.execute(
+            "SELECT id, deck_id, front, back, ease, interval, repetitions, next_due FROM cards WHERE id = ?",
+            (card_id,)
+        )
+        return dict(cursor.fetchone())
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
         db.close()
 
 
-@app.delete("/goals/{goal_id}", status_code=204)
-def delete_goal(goal_id: int, x_user_id: int = Header(..., alias="X-User-Id")):
-    db = get_db()
+@app.get("/decks/{deck_id}/cards", response_model=List[CardOut])
+def get_deck_cards(deck_id: int, x_user_id: int = Header(..., alias="X-User-Id")):
+    db = get_db(x_user_id)
+    cursor = db.cursor()
+    try:
+        _get_owned_deck(cursor, deck_id, x_user_id)
+        cursor.execute(
+            """
+            SELECT id, deck_id, front, back, ease, interval, repetitions, next_due
+            FROM cards
+            WHERE deck_id = ?
+            ORDER BY next_due
+            """,
+            (deck_id,)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        db.close()
+
+
+@app.delete("/cards/{card_id}", status_code=204)
+def delete_card(card_id: int, x_user_id: int = Header(..., alias="X-User-Id")):
+    db = get_db(x_user_id)
     cursor = db.cursor()
 
-    cursor.execute("SELECT user_id FROM goals WHERE id = ?", (goal_id,))
+    cursor.execute("SELECT user_id FROM cards WHERE id = ?", (card_id,))
     row = cursor.fetchone()
     if not row:
         db.close()
-        raise HTTPException(status_code=404, detail="Goal not found")
+        raise HTTPException(status_code=404, detail="Card not found")
     if row["user_id"] != x_user_id:
         db.close()
-        raise HTTPException(status_code=403, detail="You can only delete your own goals")
+        raise HTTPException(status_code=403, detail="You can only delete your own cards")
 
     try:
-        cursor.execute("DELETE FROM goals WHERE id = ?", (goal_id,))
+        cursor.execute("DELETE FROM card_reviews WHERE card_id = ?", (card_id,))
+        cursor.execute("DELETE FROM cards WHERE id = ?", (card_id,))
+        database.bump_card_version(cursor, x_user_id)
         db.commit()
         return Response(status_code=204)
     except sqlite3.Error as e:
@@ -463,56 +754,284 @@ def delete_goal(goal_id: int, x_user_id: int = Header(..., alias="X-User-Id")):
         db.close()
 
 
+@app.get("/quizzes/due", response_model=List[CardOut])
+def get_due_cards(
+    limit: int = settings.default_page_size,
+    deck_id: Optional[int] = None,
+    x_user_id: int = Header(..., alias="X-User-Id")
+):
+    _check_limit(limit)
+    return quizzes.get_due_cards(x_user_id, limit, deck_id)
+
+
+@app.get("/quizzes/practice", response_model=List[CardOut])
+def get_practice_quiz(
+    subject_id: int,
+    n: int = 10,
+    x_user_id: int = Header(..., alias="X-User-Id")
+):
+    if n < 1 or n > 100:
+        raise HTTPException(status_code=400, detail="n must be between 1 and 100")
+    try:
+        return sampler.sample_cards(x_user_id, subject_id, n)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.post("/quizzes/reviews", response_model=List[CardSchedule])
+def record_reviews(reviews: List[CardReview], x_user_id: int = Header(..., alias="X-User-Id")):
+    if any(r.grade < 0 or r.grade > 5 for r in reviews):
+        raise HTTPException(status_code=400, detail="grade must be between 0 and 5")
+    try:
+        results = quizzes.record_reviews(x_user_id, [(r.card_id, r.grade) for r in reviews])
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if results is None:
+        raise HTTPException(status_code=404, detail="One or more cards not found")
+    return results
+
+
 # ────────────────────────────────────────────────
-# Mark daily goal as done (streak logic)
+# Full-text search (session notes, goal titles)
 # ────────────────────────────────────────────────
-@app.post("/goals/{goal_id}/mark-daily", status_code=200)
-def mark_daily_goal_done(
-    goal_id: int,
+
+@app.get("/search", response_model=SearchResults)
+def search_my_data(
+    q: str,
+    limit: int = settings.default_page_size,
+    prefix: bool = False,
     x_user_id: int = Header(..., alias="X-User-Id")
 ):
+    if not search.available:
+        raise HTTPException(status_code=503, detail="Full-text search is not available")
+    _check_limit(limit)
+    try:
+        return search.search(x_user_id, q, limit, prefix)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+# ────────────────────────────────────────────────
+# Study groups and leaderboards
+# ────────────────────────────────────────────────
+
+def _check_member(cursor, group_id: int, user_id: int):
+    cursor.execute("SELECT id FROM study_groups WHERE id = ?", (group_id,))
+    if not cursor.fetchone():
+        raise HTTPException(status_code=404, detail="Group not found")
+    cursor.execute(
+        "SELECT 1 FROM group_members WHERE group_id = ? AND user_id = ?",
+        (group_id, user_id)
+    )
+    if not cursor.fetchone():
+        raise HTTPException(status_code=403, detail="You are not a member of this group")
+
+
+@app.post("/groups/", response_model=GroupOut, status_code=201)
+def create_group(group: GroupCreate, x_user_id: int = Header(..., alias="X-User-Id")):
     db = get_db()
     cursor = db.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO study_groups (name, owner_id, created_at) VALUES (?, ?, datetime('now'))",
+            (group.name, x_user_id)
+        )
+        group_id = cursor.lastrowid
+        cursor.execute(
+            "INSERT INTO group_members (group_id, user_id, joined_at) VALUES (?, ?, datetime('now'))",
+            (group_id, x_user_id)
+        )
+        leaderboards.backfill_member(cursor, group_id, x_user_id)
+        db.commit()
+        return {"id": group_id, "name": group.name, "owner_id": x_user_id, "member_count": 1}
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        db.close()
+
 
+@app.get("/groups/", response_model=List[GroupOut])
+def get_my_groups(x_user_id: int = Header(..., alias="X-User-Id")):
+    db = get_db()
+    cursor = db.cursor()
     cursor.execute(
-        "SELECT user_id, type, last_done, streak FROM goals WHERE id = ?",
-        (goal_id,)
+        """
+        SELECT g.id, g.name, g.owner_id,
+               (SELECT COUNT(*) FROM group_members m2 WHERE m2.group_id = g.id) AS member_count
+        FROM group_members m
+        JOIN study_groups g ON g.id = m.group_id
+        WHERE m.user_id = ?
+        ORDER BY g.name
+        """,
+        (x_user_id,)
     )
-    row = cursor.fetchone()
-    if not row:
-        db.close()
-        raise HTTPException(status_code=404, detail="Goal not found")
-    if row["user_id"] != x_user_id:
-        db.close()
-        raise HTTPException(status_code=403, detail="You can only mark your own goals")
-    if row["type"] != "daily":
-        db.close()
-        raise HTTPException(status_code=400, detail="Only daily goals can be marked done")
+    rows = cursor.fetchall()
+    db.close()
+    return [dict(row) for row in rows]
 
-    today = datetime.now().date().isoformat()
-    last_done = row["last_done"]
-    current_streak = row["streak"]
 
-    if last_done == today:
+@app.post("/groups/{group_id}/join", status_code=200)
+def join_group(group_id: int, x_user_id: int = Header(..., alias="X-User-Id")):
+    db = get_db()
+    cursor = db.cursor()
+    try:
+        cursor.execute("SELECT id FROM study_groups WHERE id = ?", (group_id,))
+        if not cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Group not found")
+        cursor.execute(
+            "INSERT INTO group_members (group_id, user_id, joined_at) VALUES (?, ?, datetime('now'))",
+            (group_id, x_user_id)
+        )
+        leaderboards.backfill_member(cursor, group_id, x_user_id)
+        db.commit()
+        return {"message": "Joined group"}
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="Already a member of this group")
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
         db.close()
-        raise HTTPException(status_code=400, detail="Already marked done today")
 
-    new_streak = 1
-    if last_done:
-        last_date = datetime.fromisoformat(last_done).date()
-        days_diff = (datetime.now().date() - last_date).days
-        if days_diff == 1:
-            new_streak = current_streak + 1
-        # if days_diff > 1 → missed day(s) → streak resets to 1
 
+@app.delete("/groups/{group_id}/membership", status_code=204)
+def leave_group(group_id: int, x_user_id: int = Header(..., alias="X-User-Id")):
+    db = get_db()
+    cursor = db.cursor()
     try:
+        _check_member(cursor, group_id, x_user_id)
         cursor.execute(
-            "UPDATE goals SET streak = ?, last_done = ? WHERE id = ?",
-            (new_streak, today, goal_id)
+            "DELETE FROM group_members WHERE group_id = ? AND user_id = ?",
+            (group_id, x_user_id)
         )
+        leaderboards.remove_member(cursor, group_id, x_user_id)
         db.commit()
-        return {"message": "Marked done", "streak": new_streak}
+        return Response(status_code=204)
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+@app.get("/groups/{group_id}/leaderboard", response_model=LeaderboardOut)
+def get_group_leaderboard(
+    group_id: int,
+    period: str = "week",
+    subject_id: int = leaderboards.ALL_SUBJECTS,
+    limit: int = 10,
+    x_user_id: int = Header(..., alias="X-User-Id")
+):
+    if period not in ("week", "month"):
+        raise HTTPException(status_code=400, detail="period must be 'week' or 'month'")
+    _check_limit(limit)
+
+    db = get_db()
+    cursor = db.cursor()
+    try:
+        _check_member(cursor, group_id, x_user_id)
+        return leaderboards.get_leaderboard(
+            cursor, group_id, x_user_id, leaderboards.current_period(period), subject_id, limit
+        )
+    finally:
+        db.close()
+
+
+# ────────────────────────────────────────────────
+# Metrics (Prometheus text format)
+# ────────────────────────────────────────────────
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admin/slow-queries", response_model=SlowQueryReport)
+def get_slow_queries(flagged_only: bool = False, sort: str = "total_ms", limit: int = 50):
+    if sort not in ("total_ms", "max_ms", "avg_ms", "count", "last_seen"):
+        raise HTTPException(status_code=400, detail="sort must be one of total_ms, max_ms, avg_ms, count, last_seen")
+    _check_limit(limit)
+    return {
+        "threshold_ms": slowlog.threshold * 1000,
+        "statements": slowlog.report(flagged_only, sort, limit),
+    }
+
+
+@app.delete("/admin/slow-queries", status_code=204)
+def reset_slow_queries():
+    slowlog.reset()
+    return Response(status_code=204)
+
+
+@app.get("/admin/config")
+def get_config():
+    """Effective runtime settings (read-only) and the source of each value."""
+    return config.describe()
+
+
+@app.post("/admin/goals/reconcile")
+def reconcile_goal_progress(user_id: Optional[int] = None):
+    """Recompute linked goals' logged minutes from their sessions and repair drift."""
+    try:
+        result = goal_progress.reconcile(user_id)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if result["repaired"] and user_id is not None:
+        planner.invalidate(user_id)
+        forecasting.invalidate(user_id)
+    elif result["repaired"]:
+        planner.invalidate_all()
+        forecasting.invalidate_all()
+    return result
+
+
+@app.post("/admin/leaderboards/reconcile")
+def reconcile_leaderboards(user_id: Optional[int] = None):
+    """Recompute members' current week and month scores from their sessions and repair drift."""
+    try:
+        return leaderboards.reconcile(user_id)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.get("/admin/purges")
+def get_purge_jobs(limit: int = 50):
+    """Recent user purge jobs, newest first, with their progress."""
+    _check_limit(limit)
+    try:
+        return purge.list_jobs(limit)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.get("/admin/purges/{job_id}")
+def get_purge_job(job_id: int):
+    try:
+        job = purge.get_job(job_id)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if not job:
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    return job
+
+
+@app.get("/admin/shards")
+def get_shards():
+    """Per-shard user and row counts (fan-out over every shard)."""
+    shards = [
+        {"shard": shard, "path": database.shard_path(shard), "users": 0, "rows": {}}
+        for shard in range(database.SHARD_COUNT)
+    ]
+    try:
+        for shard, rows in enumerate(fan_out(
+            """
+            SELECT COUNT(*) FROM (
+                SELECT user_id FROM study_sessions UNION SELECT user_id FROM goals
+                UNION SELECT user_id FROM decks
+            )
+            """
+        )):
+            shards[shard]["users"] = rows[0][0]
+        for table in database.SHARDED_TABLES:
+            for shard, rows in enumerate(fan_out(f"SELECT COUNT(*) FROM {table}")):
+                shards[shard]["rows"][table] = rows[0][0]
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    return shards
@@ -0,0 +1,448 @@
+# metrics.py
+#
+# In-process metrics in Prometheus text format.
+#
+#   - MetricsMiddleware: per-route request counts by status, latency
+#     histograms and the number of requests in flight
+#   - InstrumentedConnection: sqlite3 connection factory that counts and
+#     times every statement and handles SQLITE_BUSY itself, so lock waits
+#     and retries are visible instead of hidden inside sqlite's busy handler.
+#     Like that handler it only waits where waiting can help: before a
+#     transaction has run anything, and at COMMIT. Inside an open
+#     transaction SQLITE_BUSY is a deadlock (upgrading a read to a write
+#     while another connection writes) or a stale WAL snapshot, which no
+#     wait clears, so it is raised at once and counted as a conflict.
+#     Statements over the slow-query threshold are handed to slowlog.py
+#   - admission control (admission.py): requests admitted or turned away
+#     by class and reason, time spent queued and the current queue length
+#   - password hashing (auth.py): latency and queue wait by operation, the
+#     hashing pool's queue depth and the jobs it turned away
+#
+# Recording is a dict lookup and a few additions under one lock per event.
+# Each worker process keeps its own numbers; scrape every worker.
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import slowlog
+from config import settings
+
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+BUSY_TIMEOUT = settings.busy_timeout_s
+BUSY_BACKOFF = 0.001   # first retry delay, doubled up to BUSY_BACKOFF_MAX
+BUSY_BACKOFF_MAX = 0.05
+
+
+class Histogram:
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests: Dict[Tuple[str, str, int], int] = defaultdict(int)
+            self.latency: Dict[Tuple[str, str], Histogram] = {}
+            self.in_flight = 0
+            self.statements: Dict[str, int] = defaultdict(int)
+            self.statement_seconds: Dict[str, float] = defaultdict(float)
+            self.statement_errors: Dict[str, int] = defaultdict(int)
+            self.busy_retries = 0
+            self.busy_timeouts = 0
+            self.busy_conflicts = 0
+            self.lock_wait_seconds = 0.0
+            self.admissions: Dict[Tuple[str, str], int] = defaultdict(int)
+            self.admission_wait_seconds: Dict[str, float] = defaultdict(float)
+            self.admission_queued = 0
+            self.hash_latency: Dict[str, Histogram] = {}
+            self.hash_wait_seconds: Dict[str, float] = defaultdict(float)
+            self.hash_rejected: Dict[str, int] = defaultdict(int)
+            self.hash_queue_depth = 0
+            self.live_timers = 0
+            self.timer_checkpoints = 0
+            self.timer_checkpoint_seconds = 0.0
+            self.timers_finalized: Dict[str, int] = defaultdict(int)
+            self.reminders_held = 0
+            self.reminder_outcomes: Dict[str, int] = defaultdict(int)
+
+    # ── HTTP ────────────────────────────────────────
+    def request_started(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def request_finished(self, method: str, route: str, status: int, seconds: float):
+        with self.lock:
+            self.in_flight -= 1
+            self.requests[(method, route, status)] += 1
+            hist = self.latency.get((method, route))
+            if hist is None:
+                hist = self.latency[(method, route)] = Histogram(LATENCY_BUCKETS)
+            hist.observe(seconds)
+
+    # ── SQLite ──────────────────────────────────────
+    def statement(self, label: str, seconds: float, failed: bool = False):
+        with self.lock:
+            self.statements[label] += 1
+            self.statement_seconds[label] += seconds
+            if failed:
+                self.statement_errors[label] += 1
+
+    def busy(self, retries: int, waited: float, timed_out: bool, conflict: bool = False):
+        with self.lock:
+            self.busy_retries += retries
+            self.lock_wait_seconds += waited
+            if timed_out:
+                self.busy_timeouts += 1
+            if conflict:
+                self.busy_conflicts += 1
+
+    # ── admission control ───────────────────────────
+    def admission(self, kind: str, outcome: str, waited: float = 0.0, queued: Optional[int] = None):
+        with self.lock:
+            self.admissions[(kind, outcome)] += 1
+            self.admission_wait_seconds[kind] += waited
+            if queued is not None:
+                self.admission_queued = queued
+
+    # ── password hashing ────────────────────────────
+    def password_hash(self, operation: str, seconds: float, waited: float):
+        with self.lock:
+            hist = self.hash_latency.get(operation)
+            if hist is None:
+                hist = self.hash_latency[operation] = Histogram(LATENCY_BUCKETS)
+            hist.observe(seconds)
+            self.hash_wait_seconds[operation] += waited
+
+    def password_hash_rejected(self, operation: str):
+        with self.lock:
+            self.hash_rejected[operation] += 1
+
+    def password_hash_queue(self, depth: int):
+        with self.lock:
+            self.hash_queue_depth = depth
+
+    # ── live timers ─────────────────────────────────
+    def timer_checkpoint(self, active: int, seconds: float):
+        with self.lock:
+            self.live_timers = active
+            self.timer_checkpoints += 1
+            self.timer_checkpoint_seconds += seconds
+
+    def timer_finalized(self, reason: str):
+        with self.lock:
+            self.timers_finalized[reason] += 1
+
+    # ── daily goal reminders ────────────────────────
+    def reminders_scheduled(self, count: int):
+        with self.lock:
+            self.reminders_held = count
+
+    def reminder(self, outcome: str):
+        with self.lock:
+            self.reminder_outcomes[outcome] += 1
+
+    # ── exposition ──────────────────────────────────
+    def render(self) -> str:
+        with self.lock:
+            out = [
+                "# HELP http_requests_total HTTP requests by route and status.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), n in sorted(self.requests.items()):
+                out.append(f'http_requests_total{{method="{method}",route="{_esc(route)}",status="{status}"}} {n}')
+
+            out += [
+                "# HELP http_request_duration_seconds Request latency by route.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (method, route), hist in sorted(self.latency.items()):
+                labels = f'method="{method}",route="{_esc(route)}"'
+                cumulative = 0
+                for bound, n in zip(self.buckets_le(), hist.counts):
+                    cumulative += n
+                    out.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                out.append(f"http_request_duration_seconds_sum{{{labels}}} {hist.total:.6f}")
+                out.append(f"http_request_duration_seconds_count{{{labels}}} {hist.count}")
+
+            out += [
+                "# HELP http_requests_in_flight Requests currently being handled.",
+                "# TYPE http_requests_in_flight gauge",
+                f"http_requests_in_flight {self.in_flight}",
+                "# HELP db_statements_total SQL statements executed, by statement kind and table.",
+                "# TYPE db_statements_total counter",
+            ]
+            for label, n in sorted(self.statements.items()):
+                out.append(f'db_statements_total{{statement="{_esc(label)}"}} {n}')
+            out += [
+                "# HELP db_statement_seconds_total Cumulative statement execution time.",
+                "# TYPE db_statement_seconds_total counter",
+            ]
+            for label, seconds in sorted(self.statement_seconds.items()):
+                out.append(f'db_statement_seconds_total{{statement="{_esc(label)}"}} {seconds:.6f}')
+            out += [
+                "# HELP db_statement_errors_total Statements that raised a sqlite3 error.",
+                "# TYPE db_statement_errors_total counter",
+            ]
+            for label, n in sorted(self.statement_errors.items()):
+                out.append(f'db_statement_errors_total{{statement="{_esc(label)}"}} {n}')
+            out += [
+                "# HELP db_busy_retries_total Retries after SQLITE_BUSY (database is locked).",
+                "# TYPE db_busy_retries_total counter",
+                f"db_busy_retries_total {self.busy_retries}",
+                "# HELP db_busy_timeouts_total Statements that gave up waiting for a lock.",
+                "# TYPE db_busy_timeouts_total counter",
+                f"db_busy_timeouts_total {self.busy_timeouts}",
+                "# HELP db_busy_conflicts_total SQLITE_BUSY inside an open transaction, raised without waiting.",
+                "# TYPE db_busy_conflicts_total counter",
+                f"db_busy_conflicts_total {self.busy_conflicts}",
+                "# HELP db_lock_wait_seconds_total Time spent waiting for SQLite locks.",
+                "# TYPE db_lock_wait_seconds_total counter",
+                f"db_lock_wait_seconds_total {self.lock_wait_seconds:.6f}",
+                "# HELP admission_requests_total Requests admitted, throttled (429) or shed (503) by admission control.",
+                "# TYPE admission_requests_total counter",
+            ]
+            for (kind, outcome), n in sorted(self.admissions.items()):
+                out.append(f'admission_requests_total{{class="{kind}",outcome="{outcome}"}} {n}')
+            out += [
+                "# HELP admission_queue_wait_seconds_total Time requests spent queued for admission.",
+                "# TYPE admission_queue_wait_seconds_total counter",
+            ]
+            for kind, seconds in sorted(self.admission_wait_seconds.items()):
+                out.append(f'admission_queue_wait_seconds_total{{class="{kind}"}} {seconds:.6f}')
+            out += [
+                "# HELP admission_queued Requests waiting for admission.",
+                "# TYPE admission_queued gauge",
+                f"admission_queued {self.admission_queued}",
+                "# HELP password_hash_duration_seconds Time to hash or verify one password.",
+                "# TYPE password_hash_duration_seconds histogram",
+            ]
+            for operation, hist in sorted(self.hash_latency.items()):
+                labels = f'operation="{operation}"'
+                cumulative = 0
+                for bound, n in zip(self.buckets_le(), hist.counts):
+                    cumulative += n
+                    out.append(f'password_hash_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                out.append(f"password_hash_duration_seconds_sum{{{labels}}} {hist.total:.6f}")
+                out.append(f"password_hash_duration_seconds_count{{{labels}}} {hist.count}")
+            out += [
+                "# HELP password_hash_queue_wait_seconds_total Time hashing jobs waited for a pool thread.",
+                "# TYPE password_hash_queue_wait_seconds_total counter",
+            ]
+            for operation, seconds in sorted(self.hash_wait_seconds.items()):
+                out.append(f'password_hash_queue_wait_seconds_total{{operation="{operation}"}} {seconds:.6f}')
+            out += [
+                "# HELP password_hash_rejected_total Hashing jobs refused because the queue was full.",
+                "# TYPE password_hash_rejected_total counter",
+            ]
+            for operation, n in sorted(self.hash_rejected.items()):
+                out.append(f'password_hash_rejected_total{{operation="{operation}"}} {n}')
+            out += [
+                "# HELP password_hash_queue_depth Hashing jobs queued or running.",
+                "# TYPE password_hash_queue_depth gauge",
+                f"password_hash_queue_depth {self.hash_queue_depth}",
+                "# HELP live_timers Running or paused study timers held in memory (as of the last checkpoint).",
+                "# TYPE live_timers gauge",
+                f"live_timers {self.live_timers}",
+                "# HELP live_timer_checkpoints_total Checkpoints of timer heartbeats to SQLite.",
+                "# TYPE live_timer_checkpoints_total counter",
+                f"live_timer_checkpoints_total {self.timer_checkpoints}",
+                "# HELP live_timer_checkpoint_seconds_total Time spent writing timer checkpoints.",
+                "# TYPE live_timer_checkpoint_seconds_total counter",
+                f"live_timer_checkpoint_seconds_total {self.timer_checkpoint_seconds:.6f}",
+                "# HELP live_timers_finalized_total Timers turned into a study session, by stop or idle timeout.",
+                "# TYPE live_timers_finalized_total counter",
+            ]
+            for reason, n in sorted(self.timers_finalized.items()):
+                out.append(f'live_timers_finalized_total{{reason="{reason}"}} {n}')
+            out += [
+                "# HELP reminders_scheduled Daily goal reminders held by the scheduler.",
+                "# TYPE reminders_scheduled gauge",
+                f"reminders_scheduled {self.reminders_held}",
+                "# HELP reminders_total Due reminders: sent, failed (sink error), skipped (done, changed or sent "
+                "elsewhere), refused (scheduler full).",
+                "# TYPE reminders_total counter",
+            ]
+            for outcome, n in sorted(self.reminder_outcomes.items()):
+                out.append(f'reminders_total{{outcome="{outcome}"}} {n}')
+        return "\n".join(out) + "\n"
+
+    @staticmethod
+    def buckets_le() -> List[str]:
+        return [str(b) for b in LATENCY_BUCKETS] + ["+Inf"]
+
+
+def _esc(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+registry = Registry()
+
+
+# ────────────────────────────────────────────────
+# HTTP middleware (plain ASGI, no per-request task or body buffering)
+# ────────────────────────────────────────────────
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        registry.request_started()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Label by route template, never the raw path, to bound cardinality
+            path = getattr(route, "path", "unmatched")
+            registry.request_finished(scope["method"], path, status, time.perf_counter() - start)
+
+
+# ────────────────────────────────────────────────
+# SQLite instrumentation
+# ────────────────────────────────────────────────
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+_DML = {"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH"}
+_labels: Dict[str, str] = {}
+
+
+def statement_label(sql: str) -> str:
+    """Low-cardinality label such as 'SELECT study_sessions' (cached per SQL text)."""
+    label = _labels.get(sql)
+    if label is None:
+        words = sql.split(None, 1)
+        verb = words[0].upper() if words else "?"
+        match = _TABLE.search(sql) if verb in _DML else None
+        label = f"{verb} {match.group(1)}" if match else verb
+        if len(_labels) < 10000:
+            _labels[sql] = label
+    return label
+
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    message = str(error)
+    # FTS5 reports a lock hit while loading its config (the search triggers
+    # on first use in a connection) as a failed vtable constructor
+    return "locked" in message or "busy" in message or "vtable constructor failed" in message
+
+
+def _timed(label: str, retry: bool, fn, *args):
+    """
+    Runs one statement and records its duration and any failure. With
+    `retry` (nothing has run in the connection's transaction yet, or this
+    is its COMMIT) a locked database is retried with backoff for up to
+    BUSY_TIMEOUT; otherwise SQLITE_BUSY is raised at once.
+    Returns (result, seconds spent executing, i.e. excluding lock waits).
+    """
+    start = time.perf_counter()
+    retries = 0
+    waited = 0.0
+    delay = BUSY_BACKOFF
+    while True:
+        try:
+            result = fn(*args)
+        except sqlite3.OperationalError as e:
+            busy = _is_busy(e)
+            if busy and retry and waited < BUSY_TIMEOUT:
+                time.sleep(delay)
+                waited += delay
+                retries += 1
+                delay = min(delay * 2, BUSY_BACKOFF_MAX)
+                continue
+            if busy:
+                registry.busy(retries, waited, timed_out=retry, conflict=not retry)
+            registry.statement(label, time.perf_counter() - start, failed=True)
+            raise
+        except sqlite3.Error:
+            registry.statement(label, time.perf_counter() - start, failed=True)
+            raise
+        if retries:
+            registry.busy(retries, waited, False)
+        elapsed = time.perf_counter() - start
+        registry.statement(label, elapsed)
+        return result, elapsed - waited
+
+
+def _run(cursor, fn, sql: str, parameters):
+    conn = cursor.connection
+    verb = sql.lstrip()[:6].upper()
+    retry = not conn.in_transaction or not conn.transaction_used or verb.startswith(("COMMIT", "END"))
+    try:
+        return _timed(statement_label(sql), retry, fn, sql, parameters)
+    finally:
+        # BEGIN takes no lock of its own (IMMEDIATE waits as it runs, i.e. retried)
+        conn.transaction_used = conn.in_transaction and (conn.transaction_used or not verb.startswith("BEGIN"))
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        result, seconds = _run(self, super().execute, sql, parameters)
+        if seconds >= slowlog.threshold:
+            slowlog.record(self.connection, sql, parameters, seconds)
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        if not isinstance(seq_of_parameters, (list, tuple)):
+            seq_of_parameters = list(seq_of_parameters)
+        result, seconds = _run(self, super().executemany, sql, seq_of_parameters)
+        if seconds >= slowlog.threshold:
+            slowlog.record(self.connection, sql, seq_of_parameters, seconds, many=True)
+        return result
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Use with sqlite3.connect(..., factory=InstrumentedConnection, timeout=0):
+    busy waits are then handled (and counted) here instead of inside SQLite.
+    """
+
+    transaction_used = False  # a statement has run since the transaction began
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        try:
+            return _timed("COMMIT", True, super().commit)[0]
+        finally:
+            self.transaction_used = self.in_transaction
+
+    def rollback(self):
+        try:
+            return super().rollback()
+        finally:
+            self.transaction_used = False
@@ -0,0 +1,382 @@
+# planner.py
+#
+# Study planner: lays a user's open milestone goals out day by day.
+#
+# A goal linked to a subject (goal_progress.py) is worked off at that
+# subject's pace, the same fitted minutes/day forecasting.py uses, so the
+# plan's finish date for it is the forecast's estimated completion. Every
+# minute on the subject counts toward all goals linked to it, so they run
+# in parallel: each one finishes ceil(remaining / pace) days on, today
+# included.
+#
+# The other goals share the daily availability (the user's usual minutes
+# on a study day, or what they asked for), earliest deadline first. Every
+# goal is available from today, so the EDF schedule is fully described
+# by two prefix sums: cumulative remaining work (goals in deadline order) and
+# cumulative capacity (days in calendar order). Goal i covers the work
+# interval [W(i-1), W(i)) and day d supplies [C(d-1), C(d)), so a finish day
+# is one binary search, and logging a session is a Fenwick-tree update on the
+# cached plan instead of a replan from the database.
+#
+# Cached plans carry the user's data version (database.data_version), which
+# every session and goal write bumps in the shard; a plan whose version is
+# not the current one was overtaken by a write, possibly in another worker,
+# and is rebuilt. record_session folds a session in only when it is the
+# single write since the plan was built.
+import bisect
+import math
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import analytics
+import forecasting
+from config import settings
+from database import data_version, get_db
+from fenwick import FenwickTree
+
+HORIZON_DAYS = 365
+DEFAULT_GOAL_MINUTES = forecasting.GOAL_MINUTES
+DEFAULT_DAILY_MINUTES = 60
+PACE_WINDOW_DAYS = 28
+MAX_CACHED_PLANS = settings.planner_cache_size
+
+
+class LinkedSubject:
+    """Open goals linked to one subject (in deadline order), all advancing at its pace."""
+
+    def __init__(self, goals: List[Dict], pace: float):
+        self.goals = goals
+        self.pace = pace
+        self.remaining = [max(0, int(g["remaining"])) for g in goals]
+        self.most = max(self.remaining, default=0)
+
+    def finish_day(self, index: int) -> Optional[int]:
+        """Day offset on which goal `index` is completed, None at pace 0."""
+        if self.remaining[index] == 0 or self.pace <= 0:
+            return None
+        return math.ceil(self.remaining[index] / self.pace) - 1  # as forecasting.forecast
+
+    def blocks(self, day: int) -> List[Dict]:
+        """The subject's minutes on `day`, under the open goal due first."""
+        minutes = (min(self.most, math.floor(self.pace * (day + 1)))
+                   - min(self.most, math.floor(self.pace * day)))
+        if minutes <= 0:
+            return []
+        goal = next(g for g, left in zip(self.goals, self.remaining) if left > math.floor(self.pace * day))
+        return [{"goal_id": goal["id"], "title": goal["title"], "minutes": minutes}]
+
+    def worked_off(self, day: int) -> bool:
+        """Nothing left after `day` (or never anything to do)."""
+        return self.pace <= 0 or math.floor(self.pace * (day + 1)) >= self.most
+
+
+class StudyPlan:
+    """
+    Plan for one user starting at `start`.
+
+    goals: dicts with id, title, target_date (date or None), remaining
+    (minutes) and subject_id (None unless linked). pace: minutes/day per
+    subject; goals on those subjects advance at it, the rest go EDF on
+    daily_minutes, the capacity per day (index 0 = start).
+    """
+
+    def __init__(self, goals: List[Dict], daily_minutes: List[int], start: date,
+                 pace: Optional[Dict[int, float]] = None):
+        self.start = start
+        horizon = len(daily_minutes)
+        pace = pace or {}
+
+        def deadline_key(goal):
+            target = goal["target_date"]
+            offset = (target - start).days if target else horizon
+            return (offset, goal["id"])
+
+        ordered = sorted(goals, key=deadline_key)
+        self.order = [g["id"] for g in ordered]
+        self.subjects = {
+            subject_id: LinkedSubject([g for g in ordered if g.get("subject_id") == subject_id], rate)
+            for subject_id, rate in sorted(pace.items())
+        }
+        self.goals = [g for g in ordered if g.get("subject_id") not in self.subjects]
+        self.position = {g["id"]: i for i, g in enumerate(self.goals)}
+        self.remaining = [max(0, int(g["remaining"])) for g in self.goals]
+        self.work = FenwickTree(self.remaining)
+
+        self.capacity = [max(0, int(m)) for m in daily_minutes]
+        self.cum_capacity = list(accumulate(self.capacity))
+        self.used_today = 0
+
+    # ── incremental updates ─────────────────────────
+    def record_minutes(self, minutes: int, goal_id: Optional[int] = None):
+        """
+        Apply a logged session: it uses up today's capacity and the work it
+        was planned for. Without a goal it counts toward the head of the
+        queue, which is what the plan scheduled for today.
+        """
+        if minutes <= 0:
+            return
+        self.use_capacity(minutes)
+
+        if goal_id is not None:
+            i = self.position.get(goal_id)
+            if i is not None:
+                self._take(i, minutes)
+            return
+
+        left = minutes
+        while left > 0:
+            i = self.work.search(0)
+            if i >= len(self.remaining):
+                break
+            left -= self._take(i, left)
+
+    def use_capacity(self, minutes: int):
+        """Minutes studied today whose work is already counted (linked goals)."""
+        if minutes > 0:
+            self.used_today = min(self.capacity[0], self.used_today + minutes) if self.capacity else 0
+
+    def _take(self, index: int, minutes: int) -> int:
+        taken = min(minutes, self.remaining[index])
+        if taken:
+            self.remaining[index] -= taken
+            self.work.add(index, -taken)
+        return taken
+
+    # ── queries ─────────────────────────────────────
+    def day_capacity(self, day: int) -> int:
+        return self.capacity[day] - (self.used_today if day == 0 else 0)
+
+    def finish_day(self, index: int) -> Optional[int]:
+        """Day offset on which goal `index` is completed, None past the horizon."""
+        if self.remaining[index] == 0:
+            return None
+        end = self.work.prefix(index + 1) + self.used_today
+        day = bisect.bisect_left(self.cum_capacity, end)
+        return day if day < len(self.cum_capacity) else None
+
+    def goal_summary(self) -> List[Dict]:
+        """All goals in deadline order."""
+        rows = {g["id"]: (g, self.remaining[i], self.finish_day(i)) for i, g in enumerate(self.goals)}
+        for subject in self.subjects.values():
+            rows.update((g["id"], (g, subject.remaining[i], subject.finish_day(i)))
+                        for i, g in enumerate(subject.goals))
+        summary = []
+        for goal_id in self.order:
+            goal, remaining, finish = rows[goal_id]
+            finish_date = self.start + timedelta(days=finish) if finish is not None else None
+            target = goal["target_date"]
+            if remaining == 0:
+                on_track = True
+            elif finish_date is None:
+                on_track = False
+            else:
+                on_track = target is None or finish_date <= target
+            summary.append({
+                "goal_id": goal["id"],
+                "title": goal["title"],
+                "target_date": target.isoformat() if target else None,
+                "remaining_minutes": remaining,
+                "finish_date": finish_date.isoformat() if finish_date else None,
+                "on_track": on_track,
+            })
+        return summary
+
+    def schedule(self, days: Optional[int] = None) -> List[Dict]:
+        """Materialize the first `days` days of the plan (all by default)."""
+        limit = len(self.capacity) if days is None else min(days, len(self.capacity))
+        out = []
+        g = 0
+        left = self.remaining[0] if self.remaining else 0
+        for d in range(limit):
+            cap = self.day_capacity(d)
+            blocks = []
+            while cap > 0 and g < len(self.goals):
+                if left == 0:
+                    g += 1
+                    left = self.remaining[g] if g < len(self.goals) else 0
+                    continue
+                take = min(cap, left)
+                blocks.append({"goal_id": self.goals[g]["id"], "title": self.goals[g]["title"], "minutes": take})
+                cap -= take
+                left -= take
+            for subject in self.subjects.values():
+                blocks += subject.blocks(d)
+            if blocks:
+                out.append({"date": (self.start + timedelta(days=d)).isoformat(), "blocks": blocks})
+            if g >= len(self.goals) and all(subject.worked_off(d) for subject in self.subjects.values()):
+                break
+        return out
+
+
+# ────────────────────────────────────────────────
+# Loading plans from the database
+# ────────────────────────────────────────────────
+def _today() -> date:
+    # session_date is written with SQLite's datetime('now'), i.e. UTC
+    return datetime.now(timezone.utc).date()
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+
+def load_pace(user_id: int, subject_ids, start: date) -> Dict[int, float]:
+    """Minutes/day on each subject, fitted on the cached session arrays as the forecasts are."""
+    subjects = np.array(sorted(subject_ids), dtype=np.int64)
+    today = (start - date(1970, 1, 1)).days
+    pace, _ = forecasting.fit_pace(analytics.get_arrays(user_id), subjects, today)
+    return dict(zip(subjects.tolist(), pace.tolist()))
+
+
+def build_plan(user_id: int, daily_minutes: Optional[int] = None,
+               goal_minutes: int = DEFAULT_GOAL_MINUTES) -> Dict:
+    db = get_db(user_id)
+    cursor = db.cursor()
+    try:
+        # read first: everything below is at least this new
+        version = data_version(db, user_id)
+        cursor.execute(
+            """
+            SELECT id, title, progress, target_date, subject_id, target_minutes, logged_minutes
+            FROM goals
+            WHERE user_id = ? AND type = 'milestone' AND progress < 100
+            """,
+            (user_id,)
+        )
+        goals = []
+        for row in cursor.fetchall():
+            # linked goals know their real remaining minutes (as forecasting.py counts them)
+            linked = row["subject_id"] is not None and bool(row["target_minutes"])
+            goals.append({
+                "id": row["id"],
+                "title": row["title"],
+                "target_date": _parse_date(row["target_date"]),
+                "subject_id": row["subject_id"] if linked else None,
+                "remaining": row["target_minutes"] - row["logged_minutes"] if linked
+                else round(goal_minutes * (100 - (row["progress"] or 0)) / 100),
+            })
+
+        cursor.execute(
+            """
+            SELECT SUM(duration) / COUNT(DISTINCT date(session_date))
+            FROM study_sessions
+            WHERE user_id = ? AND session_date >= datetime('now', ?)
+            """,
+            (user_id, f"-{PACE_WINDOW_DAYS} days")
+        )
+        minutes_per_study_day = cursor.fetchone()[0]
+
+        cursor.execute(
+            """
+            SELECT subject_id, SUM(duration)
+            FROM study_sessions
+            WHERE user_id = ? AND session_date >= date('now')
+            GROUP BY subject_id
+            """,
+            (user_id,)
+        )
+        logged_today = dict(cursor.fetchall())
+    finally:
+        db.close()
+
+    if daily_minutes is None:
+        # plan at the user's usual session length on the days they do study
+        daily_minutes = minutes_per_study_day or DEFAULT_DAILY_MINUTES
+
+    start = _today()
+    pace = load_pace(user_id, {g["subject_id"] for g in goals if g["subject_id"] is not None}, start)
+    plan = StudyPlan(goals, [daily_minutes] * HORIZON_DAYS, start, pace)
+    # Today's minutes on linked subjects are already in those goals' totals
+    plan.record_minutes(sum(m for subject, m in logged_today.items() if subject not in pace))
+    return {"plan": plan, "daily_minutes": daily_minutes, "version": version}
+
+
+# ────────────────────────────────────────────────
+# Per-user plan cache
+# ────────────────────────────────────────────────
+_plans: "OrderedDict[int, Dict]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _current_version(user_id: int) -> int:
+    db = get_db(user_id)
+    try:
+        return data_version(db, user_id)
+    finally:
+        db.close()
+
+
+def get_plan(user_id: int, daily_minutes: Optional[int] = None,
+             goal_minutes: int = DEFAULT_GOAL_MINUTES, days: int = 14) -> Dict:
+    """
+    Plan for the user, served from the cache unless the day, the inputs or
+    the user's data changed since it was built.
+    """
+    key = (daily_minutes, goal_minutes)
+    version = _current_version(user_id)
+    with _lock:
+        entry = _plans.get(user_id)
+        if entry:
+            _plans.move_to_end(user_id)
+    if (not entry or entry["key"] != key or entry["version"] != version
+            or entry["plan"].start != _today()):
+        entry = build_plan(user_id, daily_minutes, goal_minutes)
+        entry["key"] = key
+        with _lock:
+            _plans[user_id] = entry
+            _plans.move_to_end(user_id)
+            while len(_plans) > MAX_CACHED_PLANS:
+                _plans.popitem(last=False)
+
+    with _lock:
+        plan = entry["plan"]
+        return {
+            "start": plan.start.isoformat(),
+            "daily_minutes": entry["daily_minutes"],
+            "pace": [
+                {"subject_id": subject_id, "minutes_per_day": round(subject.pace, 1)}
+                for subject_id, subject in plan.subjects.items()
+            ],
+            "goals": plan.goal_summary(),
+            "days": plan.schedule(days),
+        }
+
+
+def record_session(user_id: int, minutes: int, subject_id: Optional[int] = None):
+    """
+    Fold a newly logged session into the cached plan, if there is one and
+    the session is the only write since it was built (call it after the
+    session is committed). A session for a subject that goals are linked
+    to changed those goals' remaining minutes and the subject's pace, so
+    the plan is rebuilt instead.
+    """
+    version = _current_version(user_id)
+    with _lock:
+        entry = _plans.get(user_id)
+        if not entry:
+            return
+        if entry["version"] != version - 1 or subject_id in entry["plan"].subjects:
+            _plans.pop(user_id, None)
+        else:
+            entry["plan"].record_minutes(minutes)
+            entry["version"] = version
+
+
+def invalidate(user_id: int):
+    with _lock:
+        _plans.pop(user_id, None)
+
+
+def invalidate_all():
+    with _lock:
+        _plans.clear()
@@ -0,0 +1,389 @@
+# purge.py
+#
+# Deleting a user in small pieces.
+#
+# Foreign keys are not enabled on our connections, so the schema's ON DELETE
+# CASCADE never fires, and enabling them would turn deleting a heavy user
+# into one transaction holding the write lock for as long as it takes.
+# Instead delete_user() removes the users row and queues a purge job in one
+# short transaction (the user is gone from that moment on), and a worker
+# deletes the rest, what the cascades describe, in batches of
+# settings.purge_batch_rows with a commit and a settings.purge_pause_ms
+# pause after each, so other writers get the lock in between:
+#
+#   every shard    goals, study_sessions and their archive, card_reviews,
+#                  cards, decks, sampler banks, the data version
+#   global shard   habits, group memberships with their leaderboard rows,
+#                  groups the user owned with their members, scores and
+#                  rank counts
+#
+# Jobs live in purge_jobs on the global shard with their progress
+# (rows_deleted, the step being worked on, a heartbeat). Every step deletes
+# whatever still matches, so a job that dies halfway is simply picked up
+# again once its heartbeat is settings.purge_stale_s old; a job that failed
+# is retried after the same pause, up to MAX_ATTEMPTS times. The API runs a
+# worker thread per process (settings.purge_poll_s, 0 to leave it to
+# `python purge.py run`); jobs are claimed atomically, so any number of
+# workers can share the queue.
+#
+# `orphans` finds rows left behind before this existed: per-user rows
+# whose user is gone, cards without their deck, reviews without their
+# card, members and scores of groups that no longer exist. --fix queues
+# purges for the missing users, deletes the rest in batches and runs the
+# queue.
+#
+#   python purge.py run                # work through the queue, then exit
+#   python purge.py status [JOB_ID]
+#   python purge.py orphans [--fix]
+import argparse
+import json
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import database
+import leaderboards
+from config import settings
+
+# Child tables before their parents
+SHARD_STEPS = ["goals", "study_sessions", *database.ARCHIVE_TABLES, "card_reviews", "cards", "decks",
+               "sampler_banks", "user_data_versions"]
+
+MAX_ATTEMPTS = 5
+
+JOB_COLUMNS = "id, user_id, status, created_at, started_at, finished_at, heartbeat_at, rows_deleted, step, attempts, error"
+
+
+def enqueue(cursor, user_id: int) -> int:
+    """Queue a purge of the user's rows; runs in the caller's transaction on the global shard."""
+    cursor.execute(
+        """
+        INSERT INTO purge_jobs (user_id, status, created_at, rows_deleted, attempts)
+        VALUES (?, 'pending', datetime('now'), 0, 0)
+        """,
+        (user_id,)
+    )
+    return cursor.lastrowid
+
+
+def delete_user(user_id: int) -> Optional[int]:
+    """Deletes the users row (and live timer) and queues its purge; the job id, or None if there is no such user."""
+    db = database.get_db()
+    try:
+        cursor = db.cursor()
+        cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        if cursor.rowcount == 0:
+            db.rollback()
+            return None
+        cursor.execute("DELETE FROM live_timers WHERE user_id = ?", (user_id,))
+        job_id = enqueue(cursor, user_id)
+        db.commit()
+    finally:
+        db.close()
+    wake()
+    return job_id
+
+
+def get_job(job_id: int) -> Optional[Dict]:
+    db = database.get_db()
+    try:
+        row = db.execute(f"SELECT {JOB_COLUMNS} FROM purge_jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+    finally:
+        db.close()
+
+
+def list_jobs(limit: int = 50) -> List[Dict]:
+    db = database.get_db()
+    try:
+        rows = db.execute(f"SELECT {JOB_COLUMNS} FROM purge_jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        db.close()
+
+
+# ────────────────────────────────────────────────
+# Running jobs
+# ────────────────────────────────────────────────
+def _claim() -> Optional[Dict]:
+    """The oldest pending, abandoned or retryable job, marked running by this worker."""
+    db = database.get_db()
+    try:
+        row = db.execute(
+            f"""
+            UPDATE purge_jobs
+            SET status = 'running', attempts = attempts + 1, error = NULL,
+                started_at = COALESCE(started_at, datetime('now')), heartbeat_at = datetime('now')
+            WHERE id = (
+                SELECT id FROM purge_jobs
+                WHERE status = 'pending'
+                   OR (status = 'running' AND heartbeat_at < datetime('now', ?1))
+                   OR (status = 'failed' AND attempts < ?2 AND heartbeat_at < datetime('now', ?1))
+                ORDER BY id LIMIT 1
+            )
+            RETURNING {JOB_COLUMNS}
+            """,
+            (f"-{settings.purge_stale_s} seconds", MAX_ATTEMPTS)
+        ).fetchone()
+        db.commit()
+        return dict(row) if row else None
+    finally:
+        db.close()
+
+
+def _record(job_id: int, rows: int, step: str, status: str = "running", error: Optional[str] = None):
+    db = database.get_db()
+    try:
+        db.execute(
+            """
+            UPDATE purge_jobs
+            SET rows_deleted = rows_deleted + ?, step = ?, status = ?, error = ?, heartbeat_at = datetime('now'),
+                finished_at = CASE WHEN ? = 'done' THEN datetime('now') END
+            WHERE id = ?
+            """,
+            (rows, step, status, error, status, job_id)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def delete_in_batches(shard: int, table: str, where: str, params=(),
+                      progress: Optional[Callable[[int], None]] = None) -> int:
+    """
+    DELETE FROM table WHERE <where>, settings.purge_batch_rows rows per
+    transaction with a pause in between. `where` should be answerable from
+    an index, or every batch scans the table. Returns the rows deleted.
+    """
+    batch = settings.purge_batch_rows
+    total = 0
+    while True:
+        db = database.get_db(shard=shard)
+        try:
+            deleted = db.execute(
+                f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT ?)",
+                (*params, batch)
+            ).rowcount
+            db.commit()
+        finally:
+            db.close()
+        total += deleted
+        if deleted and progress:
+            progress(deleted)
+        if deleted < batch:
+            return total
+        time.sleep(settings.purge_pause_ms / 1000)
+
+
+def _purge_groups(user_id: int, progress: Callable[[int], None]):
+    db = database.get_db()
+    try:
+        # Memberships: one short transaction per group
+        groups = [row[0] for row in db.execute("SELECT group_id FROM group_members WHERE user_id = ?", (user_id,))]
+        for group_id in groups:
+            cursor = db.cursor()
+            cursor.execute("DELETE FROM group_members WHERE group_id = ? AND user_id = ?", (group_id, user_id))
+            deleted = cursor.rowcount
+            leaderboards.remove_member(cursor, group_id, user_id)
+            db.commit()
+            progress(deleted + cursor.rowcount)
+        owned = [row[0] for row in db.execute("SELECT id FROM study_groups WHERE owner_id = ?", (user_id,))]
+    finally:
+        db.close()
+
+    for group_id in owned:
+        _purge_group(group_id, progress)
+
+
+def _purge_group(group_id: int, progress: Callable[[int], None]):
+    shard = database.GLOBAL_SHARD
+    # Members first: session writes only add scores for current members
+    delete_in_batches(shard, "group_members", "group_id = ?", (group_id,), progress)
+    delete_in_batches(shard, "leaderboard_scores", "group_id = ?", (group_id,), progress)
+    delete_in_batches(shard, "leaderboard_counts", "group_id = ?", (group_id,), progress)
+    delete_in_batches(shard, "study_groups", "id = ?", (group_id,), progress)
+
+
+def run_job(job: Dict) -> int:
+    """Deletes everything the job's user left behind; returns the rows deleted."""
+    job_id, user_id = job["id"], job["user_id"]
+    total = 0
+    step = None
+
+    def reporter(name):
+        nonlocal step
+        step = name
+
+        def progress(rows):
+            nonlocal total
+            total += rows
+            _record(job_id, rows, name)
+        return progress
+
+    try:
+        # Every shard, not just shard_for(user_id): an interrupted rebalance
+        # can leave rows on the old one, and an empty index probe is cheap
+        for shard in range(database.SHARD_COUNT):
+            for table in SHARD_STEPS:
+                delete_in_batches(shard, table, "user_id = ?", (user_id,), reporter(f"shard {shard} {table}"))
+        delete_in_batches(database.GLOBAL_SHARD, "habits", "user_id = ?", (user_id,), reporter("habits"))
+        _purge_groups(user_id, reporter("groups"))
+    except Exception as e:
+        _record(job_id, 0, step, status="failed", error=str(e))
+        raise
+    _record(job_id, 0, "done", status="done")
+    return total
+
+
+def run_pending() -> List[int]:
+    """Claims and runs jobs until the queue is empty; returns the finished job ids."""
+    finished = []
+    while True:
+        job = _claim()
+        if job is None:
+            return finished
+        try:
+            run_job(job)
+            finished.append(job["id"])
+        except Exception as e:
+            # Marked failed by run_job; retried after settings.purge_stale_s
+            print(f"Purge job {job['id']} failed: {e}", file=sys.stderr)
+
+
+_wake_event = threading.Event()
+_worker: Optional[threading.Thread] = None
+
+
+def wake():
+    """Start on new jobs now rather than at the next poll."""
+    _wake_event.set()
+
+
+def start_worker():
+    """Runs the queue on a daemon thread, polling every settings.purge_poll_s."""
+    global _worker
+    if _worker is not None or settings.purge_poll_s <= 0:
+        return
+
+    def loop():
+        while True:
+            _wake_event.clear()
+            try:
+                run_pending()
+            except Exception as e:
+                # e.g. the database was locked past the busy timeout; try again next poll
+                print(f"Purge worker: {e}", file=sys.stderr)
+            _wake_event.wait(settings.purge_poll_s)
+
+    _worker = threading.Thread(target=loop, name="purge-worker", daemon=True)
+    _worker.start()
+
+
+# ────────────────────────────────────────────────
+# Orphans
+# ────────────────────────────────────────────────
+# (shard, table, WHERE for orphaned rows, description), beyond per-user rows
+def _structural_checks() -> List[tuple]:
+    checks = []
+    for shard in range(database.SHARD_COUNT):
+        checks += [
+            (shard, "cards", "deck_id NOT IN (SELECT id FROM decks)", "cards without their deck"),
+            (shard, "card_reviews", "card_id NOT IN (SELECT id FROM cards)", "reviews without their card"),
+        ]
+    global_shard = database.GLOBAL_SHARD
+    checks += [
+        (global_shard, "group_members", "group_id NOT IN (SELECT id FROM study_groups)", "members of missing groups"),
+        (global_shard, "leaderboard_scores", "group_id NOT IN (SELECT id FROM study_groups)", "scores of missing groups"),
+        (global_shard, "leaderboard_counts", "group_id NOT IN (SELECT id FROM study_groups)", "rank counts of missing groups"),
+    ]
+    return checks
+
+
+def scan_orphans() -> Dict:
+    """Counts rows left behind by deleted users and parents, per shard and table."""
+    db = database.get_db()
+    try:
+        users = {row[0] for row in db.execute("SELECT id FROM users")}
+        pending = {row[0] for row in db.execute("SELECT user_id FROM purge_jobs WHERE status != 'done'")}
+    finally:
+        db.close()
+
+    missing_users: Dict[int, int] = {}
+    by_table: Dict[str, int] = {}
+    per_user = [(shard, table, "user_id") for shard in range(database.SHARD_COUNT) for table in SHARD_STEPS]
+    per_user += [(database.GLOBAL_SHARD, "habits", "user_id"), (database.GLOBAL_SHARD, "group_members", "user_id"),
+                 (database.GLOBAL_SHARD, "leaderboard_scores", "user_id"),
+                 (database.GLOBAL_SHARD, "study_groups", "owner_id")]
+    for shard, table, column in per_user:
+        db = database.get_db(shard=shard)
+        try:
+            rows = db.execute(f"SELECT {column}, COUNT(*) FROM {table} GROUP BY {column}").fetchall()
+        finally:
+            db.close()
+        for user_id, count in rows:
+            if user_id not in users and user_id not in pending:
+                missing_users[user_id] = missing_users.get(user_id, 0) + count
+                key = f"shard {shard} {table}"
+                by_table[key] = by_table.get(key, 0) + count
+
+    structural = []
+    for shard, table, where, description in _structural_checks():
+        db = database.get_db(shard=shard)
+        try:
+            count = db.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}").fetchone()[0]
+        finally:
+            db.close()
+        if count:
+            structural.append({"shard": shard, "table": table, "rows": count, "what": description})
+
+    return {
+        "missing_users": len(missing_users),
+        "missing_user_rows": sum(missing_users.values()),
+        "missing_user_ids": sorted(missing_users),
+        "by_table": by_table,
+        "structural": structural,
+    }
+
+
+def fix_orphans(report: Dict) -> Dict:
+    """Queues purges for the report's missing users, deletes the structural orphans and runs the queue."""
+    db = database.get_db()
+    try:
+        cursor = db.cursor()
+        for user_id in report["missing_user_ids"]:
+            enqueue(cursor, user_id)
+        db.commit()
+    finally:
+        db.close()
+
+    structural_rows = 0
+    for shard, table, where, _ in _structural_checks():
+        structural_rows += delete_in_batches(shard, table, where)
+    return {"jobs_run": len(run_pending()), "structural_rows_deleted": structural_rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Purge deleted users' rows in small batches")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("run")
+    commands.add_parser("status").add_argument("job_id", nargs="?", type=int)
+    commands.add_parser("orphans").add_argument("--fix", action="store_true",
+                                                help="purge the orphans found, then scan again")
+    args = parser.parse_args()
+    database.init_db()
+
+    if args.command == "run":
+        print(json.dumps({"finished": run_pending()}))
+    elif args.command == "status":
+        result = get_job(args.job_id) if args.job_id is not None else list_jobs()
+        print(json.dumps(result, indent=2))
+    elif args.command == "orphans":
+        report = scan_orphans()
+        if args.fix:
+            report = {"before": report, "fix": fix_orphans(report), "after": scan_orphans()}
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# quizzes.py
+#
+# Spaced-repetition engine for quiz cards (SM-2).
+#
+# Each card carries its own scheduling state (ease, interval, repetitions,
+# next_due). Due cards are read with a range scan on idx_cards_user_due, and
+# review results are applied in batches: one SELECT for the cards, one
+# executemany UPDATE and one executemany INSERT, all in a single transaction.
+# Each review also bumps the card's answer counters and last_reviewed, which
+# the practice sampler reads back into its weights on the next draw.
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from database import get_db
+
+MIN_EASE = 1.3
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def now_utc() -> datetime:
+    # Same clock and format as SQLite's datetime('now')
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def sm2(grade: int, ease: float, interval: int, repetitions: int) -> Tuple[float, int, int]:
+    """
+    One SM-2 step. grade is 0-5; 3 and up counts as a successful recall.
+    Returns the new (ease, interval in days, repetitions).
+    """
+    if grade >= 3:
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            interval = round(interval * ease)
+        repetitions += 1
+    else:
+        repetitions = 0
+        interval = 1
+
+    ease = ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02)
+    return max(MIN_EASE, ease), interval, repetitions
+
+
+def get_due_cards(user_id: int, limit: int = 20, deck_id: Optional[int] = None) -> List[Dict]:
+    now = now_utc().strftime(DATE_FORMAT)
+    db = get_db(user_id)
+    cursor = db.cursor()
+    if deck_id is None:
+        cursor.execute(
+            """
+            SELECT id, deck_id, front, back, ease, interval, repetitions, next_due
+            FROM cards
+            WHERE user_id = ? AND next_due <= ?
+            ORDER BY next_due
+            LIMIT ?
+            """,
+            (user_id, now, limit)
+        )
+    else:
+        cursor.execute(
+            """
+            SELECT id, deck_id, front, back, ease, interval, repetitions, next_due
+            FROM cards
+            WHERE deck_id = ? AND user_id = ? AND next_due <= ?
+            ORDER BY next_due
+            LIMIT ?
+            """,
+            (deck_id, user_id, now, limit)
+        )
+    rows = cursor.fetchall()
+    db.close()
+    return [dict(row) for row in rows]
+
+
+def record_reviews(user_id: int, reviews: List[Tuple[int, int]]) -> Optional[List[Dict]]:
+    """
+    Apply a batch of (card_id, grade) reviews for one user.
+    Returns the updated schedule per card, or None if any card is missing
+    or belongs to someone else (nothing is written in that case).
+    """
+    if not reviews:
+        return []
+
+    card_ids = list({card_id for card_id, _ in reviews})
+    db = get_db(user_id)
+    cursor = db.cursor()
+    try:
+        state = {}
+        counts = {}
+        # Chunked to stay under SQLite's bound-parameter limit
+        for i in range(0, len(card_ids), 500):
+            chunk = card_ids[i:i + 500]
+            cursor.execute(
+                f"""
+                SELECT id, ease, interval, repetitions, review_count, lapse_count
+                FROM cards
+                WHERE user_id = ? AND id IN ({', '.join('?' * len(chunk))})
+                """,
+                [user_id, *chunk]
+            )
+            for row in cursor.fetchall():
+                state[row["id"]] = (row["ease"], row["interval"], row["repetitions"])
+                counts[row["id"]] = (row["review_count"], row["lapse_count"])
+        if len(state) != len(card_ids):
+            return None
+
+        now = now_utc()
+        reviewed_at = now.strftime(DATE_FORMAT)
+        log = []
+        # Reviews are applied in order, so a card graded twice in one batch
+        # is scheduled from its intermediate state
+        for card_id, grade in reviews:
+            ease, interval, repetitions = sm2(grade, *state[card_id])
+            state[card_id] = (ease, interval, repetitions)
+            review_count, lapse_count = counts[card_id]
+            counts[card_id] = (review_count + 1, lapse_count + (grade < 3))
+            log.append((card_id, user_id, grade, reviewed_at))
+
+        updates = []
+        results = []
+        for card_id in card_ids:
+            ease, interval, repetitions = state[card_id]
+            review_count, lapse_count = counts[card_id]
+            next_due = (now + timedelta(days=interval)).strftime(DATE_FORMAT)
+            updates.append((ease, interval, repetitions, next_due, review_count, lapse_count, reviewed_at, card_id))
+            results.append({
+                "card_id": card_id,
+                "ease": round(ease, 2),
+                "interval": interval,
+                "repetitions": repetitions,
+                "next_due": next_due,
+            })
+
+        cursor.executemany(
+            """
+            UPDATE cards
+            SET ease = ?, interval = ?, repetitions = ?, next_due = ?,
+                review_count = ?, lapse_count = ?, last_reviewed = ?
+            WHERE id = ?
+            """,
+            updates
+        )
+        cursor.executemany(
+            "INSERT INTO card_reviews (card_id, user_id, grade, reviewed_at) VALUES (?, ?, ?, ?)",
+            log
+        )
+        db.commit()
+        return results
+    except sqlite3.Error:
+        db.rollback()
+        raise
+    finally:
+        db.close()
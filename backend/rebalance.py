@@ -0,0 +1,131 @@
+# rebalance.py
+#
+# Moves users onto the shard database.shard_for() assigns them, e.g. after
+# raising STUDY_SHARD_COUNT (or when first turning sharding on, where every
+# user starts on shard 0). With the jump hash, going from N to M > N shards
+# only moves users onto the new shards, about (M - N) / M of them.
+#
+# Each user is moved in one transaction over an ATTACHed destination:
+# every row gets a new id from the destination's id range, with card ->
+# deck and review -> card references remapped, and is then deleted from
+# the source. The search triggers on both files keep the FTS indexes in sync.
+#
+# Run it with the API stopped. In WAL mode the two files commit separately,
+# so a crash mid-commit can leave a user's rows on both shards.
+#
+#   STUDY_SHARD_COUNT=4 python rebalance.py --dry-run
+#   STUDY_SHARD_COUNT=4 python rebalance.py
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from database import ARCHIVE_TABLES, SHARD_COUNT, SHARDED_TABLES, init_db, shard_for, shard_path
+
+# Tables copied row-for-row; their ids (if any) are not referenced anywhere else
+PLAIN_TABLES = ["study_sessions", "goals", "user_data_versions"] + ARCHIVE_TABLES
+
+
+def existing_shards() -> List[int]:
+    """Configured shards plus any leftover files beyond them (after shrinking)."""
+    shards = list(range(SHARD_COUNT))
+    extra = SHARD_COUNT
+    while os.path.exists(shard_path(extra)):
+        shards.append(extra)
+        extra += 1
+    return shards
+
+
+def columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})") if row[1] != "id"]
+
+
+def users_on(conn: sqlite3.Connection) -> List[int]:
+    union = " UNION ".join(f"SELECT user_id FROM {table}" for table in SHARDED_TABLES + ARCHIVE_TABLES)
+    return [row[0] for row in conn.execute(f"SELECT user_id FROM ({union}) ORDER BY user_id")]
+
+
+def copy_remapped(conn: sqlite3.Connection, table: str, user_id: int,
+                  remap: Dict[str, Dict[int, int]]) -> Dict[int, int]:
+    """Copies one user's rows of `table` into dst.<table> with fresh ids."""
+    cols = columns(conn, table)
+    id_map: Dict[int, int] = {}
+    rows = conn.execute(f"SELECT id, {', '.join(cols)} FROM main.{table} WHERE user_id = ?", (user_id,)).fetchall()
+    insert = f"INSERT INTO dst.{table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+    for row in rows:
+        values = list(row[1:])
+        for i, col in enumerate(cols):
+            if col in remap:
+                values[i] = remap[col].get(values[i], values[i])
+        id_map[row[0]] = conn.execute(insert, values).lastrowid
+    return id_map
+
+
+def move_user(conn: sqlite3.Connection, user_id: int) -> int:
+    moved = 0
+    for table in PLAIN_TABLES:
+        cols = ", ".join(columns(conn, table))
+        moved += conn.execute(
+            f"INSERT INTO dst.{table} ({cols}) SELECT {cols} FROM main.{table} WHERE user_id = ?",
+            (user_id,)
+        ).rowcount
+
+    deck_ids = copy_remapped(conn, "decks", user_id, {})
+    card_ids = copy_remapped(conn, "cards", user_id, {"deck_id": deck_ids})
+    review_ids = copy_remapped(conn, "card_reviews", user_id, {"card_id": card_ids})
+    moved += len(deck_ids) + len(card_ids) + len(review_ids)
+
+    # Sampler banks hold the old card ids; the target shard rebuilds them
+    for table in ["card_reviews", "cards", "decks", "sampler_banks"] + PLAIN_TABLES:
+        conn.execute(f"DELETE FROM main.{table} WHERE user_id = ?", (user_id,))
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move users to the shard their id hashes to")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would move")
+    args = parser.parse_args()
+
+    init_db()  # creates missing shard files, id ranges and subject copies
+    started = time.perf_counter()
+    total_users = total_rows = 0
+
+    for source in existing_shards():
+        conn = sqlite3.connect(shard_path(source), isolation_level=None)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        by_target: Dict[int, List[int]] = defaultdict(list)
+        for user_id in users_on(conn):
+            target = shard_for(user_id)
+            if target != source:
+                by_target[target].append(user_id)
+
+        for target, user_ids in sorted(by_target.items()):
+            print(f"shard {source} -> {target}: {len(user_ids):,} users", file=sys.stderr)
+            if args.dry_run:
+                total_users += len(user_ids)
+                continue
+            conn.execute("ATTACH DATABASE ? AS dst", (shard_path(target),))
+            try:
+                for user_id in user_ids:
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        total_rows += move_user(conn, user_id)
+                        conn.execute("COMMIT")
+                    except sqlite3.Error:
+                        conn.execute("ROLLBACK")
+                        raise
+                    total_users += 1
+            finally:
+                conn.execute("DETACH DATABASE dst")
+        conn.close()
+
+    verb = "would move" if args.dry_run else "moved"
+    print(f"{verb} {total_users:,} users ({total_rows:,} rows) in {time.perf_counter() - started:.1f}s "
+          f"across {SHARD_COUNT} shards", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+# reminders.py
+#
+# Reminders for daily goals that are not done yet.
+#
+# A daily goal with remind_at ('HH:MM', server local time: the clock
+# mark-daily's last_done follows) is reminded once a day at that time,
+# unless it was already marked done that day. Nothing scans the goals
+# table: upcoming reminders sit in one min-heap of (due, seq, goal_id),
+# filled at startup from idx_goals_reminders, and the goal endpoints call
+# schedule() / cancel() after every create, edit, mark-done and delete.
+#
+#   - scheduling pushes an entry, O(log n); the goal's previous entry stays
+#     in the heap and is skipped when popped (its seq no longer matches),
+#     and the heap is rebuilt once stale entries outnumber live ones
+#   - firing pops the due entries, O(log n) each, and claims each reminder
+#     with one UPDATE by primary key that also checks the goal is still a
+#     daily goal due at that time and not done that day; a claimed reminder
+#     goes to the sink, then the goal is scheduled for the next day
+#   - at most settings.reminder_max_scheduled goals are held (the heap at
+#     most about twice that); further goals are refused, and counted in
+#     /metrics, until others go
+#
+# The claim sets reminded_on, so a goal is reminded at most once a day even
+# with several API processes (each holding every reminder) or a restart. A
+# reminder whose time passed while no process was running is not sent late;
+# the next day's is. A failed delivery is logged and not retried.
+#
+# Sinks (settings.reminder_sink): "log" (stderr), "file:<path>" (JSON
+# lines), "webhook:<url>" (POSTs the JSON; a stub for a local notification
+# service), or a name registered with register_sink().
+#
+#   python reminders.py list --limit 20     # next reminders due, from the index
+#   python reminders.py test                # one sample reminder through the configured sink
+import argparse
+import heapq
+import itertools
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import database
+import metrics
+from config import settings
+from database import get_db
+
+TIME_OF_DAY = re.compile(r"^([01]\d|2[0-3]):[0-5]\d$")
+RETRY_S = 60              # a reminder whose claim failed (e.g. database locked) is tried again
+MAX_WAIT_S = 60           # the worker re-reads the clock at least this often
+COMPACT_SLACK = 1024      # stale heap entries tolerated beyond the live ones
+WEBHOOK_TIMEOUT_S = 5
+
+
+def next_due(remind_at: str, last_done: Optional[str], now: Optional[float] = None) -> float:
+    """Epoch time of the goal's next reminder after `now`: today at remind_at, or tomorrow if done or past."""
+    if not TIME_OF_DAY.match(remind_at):
+        raise ValueError(f"remind_at must be HH:MM, got {remind_at!r}")
+    current = datetime.fromtimestamp(time.time() if now is None else now)
+    due = current.replace(hour=int(remind_at[:2]), minute=int(remind_at[3:]), second=0, microsecond=0)
+    if due <= current or last_done == due.date().isoformat():
+        due += timedelta(days=1)
+    return due.timestamp()
+
+
+# ────────────────────────────────────────────────
+# Sinks
+# ────────────────────────────────────────────────
+class LogSink:
+    def deliver(self, reminder: Dict):
+        print(f"Reminder for user {reminder['user_id']}: {reminder['title']!r} is not done yet today",
+              file=sys.stderr)
+
+
+class FileSink:
+    """Appends each reminder as a JSON line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def deliver(self, reminder: Dict):
+        line = json.dumps(reminder) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class WebhookSink:
+    """POSTs each reminder as JSON."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def deliver(self, reminder: Dict):
+        request = urllib.request.Request(self.url, data=json.dumps(reminder).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT_S):
+            pass
+
+
+_sink_factories: Dict[str, Callable[[str], object]] = {
+    "log": lambda target: LogSink(),
+    "file": FileSink,
+    "webhook": WebhookSink,
+}
+
+
+def register_sink(name: str, factory: Callable[[str], object]):
+    """settings.reminder_sink = "<name>[:<target>]" then delivers through factory(target).deliver(reminder)."""
+    _sink_factories[name] = factory
+
+
+def make_sink(spec: str):
+    name, _, target = spec.partition(":")
+    if name not in _sink_factories:
+        raise ValueError(f"Unknown reminder sink {name!r}; choose one of {sorted(_sink_factories)}")
+    if name in ("file", "webhook") and not target:
+        raise ValueError(f"The {name} reminder sink needs a target, e.g. {name}:<{'path' if name == 'file' else 'url'}>")
+    return _sink_factories[name](target)
+
+
+# ────────────────────────────────────────────────
+# Schedule
+# ────────────────────────────────────────────────
+class Reminder:
+    __slots__ = ("goal_id", "user_id", "remind_at", "due", "seq")
+
+    def __init__(self, goal_id: int, user_id: int, remind_at: str, due: float, seq: int):
+        self.goal_id = goal_id
+        self.user_id = user_id
+        self.remind_at = remind_at
+        self.due = due
+        self.seq = seq
+
+
+_heap: List[Tuple[float, int, int]] = []   # (due, seq, goal_id), stale entries included
+_entries: Dict[int, Reminder] = {}         # goal_id -> its live entry
+_by_user: Dict[int, Set[int]] = {}
+_seq = itertools.count()
+_cond = threading.Condition()
+_enabled = False
+_sink = None
+_worker: Optional[threading.Thread] = None
+
+
+def _push(goal_id: int, user_id: int, remind_at: str, due: float, replace: bool = True):
+    """Under _cond."""
+    if goal_id in _entries:
+        if not replace:
+            return
+    elif len(_entries) >= settings.reminder_max_scheduled:
+        metrics.registry.reminder("refused")
+        return
+    entry = _entries[goal_id] = Reminder(goal_id, user_id, remind_at, due, next(_seq))
+    _by_user.setdefault(user_id, set()).add(goal_id)
+    if not _heap or due < _heap[0][0]:
+        _cond.notify()
+    heapq.heappush(_heap, (due, entry.seq, goal_id))
+    if len(_heap) > 2 * len(_entries) + COMPACT_SLACK:
+        _heap[:] = [(e.due, e.seq, e.goal_id) for e in _entries.values()]
+        heapq.heapify(_heap)
+    metrics.registry.reminders_scheduled(len(_entries))
+
+
+def _remove(goal_id: int):
+    """Under _cond; the heap entry goes stale."""
+    entry = _entries.pop(goal_id, None)
+    if entry is None:
+        return
+    goals = _by_user.get(entry.user_id)
+    if goals is not None:
+        goals.discard(goal_id)
+        if not goals:
+            del _by_user[entry.user_id]
+    metrics.registry.reminders_scheduled(len(_entries))
+
+
+def schedule(user_id: int, goal_id: int, goal_type: str, remind_at: Optional[str], last_done: Optional[str]):
+    """After a goal was created, edited or marked done: its next reminder, or none."""
+    if not _enabled:
+        return
+    if goal_type != "daily" or not remind_at:
+        cancel(goal_id)
+        return
+    due = next_due(remind_at, last_done)
+    with _cond:
+        _push(goal_id, user_id, remind_at, due)
+
+
+def cancel(goal_id: int):
+    with _cond:
+        _remove(goal_id)
+
+
+def cancel_user(user_id: int):
+    """The user was deleted."""
+    with _cond:
+        for goal_id in list(_by_user.get(user_id, ())):
+            _remove(goal_id)
+
+
+def upcoming(limit: int) -> List[Dict]:
+    with _cond:
+        entries = heapq.nsmallest(limit, _entries.values(), key=lambda e: e.due)
+    return [{"goal_id": e.goal_id, "user_id": e.user_id, "remind_at": e.remind_at,
+             "due": datetime.fromtimestamp(e.due).isoformat(timespec="minutes")} for e in entries]
+
+
+def load() -> int:
+    """Schedules every daily goal with a reminder, shard by shard; returns how many are held."""
+    for shard in range(database.SHARD_COUNT):
+        db = get_db(shard=shard)
+        try:
+            rows = db.execute(
+                "SELECT id, user_id, remind_at, last_done FROM goals WHERE type = 'daily' AND remind_at IS NOT NULL"
+            ).fetchall()
+        finally:
+            db.close()
+        with _cond:
+            for row in rows:
+                try:
+                    due = next_due(row["remind_at"], row["last_done"])
+                except ValueError:
+                    continue  # written before remind_at was validated
+                # schedule() may already have seen a newer version of the goal
+                _push(row["id"], row["user_id"], row["remind_at"], due, replace=False)
+    with _cond:
+        return len(_entries)
+
+
+# ────────────────────────────────────────────────
+# Firing
+# ────────────────────────────────────────────────
+def _claim(entry: Reminder, day: str) -> Tuple[Optional[str], Optional[sqlite3.Row]]:
+    """(title, None) if this process is to send the reminder, else (None, the goal's current row or None)."""
+    db = get_db(entry.user_id)
+    try:
+        row = db.execute(
+            """
+            UPDATE goals SET reminded_on = ?
+            WHERE id = ? AND user_id = ? AND type = 'daily' AND remind_at = ?
+              AND (last_done IS NULL OR last_done <> ?)
+              AND (reminded_on IS NULL OR reminded_on <> ?)
+            RETURNING title
+            """,
+            (day, entry.goal_id, entry.user_id, entry.remind_at, day, day)
+        ).fetchone()
+        db.commit()
+        if row is not None:
+            return row["title"], None
+        goal = db.execute(
+            "SELECT type, remind_at, last_done FROM goals WHERE id = ? AND user_id = ?",
+            (entry.goal_id, entry.user_id)
+        ).fetchone()
+        return None, goal
+    finally:
+        db.close()
+
+
+def _fire(entry: Reminder):
+    day = datetime.fromtimestamp(entry.due).date().isoformat()
+    try:
+        title, goal = _claim(entry, day)
+    except sqlite3.Error as e:
+        print(f"Reminder for goal {entry.goal_id}: {e}", file=sys.stderr)
+        with _cond:
+            if _entries.get(entry.goal_id) is entry:
+                _push(entry.goal_id, entry.user_id, entry.remind_at, time.time() + RETRY_S)
+        return
+
+    if title is not None:
+        try:
+            _sink.deliver({"goal_id": entry.goal_id, "user_id": entry.user_id, "title": title,
+                           "remind_at": entry.remind_at, "day": day})
+            metrics.registry.reminder("sent")
+        except Exception as e:
+            metrics.registry.reminder("failed")
+            print(f"Reminder for goal {entry.goal_id} not delivered: {e}", file=sys.stderr)
+        remind_at, last_done = entry.remind_at, None
+    else:
+        # Done, already sent by another process, changed or gone
+        metrics.registry.reminder("skipped")
+        if goal is None or goal["type"] != "daily" or not goal["remind_at"]:
+            remind_at = None
+        else:
+            remind_at, last_done = goal["remind_at"], goal["last_done"]
+
+    with _cond:
+        if _entries.get(entry.goal_id) is not entry:
+            return  # rescheduled or cancelled meanwhile
+        if remind_at is None:
+            _remove(entry.goal_id)
+            return
+        try:
+            due = next_due(remind_at, last_done, now=max(time.time(), entry.due))
+        except ValueError:
+            _remove(entry.goal_id)
+            return
+        _push(entry.goal_id, entry.user_id, remind_at, due)
+
+
+def _run():
+    while True:
+        with _cond:
+            now = time.time()
+            while not _heap or _heap[0][0] > now:
+                _cond.wait(min(_heap[0][0] - now, MAX_WAIT_S) if _heap else MAX_WAIT_S)
+                now = time.time()
+            due = []
+            while _heap and _heap[0][0] <= now:
+                _, seq, goal_id = heapq.heappop(_heap)
+                entry = _entries.get(goal_id)
+                if entry is not None and entry.seq == seq:
+                    due.append(entry)
+        for entry in due:
+            try:
+                _fire(entry)
+            except Exception as e:
+                print(f"Reminder for goal {entry.goal_id}: {e}", file=sys.stderr)
+
+
+def start():
+    """Loads the reminders and starts the worker thread (API startup); no-op when disabled."""
+    global _enabled, _sink, _worker
+    if _worker is not None or settings.reminder_max_scheduled == 0:
+        return
+    _sink = make_sink(settings.reminder_sink)
+    _enabled = True  # from here on schedule() keeps up with writes made while loading
+    load()
+    _worker = threading.Thread(target=_run, name="reminder-worker", daemon=True)
+    _worker.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily goal reminders")
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_parser = commands.add_parser("list")
+    list_parser.add_argument("--limit", type=int, default=20)
+    commands.add_parser("test")
+    args = parser.parse_args()
+    database.init_db()
+
+    if args.command == "list":
+        held = load()
+        print(json.dumps({"scheduled": held, "next": upcoming(args.limit)}, indent=2))
+    elif args.command == "test":
+        make_sink(settings.reminder_sink).deliver({
+            "goal_id": 0, "user_id": 0, "title": "Test reminder", "remind_at": datetime.now().strftime("%H:%M"),
+            "day": datetime.now().date().isoformat(),
+        })
+        print(f"sent a test reminder through {settings.reminder_sink!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+# sampler.py
+#
+# Adaptive practice sampler: draws N cards of one subject for a user,
+# weighted toward cards they often get wrong and haven't seen lately.
+#
+# Weights for a (user, subject) bank live in a Fenwick tree, and a draw of
+# N cards is N O(log n) descents. Only the drawn cards are read back from
+# SQLite, so generation time does not grow with the size of the bank.
+#
+# A bank is the card ids in ascending order (a card's position is a binary
+# search) and their weights, two typed arrays that are also kept in
+# sampler_banks on the user's shard. A worker that has not cached a bank
+# loads it from there, a copy of the raw bytes plus a NumPy pass for the
+# tree, instead of reading and weighing every card; only a bank's very
+# first draw reads its cards on the request.
+#
+# Banks are shared state between API workers, so nothing is pushed to
+# other processes; every draw catches up instead:
+#   - answers (from any worker) are read back by cards.last_reviewed since
+#     the bank's last draw (idx_cards_user_reviewed) and applied as O(log n)
+#     weight updates
+#   - adding or removing cards bumps the user's card_version
+#     (database.bump_card_version); a bank built at an older one is
+#     rebuilt, and so is one older than CACHE_TTL_SECONDS, since untouched
+#     cards age into higher weights
+# Rebuilds read the whole bank (about 150 ms at 500k cards), so they run on
+# a background thread and are written back to sampler_banks; requests keep
+# drawing from the old tree (drawn cards that are gone are skipped) until
+# the new one is swapped in under the lock.
+import bisect
+import random
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config import settings
+from database import card_version, get_db
+from fenwick import FenwickTree, build_tree
+
+RECENCY_DAYS = 7.0        # a card is "fully stale" a week after its last answer
+MIN_RECENCY = 0.1         # weight factor right after answering
+CACHE_TTL_SECONDS = settings.sampler_cache_ttl_s  # rebuild (in the background) so untouched cards age into higher weights
+MAX_CACHED_BANKS = settings.sampler_cache_size
+SYNC_SLACK_SECONDS = 60   # answers are read back this far before the last draw, for commits that lag their timestamp
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def timestamp(seconds: float) -> str:
+    """A Unix time in cards.last_reviewed's format (UTC)."""
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime(DATE_FORMAT)
+
+
+def card_weights(review_count: np.ndarray, lapse_count: np.ndarray, age_days: np.ndarray) -> np.ndarray:
+    """Weights for cards by their answer counters; age_days is NaN for cards never answered."""
+    # Smoothed error rate: unseen cards start at 0.5
+    error_rate = (lapse_count + 1) / (review_count + 2)
+    recency = MIN_RECENCY + (1 - MIN_RECENCY) * np.clip(np.nan_to_num(age_days) / RECENCY_DAYS, 0.0, 1.0)
+    return np.where(np.isnan(age_days), error_rate, error_rate * recency)
+
+
+def _weigh(rows: List[Tuple]) -> Tuple[np.ndarray, np.ndarray]:
+    """(card ids, weights) for rows of (id, review_count, lapse_count, age in days or None)."""
+    # None becomes NaN; ids (below shard count * ID_RANGE) are exact in a float64
+    columns = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    return columns[:, 0].astype(np.int64), card_weights(columns[:, 1], columns[:, 2], columns[:, 3])
+
+
+class WeightedSampler:
+    """Weighted sampling without replacement over a fixed set of cards."""
+
+    def __init__(self, card_ids: array, weights: array, version: int = 0, built_at: Optional[float] = None):
+        self.card_ids = card_ids  # ascending
+        self.weights = weights
+        tree = array("d")
+        tree.frombytes(build_tree(np.frombuffer(weights, dtype=np.float64)).tobytes())
+        self.tree = FenwickTree.from_tree(tree)
+        self.version = version  # card_version the bank was built at
+        self.built_at = time.time() if built_at is None else built_at
+        self.synced_at = self.built_at - SYNC_SLACK_SECONDS  # answers before this are in the weights
+
+    def __len__(self):
+        return len(self.card_ids)
+
+    def position(self, card_id: int) -> Optional[int]:
+        i = bisect.bisect_left(self.card_ids, card_id)
+        return i if i < len(self.card_ids) and self.card_ids[i] == card_id else None
+
+    def update(self, card_id: int, weight: float) -> bool:
+        i = self.position(card_id)
+        if i is None:
+            return False
+        self.tree.add(i, weight - self.weights[i])
+        self.weights[i] = weight
+        return True
+
+    def sample(self, n: int, rng: random.Random) -> List[int]:
+        picked = []
+        seen = set()
+        attempts = 0
+        n = min(n, len(self.card_ids))
+        while len(picked) < n and attempts < 4 * n:
+            attempts += 1
+            total = self.tree.total()
+            if total <= 0:
+                break
+            i = self.tree.search(rng.random() * total)
+            # Float rounding can land on the edge of the tree or on a card
+            # that was already drawn (weight temporarily zeroed)
+            if i >= len(self.card_ids) or i in seen:
+                continue
+            seen.add(i)
+            picked.append(i)
+            self.tree.add(i, -self.weights[i])
+        for i in picked:
+            self.tree.add(i, self.weights[i])
+        return [self.card_ids[i] for i in picked]
+
+
+# ────────────────────────────────────────────────
+# Banks in SQLite
+# ────────────────────────────────────────────────
+def build_sampler(db, user_id: int, subject_id: int) -> WeightedSampler:
+    """Reads and weighs every card of the bank, on `db` (the user's shard)."""
+    built_at = time.time()
+    version = card_version(db, user_id)
+    rows = db.execute(
+        """
+        SELECT c.id, c.review_count, c.lapse_count, julianday(?) - julianday(c.last_reviewed)
+        FROM cards c
+        JOIN decks d ON d.id = c.deck_id
+        WHERE d.user_id = ? AND d.subject_id = ?
+        ORDER BY c.id
+        """,
+        (timestamp(built_at), user_id, subject_id)
+    ).fetchall()
+    card_ids, weights = _weigh(rows)
+    return WeightedSampler(array("q", card_ids.tobytes()), array("d", weights.tobytes()), version, built_at)
+
+
+def save_bank(db, user_id: int, subject_id: int, sampler: WeightedSampler):
+    """Stores the bank as built (answers since are read back by last_reviewed); keeps a newer one."""
+    db.execute(
+        """
+        INSERT INTO sampler_banks (user_id, subject_id, card_version, built_at, card_ids, weights)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, subject_id) DO UPDATE SET
+            card_version = excluded.card_version, built_at = excluded.built_at,
+            card_ids = excluded.card_ids, weights = excluded.weights
+        WHERE excluded.built_at > sampler_banks.built_at
+        """,
+        (user_id, subject_id, sampler.version, sampler.built_at,
+         sampler.card_ids.tobytes(), sampler.weights.tobytes())
+    )
+    db.commit()
+
+
+def load_bank(db, user_id: int, subject_id: int) -> Optional[WeightedSampler]:
+    row = db.execute(
+        "SELECT card_version, built_at, card_ids, weights FROM sampler_banks WHERE user_id = ? AND subject_id = ?",
+        (user_id, subject_id)
+    ).fetchone()
+    if row is None:
+        return None
+    card_ids, weights = array("q"), array("d")
+    card_ids.frombytes(row["card_ids"])
+    weights.frombytes(row["weights"])
+    return WeightedSampler(card_ids, weights, row["card_version"], row["built_at"])
+
+
+def _answers_since(db, user_id: int, subject_id: int, since: float, now: float) -> List[Tuple]:
+    return db.execute(
+        """
+        SELECT c.id, c.review_count, c.lapse_count, julianday(?) - julianday(c.last_reviewed)
+        FROM cards c
+        JOIN decks d ON d.id = c.deck_id
+        WHERE c.user_id = ? AND c.last_reviewed >= ? AND d.subject_id = ?
+        """,
+        (timestamp(now), user_id, timestamp(since), subject_id)
+    ).fetchall()
+
+
+# ────────────────────────────────────────────────
+# Per-(user, subject) sampler cache
+# ────────────────────────────────────────────────
+_samplers: "OrderedDict[Tuple[int, int], WeightedSampler]" = OrderedDict()
+_refreshes: Set[Tuple[int, int]] = set()  # banks being rebuilt
+_lock = threading.Lock()
+_rng = random.Random()
+
+
+def _cache(key: Tuple[int, int], sampler: WeightedSampler):
+    # under _lock
+    _samplers[key] = sampler
+    _samplers.move_to_end(key)
+    while len(_samplers) > MAX_CACHED_BANKS:
+        evicted, _ = _samplers.popitem(last=False)
+        _refreshes.discard(evicted)
+
+
+def _refresh(key: Tuple[int, int], stale: WeightedSampler):
+    """Rebuilds a stale bank off the request path and swaps it in."""
+    user_id, subject_id = key
+    db = get_db(user_id)
+    try:
+        # another worker may have rebuilt it already
+        sampler = load_bank(db, user_id, subject_id)
+        if (sampler is None or sampler.built_at <= stale.built_at
+                or sampler.version != card_version(db, user_id)
+                or time.time() - sampler.built_at >= CACHE_TTL_SECONDS):
+            sampler = build_sampler(db, user_id, subject_id)
+            save_bank(db, user_id, subject_id, sampler)
+    except Exception as e:
+        # the old tree stays in use; the next draw tries again
+        print(f"Sampler refresh of {key}: {e}", file=sys.stderr)
+        sampler = None
+    finally:
+        db.close()
+    with _lock:
+        _refreshes.discard(key)
+        # evicted meanwhile: drop the result
+        if sampler is not None and _samplers.get(key) is stale:
+            _samplers[key] = sampler
+
+
+def get_sampler(db, user_id: int, subject_id: int) -> WeightedSampler:
+    """The bank, loaded or (first draw only) built on `db`, with answers since its last draw applied."""
+    key = (user_id, subject_id)
+    with _lock:
+        sampler = _samplers.get(key)
+        if sampler:
+            _samplers.move_to_end(key)
+    if sampler is None:
+        sampler = load_bank(db, user_id, subject_id)
+        if sampler is None:
+            sampler = build_sampler(db, user_id, subject_id)
+            save_bank(db, user_id, subject_id, sampler)
+        with _lock:
+            _cache(key, sampler)
+
+    now = time.time()
+    card_ids, weights = _weigh(_answers_since(db, user_id, subject_id, sampler.synced_at, now))
+    stale = sampler.version != card_version(db, user_id) or now - sampler.built_at >= CACHE_TTL_SECONDS
+    with _lock:
+        for card_id, weight in zip(card_ids.tolist(), weights.tolist()):
+            sampler.update(int(card_id), weight)
+        sampler.synced_at = max(sampler.synced_at, now - SYNC_SLACK_SECONDS)
+        refresh = stale and key not in _refreshes and _samplers.get(key) is sampler
+        if refresh:
+            _refreshes.add(key)
+    if refresh:
+        threading.Thread(target=_refresh, args=(key, sampler), name="sampler-refresh", daemon=True).start()
+    return sampler
+
+
+def sample_cards(user_id: int, subject_id: int, n: int) -> List[Dict]:
+    db = get_db(user_id)
+    try:
+        sampler = get_sampler(db, user_id, subject_id)
+        with _lock:
+            card_ids = sampler.sample(n, _rng)
+        if not card_ids:
+            return []
+
+        cursor = db.cursor()
+        cursor.execute(
+            f"""
+            SELECT id, deck_id, front, back, ease, interval, repetitions, next_due
+            FROM cards
+            WHERE id IN ({', '.join('?' * len(card_ids))})
+            """,
+            card_ids
+        )
+        rows = {row["id"]: dict(row) for row in cursor.fetchall()}
+    finally:
+        db.close()
+    return [rows[card_id] for card_id in card_ids if card_id in rows]
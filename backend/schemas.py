@@ -69,6 +69,9 @@ class GoalCreate(BaseModel):
     progress: int = 0
     target_date: Optional[str] = None
     type: str = "milestone"  # "milestone" or "daily"
+    subject_id: Optional[int] = None  # link to a subject: progress follows its logged minutes
+    target_minutes: Optional[int] = None
+    remind_at: Optional[str] = None  # daily goals: 'HH:MM' to be reminded at if not done yet ("" clears it)
 
 class GoalOut(BaseModel):
     id: int
@@ -79,4 +82,196 @@ class GoalOut(BaseModel):
     target_date: Optional[str] = None
     type: str
     streak: int = 0
-    last_done: Optional[str] = None
\ No newline at end of file
+    last_done: Optional[str] = None
+    subject_id: Optional[int] = None
+    target_minutes: Optional[int] = None
+    logged_minutes: int = 0
+    remind_at: Optional[str] = None
+
+class GoalForecast(BaseModel):
+    goal_id: int
+    title: str
+    status: str  # done, on_track, at_risk, overdue, no_deadline or untracked
+    progress: int
+    target_date: Optional[str] = None
+    basis: Optional[str] = None  # subject (linked goal), overall (all study; remaining is estimated) or None
+    remaining_minutes: Optional[int] = None
+    pace: Optional[float] = None  # minutes/day on the goal's subject (or on all), fitted at today
+    trend: Optional[float] = None  # change in pace per day
+    required_pace: Optional[float] = None  # minutes/day needed to make the target date
+    estimated_completion: Optional[str] = None
+
+class PlanBlock(BaseModel):
+    goal_id: int
+    title: str
+    minutes: int
+
+class PlanDay(BaseModel):
+    date: str
+    blocks: List[PlanBlock]
+
+class PlanGoal(BaseModel):
+    goal_id: int
+    title: str
+    target_date: Optional[str] = None
+    remaining_minutes: int
+    finish_date: Optional[str] = None
+    on_track: bool
+
+class SubjectPace(BaseModel):
+    subject_id: int
+    minutes_per_day: float
+
+class StudyPlanOut(BaseModel):
+    start: str
+    daily_minutes: int
+    pace: List[SubjectPace]  # subjects with linked goals; those goals advance at it
+    goals: List[PlanGoal]
+    days: List[PlanDay]
+
+class SessionLengths(BaseModel):
+    mean: float
+    p50: float
+    p90: float
+    p99: float
+
+class SubjectTotal(BaseModel):
+    subject_id: int
+    minutes: int
+    sessions: int
+
+class DailyMinutes(BaseModel):
+    date: str
+    minutes: int
+    rolling_avg: float
+
+class WeeklyMinutes(BaseModel):
+    week_start: str
+    minutes: int
+
+class StudyStatsOut(BaseModel):
+    total_minutes: int
+    sessions: int
+    active_days: int
+    first_date: Optional[str] = None
+    last_date: Optional[str] = None
+    session_minutes: SessionLengths
+    subjects: List[SubjectTotal]
+    daily: List[DailyMinutes]
+    weekly: List[WeeklyMinutes]
+
+class DashboardOut(BaseModel):
+    subjects: List[Subject]
+    stats: StudyStatsOut
+    sessions: List[StudySessionOut]
+    goals: List[GoalOut]
+    goals_total: int
+
+class TimerStart(BaseModel):
+    subject_id: int
+    notes: Optional[str] = None
+
+class TimerOut(BaseModel):
+    subject_id: int
+    notes: Optional[str] = None
+    started_at: str
+    state: str
+    elapsed_seconds: int
+
+class TimerStopOut(BaseModel):
+    session_id: Optional[int] = None
+    duration: int
+    elapsed_seconds: int
+
+class DeckCreate(BaseModel):
+    subject_id: int
+    name: str
+
+class DeckOut(BaseModel):
+    id: int
+    subject_id: int
+    name: str
+    card_count: int = 0
+    due_count: int = 0
+
+class CardCreate(BaseModel):
+    front: str
+    back: str
+
+class CardOut(BaseModel):
+    id: int
+    deck_id: int
+    front: str
+    back: str
+    ease: float
+    interval: int
+    repetitions: int
+    next_due: str
+
+class CardReview(BaseModel):
+    card_id: int
+    grade: int  # 0-5, SM-2 scale
+
+class CardSchedule(BaseModel):
+    card_id: int
+    ease: float
+    interval: int
+    repetitions: int
+    next_due: str
+
+class SessionSearchHit(BaseModel):
+    id: int
+    subject_id: int
+    duration: int
+    session_date: str
+    snippet: Optional[str] = None
+    rank: float
+
+class GoalSearchHit(BaseModel):
+    id: int
+    type: Optional[str] = None
+    target_date: Optional[str] = None
+    title: str
+    rank: float
+
+class SearchResults(BaseModel):
+    sessions: List[SessionSearchHit]
+    goals: List[GoalSearchHit]
+
+class GroupCreate(BaseModel):
+    name: str
+
+class GroupOut(BaseModel):
+    id: int
+    name: str
+    owner_id: int
+    member_count: int = 0
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    username: Optional[str] = None
+    minutes: int
+
+class LeaderboardOut(BaseModel):
+    period: str
+    subject_id: int
+    top: List[LeaderboardEntry]
+    me: LeaderboardEntry
+
+class SlowQuery(BaseModel):
+    sql: str
+    count: int
+    total_ms: float
+    avg_ms: float
+    max_ms: float
+    params: Optional[str] = None
+    origin: Optional[str] = None
+    plan: Optional[List[str]] = None
+    flags: List[str] = []
+    first_seen: float
+    last_seen: Optional[float] = None
+
+class SlowQueryReport(BaseModel):
+    threshold_ms: float
+    statements: List[SlowQuery]
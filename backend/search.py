@@ -0,0 +1,252 @@
+# search.py
+#
+# Full-text search over study session notes and goal titles (SQLite FTS5).
+#
+# Both indexes are external-content FTS5 tables over small views, so the
+# text itself is stored only once. Each row is indexed with an `owner` token
+# ("u<user_id>") next to the text, which turns the per-user filter into part
+# of the index lookup instead of a post-filter over every user's matches.
+# Triggers on the base tables keep the indexes in sync. Session notes are
+# read from study_sessions and, for archived sessions, archived_notes
+# (archive.py), so a session stays searchable after it is archived.
+#
+#   python search.py rebuild     # re-index everything from the base tables
+#   python search.py optimize    # merge index b-trees after heavy writes
+import sqlite3
+import sys
+from typing import Dict, List
+
+import archive
+from database import SHARD_COUNT, get_db
+
+SEARCH_SCHEMA = [
+    # ── study session notes ───────────────────────
+    """
+    CREATE VIEW IF NOT EXISTS study_sessions_search_src AS
+    SELECT id, notes, 'u' || user_id AS owner FROM study_sessions
+    UNION ALL
+    SELECT id, notes, 'u' || user_id AS owner FROM archived_notes
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS study_sessions_fts USING fts5(
+        notes, owner,
+        content='study_sessions_search_src', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS study_sessions_fts_ai AFTER INSERT ON study_sessions BEGIN
+        INSERT INTO study_sessions_fts (rowid, notes, owner)
+        VALUES (new.id, new.notes, 'u' || new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS study_sessions_fts_ad AFTER DELETE ON study_sessions BEGIN
+        INSERT INTO study_sessions_fts (study_sessions_fts, rowid, notes, owner)
+        VALUES ('delete', old.id, old.notes, 'u' || old.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS study_sessions_fts_au AFTER UPDATE OF notes, user_id ON study_sessions BEGIN
+        INSERT INTO study_sessions_fts (study_sessions_fts, rowid, notes, owner)
+        VALUES ('delete', old.id, old.notes, 'u' || old.user_id);
+        INSERT INTO study_sessions_fts (rowid, notes, owner)
+        VALUES (new.id, new.notes, 'u' || new.user_id);
+    END
+    """,
+    # notes of archived sessions (archive.py), indexed under the same ids
+    """
+    CREATE TRIGGER IF NOT EXISTS archived_notes_fts_ai AFTER INSERT ON archived_notes BEGIN
+        INSERT INTO study_sessions_fts (rowid, notes, owner)
+        VALUES (new.id, new.notes, 'u' || new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS archived_notes_fts_ad AFTER DELETE ON archived_notes BEGIN
+        INSERT INTO study_sessions_fts (study_sessions_fts, rowid, notes, owner)
+        VALUES ('delete', old.id, old.notes, 'u' || old.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS archived_notes_fts_au AFTER UPDATE OF notes, user_id ON archived_notes BEGIN
+        INSERT INTO study_sessions_fts (study_sessions_fts, rowid, notes, owner)
+        VALUES ('delete', old.id, old.notes, 'u' || old.user_id);
+        INSERT INTO study_sessions_fts (rowid, notes, owner)
+        VALUES (new.id, new.notes, 'u' || new.user_id);
+    END
+    """,
+    # ── goal titles ───────────────────────────────
+    """
+    CREATE VIEW IF NOT EXISTS goals_search_src AS
+    SELECT id, title, 'u' || user_id AS owner FROM goals
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS goals_fts USING fts5(
+        title, owner,
+        content='goals_search_src', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS goals_fts_ai AFTER INSERT ON goals BEGIN
+        INSERT INTO goals_fts (rowid, title, owner)
+        VALUES (new.id, new.title, 'u' || new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS goals_fts_ad AFTER DELETE ON goals BEGIN
+        INSERT INTO goals_fts (goals_fts, rowid, title, owner)
+        VALUES ('delete', old.id, old.title, 'u' || old.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS goals_fts_au AFTER UPDATE OF title, user_id ON goals BEGIN
+        INSERT INTO goals_fts (goals_fts, rowid, title, owner)
+        VALUES ('delete', old.id, old.title, 'u' || old.user_id);
+        INSERT INTO goals_fts (rowid, title, owner)
+        VALUES (new.id, new.title, 'u' || new.user_id);
+    END
+    """,
+]
+
+FTS_TABLES = ["study_sessions_fts", "goals_fts"]
+
+available = False
+
+
+def init_search():
+    """
+    Creates the FTS indexes and their triggers on every shard if they don't
+    exist, and builds them from existing rows the first time. Safe to call
+    multiple times.
+    """
+    global available
+    available = all([_init_shard(shard) for shard in range(SHARD_COUNT)])
+
+
+def _init_shard(shard: int) -> bool:
+    conn = get_db(shard=shard)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (?, ?)",
+            FTS_TABLES
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        # Views from before archived notes were searchable are recreated
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = 'study_sessions_search_src'")
+        view = cursor.fetchone()
+        if view and "archived_notes" not in view[0]:
+            cursor.execute("DROP VIEW study_sessions_search_src")
+
+        for statement in SEARCH_SCHEMA:
+            cursor.execute(statement)
+
+        for table in FTS_TABLES:
+            if table not in existing:
+                cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+                print(f"Built search index {table}")
+
+        conn.commit()
+        return True
+    except sqlite3.OperationalError as e:
+        # FTS5 is compiled into nearly every SQLite build, but not all of them
+        conn.rollback()
+        print(f"Full-text search disabled: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def build_match(query: str, prefix: bool = False) -> str:
+    """
+    Turns free user input into a safe FTS5 expression: every word is quoted
+    (so operators and punctuation are literal), words ending in * or all
+    words when `prefix` is set become prefix queries.
+    """
+    terms = []
+    for word in query.split():
+        is_prefix = prefix or word.endswith("*")
+        word = word.strip('*"')
+        if not word:
+            continue
+        # Inside an FTS5 string a quote is written twice
+        terms.append('"' + word.replace('"', '""') + '"' + ("*" if is_prefix else ""))
+    return " ".join(terms)
+
+
+def search(user_id: int, query: str, limit: int = 20, prefix: bool = False) -> Dict[str, List[Dict]]:
+    match = build_match(query, prefix)
+    if not match:
+        return {"sessions": [], "goals": []}
+    owner = f'"u{user_id}"'
+
+    db = get_db(user_id)
+    cursor = db.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT study_sessions_fts.rowid AS id, s.subject_id, s.duration, s.session_date,
+                   snippet(study_sessions_fts, 0, '**', '**', '…', 16) AS snippet,
+                   bm25(study_sessions_fts, 1.0, 0.0) AS rank
+            FROM study_sessions_fts
+            LEFT JOIN study_sessions s ON s.id = study_sessions_fts.rowid
+            WHERE study_sessions_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (f"owner : {owner} AND notes : ({match})", limit)
+        )
+        sessions = [dict(row) for row in cursor.fetchall()]
+        # Matches not in the hot table are archived sessions' notes
+        for session in sessions:
+            if session["subject_id"] is None:
+                archived = archive.archived_session(cursor, user_id, session["id"]) or {}
+                session.update({name: archived.get(name) for name in ("subject_id", "duration", "session_date")})
+
+        cursor.execute(
+            """
+            SELECT g.id, g.type, g.target_date,
+                   highlight(goals_fts, 0, '**', '**') AS title,
+                   bm25(goals_fts, 1.0, 0.0) AS rank
+            FROM goals_fts
+            JOIN goals g ON g.id = goals_fts.rowid
+            WHERE goals_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (f"owner : {owner} AND title : ({match})", limit)
+        )
+        goals = [dict(row) for row in cursor.fetchall()]
+    finally:
+        db.close()
+    return {"sessions": sessions, "goals": goals}
+
+
+def rebuild():
+    for shard in range(SHARD_COUNT):
+        db = get_db(shard=shard)
+        for table in FTS_TABLES:
+            db.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+            print(f"Rebuilt {table} (shard {shard})")
+        db.commit()
+        db.close()
+
+
+def optimize():
+    for shard in range(SHARD_COUNT):
+        db = get_db(shard=shard)
+        for table in FTS_TABLES:
+            db.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+            print(f"Optimized {table} (shard {shard})")
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    commands = {"rebuild": rebuild, "optimize": optimize}
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        print("Usage: python search.py rebuild|optimize")
+        sys.exit(1)
+    init_search()
+    commands[sys.argv[1]]()
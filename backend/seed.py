@@ -0,0 +1,283 @@
+# seed.py
+#
+# Synthetic data generator for benchmarks and index work.
+#
+# Builds on add.py's subject list and fills the configured database
+# (STUDY_DB_PATH, default study.db) with users, study sessions (per-subject
+# log-normal durations, heavy-tailed activity per user), milestone goals
+# and daily goals with consistent streaks. Sessions and goals go straight to
+# their user's shard when STUDY_SHARD_COUNT > 1.
+# Output is fully determined by --seed and --end-date, apart from the salt
+# of the password hash: every user's password is "password", hashed once
+# (auth.py) and stored on all rows, since one scrypt per row would dominate
+# the load.
+#
+# Rows go in through executemany in large transactions with temporary fast
+# pragmas (no fsync, in-memory journal, big page cache). The FTS sync
+# triggers are dropped for the load and the search indexes are rebuilt once
+# at the end, which is far cheaper than updating them row by row.
+#
+#   python seed.py --users 1000000 --sessions-per-user 30 --seed 7
+import argparse
+import math
+import random
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Tuple
+
+import auth
+import search
+from add import subjects
+from config import settings
+from database import GLOBAL_SHARD, SHARD_COUNT, close_pools, get_db, init_db, replicate_subjects, shard_for, shard_path
+
+
+# Median session length (minutes) per subject; anything else uses DEFAULT
+SUBJECT_MEDIAN_MINUTES = {
+    "Mathematics": 50,
+    "Programming": 75,
+    "Art": 60,
+    "Music": 35,
+    "Philosophy": 40,
+    "Economics": 45,
+    "Psychology": 40,
+    "Sociology": 35,
+    "Biology": 45,
+    "Physics": 55,
+    "Geography": 30,
+    "English": 30,
+    "History": 40,
+    "Chemistry": 50,
+    "Literature": 45,
+    "Computer Science": 70,
+}
+DEFAULT_MEDIAN_MINUTES = 40
+DURATION_SIGMA = 0.5
+
+NOTE_WORDS = [
+    "reviewed", "practiced", "read", "summarized", "exercises", "chapter",
+    "lecture", "problems", "flashcards", "essay", "lab", "notes", "revision",
+    "exam", "project", "derivatives", "proofs", "recursion", "grammar",
+    "vocabulary", "experiments", "sources", "timeline", "theory",
+]
+GOAL_TITLES = [
+    "Finish the {} course", "Pass the {} exam", "Complete {} project",
+    "Read two {} books", "Catch up on {} lectures",
+]
+DAILY_TITLES = [
+    "Study 30 minutes", "Review flashcards", "Read one chapter",
+    "Practice problems", "Write a summary",
+]
+CATEGORIES = ["Study", "Health", "Productivity", "Other"]
+
+FAST_PRAGMAS = [
+    "PRAGMA synchronous = OFF",
+    "PRAGMA journal_mode = MEMORY",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",  # 256 MiB
+    "PRAGMA locking_mode = EXCLUSIVE",
+]
+# synchronous, temp_store and cache_size are per-connection and end with it;
+# journal_mode and locking_mode are restored explicitly
+FTS_TRIGGERS = [
+    "study_sessions_fts_ai", "study_sessions_fts_ad", "study_sessions_fts_au",
+    "goals_fts_ai", "goals_fts_ad", "goals_fts_au",
+]
+
+FMT = "%Y-%m-%d %H:%M:%S"
+
+
+class Progress:
+    def __init__(self, label: str, total: int, every: int):
+        self.label = label
+        self.total = total
+        self.every = every
+        self.count = 0
+        self.next_report = every
+        self.start = time.perf_counter()
+
+    def add(self, n: int):
+        self.count += n
+        if self.count >= self.next_report or self.count >= self.total:
+            elapsed = time.perf_counter() - self.start
+            rate = self.count / elapsed if elapsed else 0
+            pct = 100 * self.count / self.total if self.total else 100
+            print(f"  {self.label}: {self.count:,} rows ({pct:5.1f}%), {rate:,.0f} rows/s", file=sys.stderr)
+            self.next_report += self.every
+
+
+def chunks(rows: Iterator[Tuple], size: int) -> Iterator[List[Tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bulk_insert(conns: List[sqlite3.Connection], sql: str, rows: Iterator[Tuple], batch: int,
+                progress: Progress, by_user: bool = True):
+    """Inserts rows in batches; with by_user, each row goes to the shard of its user_id (column 0)."""
+    for block in chunks(rows, batch):
+        per_shard: Dict[int, List[Tuple]] = defaultdict(list)
+        for row in block:
+            per_shard[shard_for(row[0]) if by_user else GLOBAL_SHARD].append(row)
+        for shard, shard_rows in per_shard.items():
+            conns[shard].execute("BEGIN")
+            conns[shard].executemany(sql, shard_rows)
+            conns[shard].execute("COMMIT")
+        progress.add(len(block))
+
+
+# ────────────────────────────────────────────────
+# Row generators
+# ────────────────────────────────────────────────
+def user_rows(rng: random.Random, first_id: int, count: int, now: datetime, password: str) -> Iterator[Tuple]:
+    for user_id in range(first_id, first_id + count):
+        created = now - timedelta(days=rng.randint(0, 730), seconds=rng.randint(0, 86399))
+        yield (user_id, f"user{user_id}", f"user{user_id}@example.com", password, created.strftime(FMT))
+
+
+def session_rows(rng: random.Random, first_user: int, count: int, mean_sessions: float,
+                 days: int, subject_ids: Dict[int, float], now: datetime) -> Iterator[Tuple]:
+    ids = list(subject_ids)
+    for user_id in range(first_user, first_user + count):
+        # Heavy-tailed activity: most users log a little, a few log a lot
+        n = int(rng.paretovariate(2.0) * mean_sessions / 2)
+        if n == 0:
+            continue
+        favourites = rng.sample(ids, k=min(len(ids), rng.randint(2, 5)))
+        weights = [rng.random() + 0.2 for _ in favourites]
+        for _ in range(n):
+            subject_id = rng.choices(favourites, weights)[0]
+            duration = max(5, int(rng.lognormvariate(math.log(subject_ids[subject_id]), DURATION_SIGMA)))
+            # Recent days are busier than old ones
+            age = int(days * rng.random() ** 1.5)
+            when = now - timedelta(days=age, seconds=rng.randint(0, 86399))
+            notes = " ".join(rng.sample(NOTE_WORDS, rng.randint(3, 8))) if rng.random() < 0.35 else None
+            yield (user_id, subject_id, duration, notes, when.strftime(FMT))
+
+
+def goal_rows(rng: random.Random, first_user: int, count: int, subject_names: List[str], now: datetime) -> Iterator[Tuple]:
+    today = now.date()
+    for user_id in range(first_user, first_user + count):
+        for _ in range(rng.choice([0, 1, 1, 2, 3, 4])):
+            title = rng.choice(GOAL_TITLES).format(rng.choice(subject_names))
+            target = today + timedelta(days=rng.randint(-60, 240)) if rng.random() < 0.8 else None
+            yield (user_id, title, "Study", rng.randint(0, 100),
+                   target.isoformat() if target else None, "milestone", 0, None)
+        for _ in range(rng.choice([0, 0, 1, 1, 2, 3])):
+            # Streak and last_done must agree: a live streak ends today or yesterday
+            streak = int(rng.expovariate(1 / 6))
+            if streak == 0:
+                last_done = None
+            elif rng.random() < 0.7:
+                last_done = (today - timedelta(days=rng.randint(0, 1))).isoformat()
+            else:
+                last_done = (today - timedelta(days=rng.randint(2, 30))).isoformat()
+            yield (user_id, rng.choice(DAILY_TITLES), rng.choice(CATEGORIES), 0, None,
+                   "daily", streak, last_done)
+
+
+# ────────────────────────────────────────────────
+# Main
+# ────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic study.db dataset")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--sessions-per-user", type=float, default=40, help="mean sessions per user")
+    parser.add_argument("--days", type=int, default=365, help="history length")
+    parser.add_argument("--end-date", help="last day of generated history, YYYY-MM-DD (default: today)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch", type=int, default=settings.bulk_batch_rows, help="rows per transaction")
+    parser.add_argument("--progress-every", type=int, default=500_000)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    end = date.fromisoformat(args.end_date) if args.end_date else datetime.now(timezone.utc).date()
+    now = datetime.combine(end, datetime.min.time()) + timedelta(hours=23, minutes=59)
+    started = time.perf_counter()
+
+    init_db()
+    search.init_search()
+
+    db = get_db()
+    db.executemany("INSERT OR IGNORE INTO subjects (name) VALUES (?)", [(s,) for s in subjects])
+    db.commit()
+    subject_ids = {
+        row[0]: SUBJECT_MEDIAN_MINUTES.get(row[1], DEFAULT_MEDIAN_MINUTES)
+        for row in db.execute("SELECT id, name FROM subjects")
+    }
+    db.close()
+    replicate_subjects()
+    close_pools()
+
+    # One connection per shard; users go to the global shard, sessions and
+    # goals to their user's shard
+    conns = [sqlite3.connect(shard_path(shard), isolation_level=None) for shard in range(SHARD_COUNT)]
+    previous_journal = [conn.execute("PRAGMA journal_mode").fetchone()[0] for conn in conns]
+    for conn in conns:
+        for pragma in FAST_PRAGMAS:
+            conn.execute(pragma)
+    try:
+        for conn in conns:
+            for trigger in FTS_TRIGGERS:
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+        first_user = (conns[GLOBAL_SHARD].execute("SELECT MAX(id) FROM users").fetchone()[0] or 0) + 1
+        expected_sessions = int(args.users * args.sessions_per_user)
+        expected_goals = int(args.users * 3)
+
+        print(f"Seeding {args.users:,} users from id {first_user} over {SHARD_COUNT} shard(s) (seed {args.seed})",
+              file=sys.stderr)
+        bulk_insert(
+            conns,
+            "INSERT INTO users (id, username, email, password, created_at) VALUES (?, ?, ?, ?, ?)",
+            user_rows(random.Random(rng.random()), first_user, args.users, now, auth.hash_password("password")),
+            args.batch,
+            Progress("users", args.users, args.progress_every),
+            by_user=False,
+        )
+        bulk_insert(
+            conns,
+            "INSERT INTO study_sessions (user_id, subject_id, duration, notes, session_date) VALUES (?, ?, ?, ?, ?)",
+            session_rows(random.Random(rng.random()), first_user, args.users, args.sessions_per_user,
+                         args.days, subject_ids, now),
+            args.batch,
+            Progress("sessions", expected_sessions, args.progress_every),
+        )
+        bulk_insert(
+            conns,
+            """
+            INSERT INTO goals (user_id, title, category, progress, target_date, type, streak, last_done)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            goal_rows(random.Random(rng.random()), first_user, args.users, subjects, now),
+            args.batch,
+            Progress("goals", expected_goals, args.progress_every),
+        )
+    finally:
+        try:
+            for conn, journal in zip(conns, previous_journal):
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")  # a batch failed midway
+                conn.execute("PRAGMA locking_mode = NORMAL")
+                conn.execute(f"PRAGMA journal_mode = {journal}")
+                conn.close()
+        finally:
+            # Also after a failed load: put the triggers back and index the
+            # rows that did get in, so search matches the tables either way
+            print("Rebuilding search indexes and triggers", file=sys.stderr)
+            search.init_search()
+            search.rebuild()
+
+    print(f"Done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
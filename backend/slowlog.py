@@ -0,0 +1,161 @@
+# slowlog.py
+#
+# Slow-query detector for the instrumented connection in metrics.py.
+#
+# Any statement that runs longer than slow_query_ms (lock waits excluded) is
+# recorded under its normalized SQL: count, total / max time, the shape of
+# its parameters, where it was issued from, and its EXPLAIN QUERY PLAN,
+# captured once per normalized statement on the same connection. Plans are
+# flagged when they
+#   - SCAN a table holding at least slow_query_large_table_rows rows (no usable index)
+#   - USE TEMP B-TREE FOR ORDER BY / GROUP BY / DISTINCT (sort at query time)
+# The report is per process, like the rest of /metrics.
+#
+#   STUDY_SLOW_QUERY_MS=50 uvicorn main:app     # then GET /admin/slow-queries
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from config import settings
+
+SLOW_QUERY_MS = settings.slow_query_ms
+LARGE_TABLE_ROWS = settings.slow_query_large_table_rows
+MAX_STATEMENTS = 500
+TABLE_SIZE_TTL = 300  # seconds between row-count estimates per table
+
+threshold = SLOW_QUERY_MS / 1000
+
+_WS = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SCAN = re.compile(r"^SCAN (\w+)(.*)$")
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+_lock = threading.Lock()
+_entries: Dict[str, Dict] = {}
+_table_rows: Dict[str, tuple] = {}  # table -> (estimated rows, checked at)
+_own_files = {os.path.abspath(__file__)}
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and variable-length IN (?, ?, ...) lists."""
+    return _IN_LIST.sub("(?, ...)", _WS.sub(" ", sql).strip())
+
+
+def params_shape(parameters, many: bool = False) -> str:
+    """Types of the bound values, never the values themselves: '(int, str)'."""
+    if many:
+        rows = parameters if isinstance(parameters, (list, tuple)) else []
+        first = params_shape(rows[0]) if rows else "()"
+        return f"{len(rows)} x {first}" if rows else "0 x ()"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    return "(" + ", ".join(type(v).__name__ for v in parameters) + ")"
+
+
+def _origin() -> str:
+    """First caller frame outside the DB layer, e.g. 'main.py:212 get_sessions'."""
+    frame = sys._getframe(2)
+    skip = _own_files | {os.path.abspath(os.path.join(os.path.dirname(__file__), "metrics.py"))}
+    while frame is not None and os.path.abspath(frame.f_code.co_filename) in skip:
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+def _estimated_rows(conn: sqlite3.Connection, table: str) -> int:
+    """MAX(rowid) is a single b-tree seek and a good enough size estimate."""
+    cached = _table_rows.get(table)
+    now = time.monotonic()
+    if cached and now - cached[1] < TABLE_SIZE_TTL:
+        return cached[0]
+    try:
+        row = sqlite3.Connection.execute(conn, f'SELECT MAX(rowid) FROM "{table}"').fetchone()
+        rows = row[0] or 0
+    except sqlite3.Error:
+        rows = 0  # views, WITHOUT ROWID tables, CTE names
+    _table_rows[table] = (rows, now)
+    return rows
+
+
+def explain(conn: sqlite3.Connection, sql: str, parameters) -> List[str]:
+    """EXPLAIN QUERY PLAN lines, bypassing the instrumented cursor."""
+    rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+    return [row[3] for row in rows]
+
+
+def plan_flags(conn: sqlite3.Connection, plan: List[str]) -> List[str]:
+    flags = []
+    for line in plan:
+        scan = _SCAN.match(line)
+        if scan and "VIRTUAL TABLE" not in scan.group(2):
+            table = scan.group(1)
+            rows = _estimated_rows(conn, table)
+            if rows >= LARGE_TABLE_ROWS:
+                flags.append(f"full scan of {table} (~{rows:,} rows)")
+        if line.startswith("USE TEMP B-TREE FOR"):
+            flags.append(line.replace("USE ", "", 1).lower())
+    return flags
+
+
+def record(conn: sqlite3.Connection, sql: str, parameters, seconds: float, many: bool = False):
+    """Called by the instrumented cursor for statements slower than `threshold`."""
+    key = normalize_sql(sql)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            if len(_entries) >= MAX_STATEMENTS:
+                return
+            entry = _entries[key] = {
+                "sql": key,
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "params": None,
+                "origin": None,
+                "plan": None,
+                "flags": [],
+                "first_seen": time.time(),
+                "last_seen": None,
+            }
+        entry["count"] += 1
+        entry["total_ms"] += seconds * 1000
+        entry["max_ms"] = max(entry["max_ms"], seconds * 1000)
+        entry["last_seen"] = time.time()
+        entry["params"] = params_shape(parameters, many)
+        entry["origin"] = _origin()
+        needs_plan = entry["plan"] is None
+
+    if not needs_plan or not key.upper().startswith(_EXPLAINABLE):
+        return
+    if many:
+        parameters = parameters[0] if parameters else ()
+    try:
+        plan = explain(conn, sql, parameters)
+        flags = plan_flags(conn, plan)
+    except sqlite3.Error as e:
+        plan, flags = [f"EXPLAIN failed: {e}"], []
+    with _lock:
+        entry["plan"] = plan
+        entry["flags"] = flags
+
+
+def report(flagged_only: bool = False, sort: str = "total_ms", limit: int = 50) -> List[Dict]:
+    with _lock:
+        rows = [dict(entry) for entry in _entries.values()]
+    if flagged_only:
+        rows = [row for row in rows if row["flags"]]
+    for row in rows:
+        row["avg_ms"] = row["total_ms"] / row["count"]
+    rows.sort(key=lambda row: row[sort], reverse=True)
+    return rows[:limit]
+
+
+def reset():
+    with _lock:
+        _entries.clear()
+        _table_rows.clear()
@@ -0,0 +1,755 @@
+# storage.py
+#
+# Storage interface behind the users, subjects, study-session and goal
+# endpoints, with two implementations of the same contract:
+#
+#   SQLiteStorage   the study.db shards, through database.get_db (default)
+#   MemoryStorage   plain dicts behind one lock; nothing touches the disk
+#
+# The contract (checked for both by storage_conformance.py):
+#   - ids are positive, unique per table and never reused
+#   - username, email and subject name are unique (case-sensitive);
+#     violations raise Conflict and leave nothing behind
+#   - per-user rows are only visible to their owner: another user's row
+#     raises Forbidden, or NotFound when it lives on another shard
+#   - sessions list newest first (session_date, then id, descending),
+#     archived ones included (SQLiteStorage, see archive.py), which are
+#     read, edited and deleted by id like the others;
+#     goals list by type, then target_date descending (no date last), then id
+#   - list methods given `fields` return only those columns, in the
+#     order of SUBJECT_COLUMNS / SESSION_COLUMNS / GOAL_COLUMNS; an unknown
+#     field raises ValueError
+#   - a deleted user can no longer be found; SQLiteStorage removes their
+#     rows afterwards in small batches (purge.py), MemoryStorage at once
+#   - timestamps are UTC 'YYYY-MM-DD HH:MM:SS', like SQLite's datetime('now')
+#   - a goal linked to a subject and target_minutes counts the minutes of
+#     that subject's sessions dated from when it was linked (logged_minutes,
+#     adjusted by every session write) and its progress is derived from them;
+#     linking it to another subject starts the count again
+#   - data_version(user_id) grows with every write to the user's sessions
+#     or goals, in whichever process it happened; caches built from them
+#     compare it on read
+#
+# Decks, quizzes, search and groups still talk to SQLite directly; session
+# writes on SQLiteStorage also keep the group leaderboards up to date, once
+# the session's own transaction has committed.
+#
+#   STUDY_STORAGE_BACKEND=memory uvicorn main:app
+import itertools
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import archive
+import goal_progress
+import leaderboards
+import purge
+from config import settings
+from database import bump_data_version, data_version, get_db, replicate_subjects
+
+GOAL_FIELDS = ("title", "category", "progress", "target_date", "streak", "last_done", "subject_id", "target_minutes",
+               "remind_at")
+SESSION_FIELDS = ("subject_id", "duration", "notes")
+
+# What the list methods return, in order; `fields` picks a subset of these
+SUBJECT_COLUMNS = ("id", "name")
+SESSION_COLUMNS = ("id", "user_id", "subject_id", "duration", "notes", "session_date")
+# Day number of a session_date, days since 1970-01-01 (julianday starts at noon; CAST truncates the time)
+DAY_SQL = "CAST(julianday(session_date) - 2440587.5 AS INTEGER)"
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+GOAL_COLUMNS = ("id", "user_id", "title", "category", "progress", "target_date", "type", "streak", "last_done",
+                "subject_id", "target_minutes", "logged_minutes", "linked_since", "remind_at")
+
+
+class StorageError(Exception):
+    pass
+
+
+class NotFound(StorageError):
+    pass
+
+
+class Forbidden(StorageError):
+    pass
+
+
+class Conflict(StorageError):
+    pass
+
+
+def _check_fields(changes: Dict, allowed) -> None:
+    unknown = set(changes) - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+
+def _columns(fields: Optional[Sequence[str]], columns: Tuple[str, ...]) -> Tuple[str, ...]:
+    """The requested columns in `columns` order (all of them for None); ValueError for unknown ones."""
+    if fields is None:
+        return columns
+    _check_fields(dict.fromkeys(fields), columns)
+    return tuple(c for c in columns if c in fields)
+
+
+def _project(rows: List[Dict], columns: Tuple[str, ...]) -> List[Dict]:
+    return [{c: row[c] for c in columns} for row in rows]
+
+
+def _day_number(session_date: str) -> int:
+    return date.fromisoformat(session_date[:10]).toordinal() - EPOCH_ORDINAL
+
+
+class Storage(ABC):
+    # ── users ───────────────────────────────────────
+    @abstractmethod
+    def create_user(self, username: str, email: str, password: str) -> Dict:
+        """Returns {id, username, email}; Conflict if username or email is taken."""
+
+    @abstractmethod
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        """{id, username, email} or None."""
+
+    @abstractmethod
+    def get_user_by_username(self, username: str) -> Optional[Dict]:
+        """{id, username, password} or None."""
+
+    @abstractmethod
+    def set_password(self, user_id: int, password: str) -> None:
+        """Replaces the stored password (hash); NotFound if there is no such user."""
+
+    @abstractmethod
+    def delete_user(self, user_id: int) -> Optional[int]:
+        """
+        The user is gone at once (NotFound if there is no such user); their
+        rows may be removed later. Returns the purge job doing that, or None.
+        """
+
+    # ── subjects ────────────────────────────────────
+    @abstractmethod
+    def list_subjects(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """All subjects as {id, name} (or just `fields` of SUBJECT_COLUMNS), by name."""
+
+    @abstractmethod
+    def create_subject(self, name: str) -> Dict:
+        """Conflict if the name exists."""
+
+    @abstractmethod
+    def update_subject(self, subject_id: int, name: str) -> Dict:
+        """NotFound, or Conflict if another subject has the name."""
+
+    @abstractmethod
+    def delete_subject(self, subject_id: int) -> None:
+        """NotFound if there is no such subject."""
+
+    # ── study sessions ──────────────────────────────
+    @abstractmethod
+    def create_session(self, user_id: int, subject_id: int, duration: int,
+                       notes: Optional[str] = None) -> int:
+        """Logs a session dated now; returns its id."""
+
+    @abstractmethod
+    def get_session(self, user_id: int, session_id: int) -> Dict:
+        """The user's session; NotFound / Forbidden otherwise."""
+
+    @abstractmethod
+    def list_sessions(self, user_id: int, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """The user's sessions (SESSION_COLUMNS, or just `fields` of them), newest first."""
+
+    @abstractmethod
+    def session_days(self, user_id: int) -> List[Tuple[int, int, int]]:
+        """(day number, subject_id, duration) of every session of the user, in no order; for analytics.py."""
+
+    @abstractmethod
+    def data_version(self, user_id: int) -> int:
+        """Changes whenever the user's sessions or goals do (0 before any write)."""
+
+    @abstractmethod
+    def update_session(self, user_id: int, session_id: int, changes: Dict) -> None:
+        """Applies subject_id / duration / notes; NotFound / Forbidden."""
+
+    @abstractmethod
+    def delete_session(self, user_id: int, session_id: int) -> None:
+        """NotFound / Forbidden."""
+
+    # ── goals ───────────────────────────────────────
+    @abstractmethod
+    def create_goal(self, user_id: int, title: str, category: Optional[str] = None,
+                    progress: int = 0, target_date: Optional[str] = None,
+                    type: str = "milestone", subject_id: Optional[int] = None,
+                    target_minutes: Optional[int] = None, remind_at: Optional[str] = None) -> int:
+        """Returns the new goal's id (streak 0, never done; linked if subject_id is given)."""
+
+    @abstractmethod
+    def get_goal(self, user_id: int, goal_id: int) -> Dict:
+        """The user's goal; NotFound / Forbidden otherwise."""
+
+    @abstractmethod
+    def list_goals(self, user_id: int, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """The user's goals (GOAL_COLUMNS, or just `fields` of them) by type, then target date (latest first)."""
+
+    @abstractmethod
+    def update_goal(self, user_id: int, goal_id: int, changes: Dict) -> None:
+        """Applies any of GOAL_FIELDS, re-deriving linked progress; NotFound / Forbidden."""
+
+    @abstractmethod
+    def delete_goal(self, user_id: int, goal_id: int) -> None:
+        """NotFound / Forbidden."""
+
+
+# ────────────────────────────────────────────────
+# SQLite
+# ────────────────────────────────────────────────
+class SQLiteStorage(Storage):
+    """The on-disk database; sqlite3.Error other than constraint violations propagates."""
+
+    # users and subjects live on the global shard
+    def create_user(self, username, email, password):
+        db = get_db()
+        try:
+            cursor = db.execute(
+                """
+                INSERT INTO users (username, email, password, created_at)
+                VALUES (?, ?, ?, datetime('now'))
+                """,
+                (username, email, password)
+            )
+            db.commit()
+            return {"id": cursor.lastrowid, "username": username, "email": email}
+        except sqlite3.IntegrityError:
+            raise Conflict("Username or email already taken")
+        finally:
+            db.close()
+
+    def get_user(self, user_id):
+        db = get_db()
+        try:
+            row = db.execute("SELECT id, username, email FROM users WHERE id = ?", (user_id,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            db.close()
+
+    def get_user_by_username(self, username):
+        db = get_db()
+        try:
+            row = db.execute("SELECT id, username, password FROM users WHERE username = ?", (username,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            db.close()
+
+    def delete_user(self, user_id):
+        job_id = purge.delete_user(user_id)
+        if job_id is None:
+            raise NotFound()
+        return job_id
+
+    def set_password(self, user_id, password):
+        db = get_db()
+        try:
+            cursor = db.execute("UPDATE users SET password = ? WHERE id = ?", (password, user_id))
+            if cursor.rowcount == 0:
+                raise NotFound()
+            db.commit()
+        finally:
+            db.close()
+
+    def list_subjects(self, fields=None):
+        columns = _columns(fields, SUBJECT_COLUMNS)
+        db = get_db()
+        try:
+            return [dict(row) for row in db.execute(f"SELECT {', '.join(columns)} FROM subjects ORDER BY name")]
+        finally:
+            db.close()
+
+    def create_subject(self, name):
+        db = get_db()
+        try:
+            cursor = db.execute("INSERT INTO subjects (name) VALUES (?)", (name,))
+            db.commit()
+        except sqlite3.IntegrityError:
+            raise Conflict("Subject name already exists")
+        finally:
+            db.close()
+        replicate_subjects()
+        return {"id": cursor.lastrowid, "name": name}
+
+    def update_subject(self, subject_id, name):
+        db = get_db()
+        try:
+            cursor = db.execute("UPDATE subjects SET name = ? WHERE id = ?", (name, subject_id))
+            db.commit()
+        except sqlite3.IntegrityError:
+            raise Conflict("Subject name already exists")
+        finally:
+            db.close()
+        if cursor.rowcount == 0:
+            raise NotFound("Subject not found")
+        replicate_subjects()
+        return {"id": subject_id, "name": name}
+
+    def delete_subject(self, subject_id):
+        db = get_db()
+        try:
+            cursor = db.execute("DELETE FROM subjects WHERE id = ?", (subject_id,))
+            db.commit()
+        finally:
+            db.close()
+        if cursor.rowcount == 0:
+            raise NotFound("Subject not found")
+        replicate_subjects()
+
+    # sessions and goals live on the user's shard
+    def _owned(self, cursor, table: str, row_id: int, user_id: int, columns: str) -> sqlite3.Row:
+        row = cursor.execute(f"SELECT user_id, {columns} FROM {table} WHERE id = ?", (row_id,)).fetchone()
+        if not row:
+            raise NotFound()
+        if row["user_id"] != user_id:
+            raise Forbidden()
+        return row
+
+    def create_session(self, user_id, subject_id, duration, notes=None):
+        db = get_db(user_id)
+        try:
+            cursor = db.cursor()
+            cursor.execute(
+                """
+                INSERT INTO study_sessions
+                (user_id, subject_id, duration, notes, session_date)
+                VALUES (?, ?, ?, ?, datetime('now'))
+                RETURNING id, session_date
+                """,
+                (user_id, subject_id, duration, notes)
+            )
+            session_id, session_date = cursor.fetchone()
+            goal_progress.add_minutes(cursor, user_id, subject_id, duration, session_date)
+            bump_data_version(cursor, user_id)
+            db.commit()
+        finally:
+            db.close()
+        leaderboards.apply(user_id, [(subject_id, duration, session_date)])
+        return session_id
+
+    def _session(self, cursor, user_id: int, session_id: int) -> Tuple[Dict, bool]:
+        """The user's session from either tier, and whether it is archived (archive.py)."""
+        try:
+            row = self._owned(cursor, "study_sessions", session_id, user_id,
+                              "id, subject_id, duration, notes, session_date")
+            return dict(row), False
+        except NotFound:
+            archived = archive.archived_session(cursor, user_id, session_id)
+            if archived is None:
+                raise
+            return archived, True
+
+    def get_session(self, user_id, session_id):
+        db = get_db(user_id)
+        try:
+            return self._session(db.cursor(), user_id, session_id)[0]
+        finally:
+            db.close()
+
+    def list_sessions(self, user_id, fields=None):
+        columns = _columns(fields, SESSION_COLUMNS)
+        db = get_db(user_id)
+        try:
+            # Only the requested columns are read (large notes stay in their overflow pages)
+            rows = db.execute(
+                f"""
+                SELECT {', '.join(columns)}
+                FROM study_sessions
+                WHERE user_id = ?
+                ORDER BY session_date DESC, id DESC
+                """,
+                (user_id,)
+            ).fetchall()
+            # Archived sessions are all older than the hot ones
+            archived = archive.archived_sessions(db.cursor(), user_id)
+            return [dict(row) for row in rows] + (archived if fields is None else _project(archived, columns))
+        finally:
+            db.close()
+
+    def session_days(self, user_id, db=None):
+        """On `db` (the user's shard, inside the caller's transaction) if given."""
+        own = db is None
+        if own:
+            db = get_db(user_id)
+        try:
+            cursor = db.cursor()
+            cursor.row_factory = None  # plain tuples, straight into numpy
+            cursor.execute(f"SELECT {DAY_SQL}, subject_id, duration FROM study_sessions WHERE user_id = ?", (user_id,))
+            rows = cursor.fetchall()
+            cursor.execute("SELECT payload FROM study_sessions_archive WHERE user_id = ?", (user_id,))
+            for (payload,) in cursor.fetchall():
+                columns = archive.decode_columns(payload)
+                rows += zip([_day_number(d) for d in columns["session_date"]], columns["subject_id"], columns["duration"])
+            return rows
+        finally:
+            if own:
+                db.close()
+
+    def data_version(self, user_id, db=None):
+        """On `db` (the user's shard, inside the caller's transaction) if given."""
+        if db is not None:
+            return data_version(db, user_id)
+        db = get_db(user_id)
+        try:
+            return data_version(db, user_id)
+        finally:
+            db.close()
+
+    def update_session(self, user_id, session_id, changes):
+        _check_fields(changes, SESSION_FIELDS)
+        db = get_db(user_id)
+        try:
+            cursor = db.cursor()
+            row, archived = self._session(cursor, user_id, session_id)
+            if not changes:
+                return
+            if archived:
+                archive.update_session(cursor, user_id, session_id, changes)
+            else:
+                cursor.execute(
+                    f"UPDATE study_sessions SET {', '.join(f'{name} = ?' for name in changes)} WHERE id = ?",
+                    [*changes.values(), session_id]
+                )
+            # Move the session's minutes on linked goals, then the leaderboards
+            moved = [(row["subject_id"], -row["duration"], row["session_date"]),
+                     (changes.get("subject_id", row["subject_id"]), changes.get("duration", row["duration"]),
+                      row["session_date"])]
+            for subject_id, minutes, session_date in moved:
+                goal_progress.add_minutes(cursor, user_id, subject_id, minutes, session_date)
+            bump_data_version(cursor, user_id)
+            db.commit()
+        finally:
+            db.close()
+        leaderboards.apply(user_id, moved)
+
+    def delete_session(self, user_id, session_id):
+        db = get_db(user_id)
+        try:
+            cursor = db.cursor()
+            row, archived = self._session(cursor, user_id, session_id)
+            if archived:
+                archive.delete_session(cursor, user_id, session_id)
+            else:
+                cursor.execute("DELETE FROM study_sessions WHERE id = ?", (session_id,))
+            goal_progress.add_minutes(cursor, user_id, row["subject_id"], -row["duration"], row["session_date"])
+            bump_data_version(cursor, user_id)
+            db.commit()
+        finally:
+            db.close()
+        leaderboards.apply(user_id, [(row["subject_id"], -row["duration"], row["session_date"])])
+
+    def create_goal(self, user_id, title, category=None, progress=0, target_date=None, type="milestone",
+                    subject_id=None, target_minutes=None, remind_at=None):
+        db = get_db(user_id)
+        try:
+            cursor = db.cursor()
+            cursor.execute(
+                """
+                INSERT INTO goals (user_id, title, category, progress, target_date, type, streak, last_done,
+                                   subject_id, target_minutes, remind_at)
+                VALUES (?, ?, ?, ?, ?, ?, 0, NULL, ?, ?, ?)
+                """,
+                (user_id, title, category, 0 if subject_id is not None else progress, target_date, type,
+                 subject_id, target_minutes, remind_at)
+            )
+            goal_id = cursor.lastrowid
+            if subject_id is not None:
+                goal_progress.link(cursor, goal_id, relinked=True)
+            bump_data_version(cursor, user_id)
+            db.commit()
+            return goal_id
+        finally:
+            db.close()
+
+    def get_goal(self, user_id, goal_id):
+        db = get_db(user_id)
+        try:
+            row = self._owned(db.cursor(), "goals", goal_id, user_id,
+                              "id, title, category, progress, target_date, type, streak, last_done, "
+                              "subject_id, target_minutes, logged_minutes, linked_since, remind_at")
+            return dict(row)
+        finally:
+            db.close()
+
+    def list_goals(self, user_id, fields=None):
+        columns = _columns(fields, GOAL_COLUMNS)
+        db = get_db(user_id)
+        try:
+            rows = db.execute(
+                f"""
+                SELECT {', '.join(columns)}
+                FROM goals
+                WHERE user_id = ?
+                ORDER BY type, target_date DESC, id
+                """,
+                (user_id,)
+            ).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            db.close()
+
+    def update_goal(self, user_id, goal_id, changes):
+        _check_fields(changes, GOAL_FIELDS)
+        db = get_db(user_id)
+        try:
+            cursor = db.cursor()
+            row = self._owned(cursor, "goals", goal_id, user_id, "subject_id")
+            if not changes:
+                return
+            cursor.execute(
+                f"UPDATE goals SET {', '.join(f'{name} = ?' for name in changes)} WHERE id = ?",
+                [*changes.values(), goal_id]
+            )
+            subject_id = changes.get("subject_id", row["subject_id"])
+            if ("subject_id" in changes or "target_minutes" in changes) and subject_id is not None:
+                goal_progress.link(cursor, goal_id, subject_id != row["subject_id"])
+            bump_data_version(cursor, user_id)
+            db.commit()
+        finally:
+            db.close()
+
+    def delete_goal(self, user_id, goal_id):
+        db = get_db(user_id)
+        try:
+            cursor = db.cursor()
+            self._owned(cursor, "goals", goal_id, user_id, "id")
+            cursor.execute("DELETE FROM goals WHERE id = ?", (goal_id,))
+            bump_data_version(cursor, user_id)
+            db.commit()
+        finally:
+            db.close()
+
+
+# ────────────────────────────────────────────────
+# In memory
+# ────────────────────────────────────────────────
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class MemoryStorage(Storage):
+    """Everything in dicts; for tests and for benchmarking the API without I/O."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users: Dict[int, Dict] = {}
+        self._subjects: Dict[int, Dict] = {}
+        self._sessions: Dict[int, Dict] = {}
+        self._goals: Dict[int, Dict] = {}
+        self._versions: Dict[int, int] = {}
+        self._ids = {name: itertools.count(1) for name in ("users", "subjects", "sessions", "goals")}
+
+    def _owned(self, table: Dict[int, Dict], row_id: int, user_id: int) -> Dict:
+        row = table.get(row_id)
+        if row is None:
+            raise NotFound()
+        if row["user_id"] != user_id:
+            raise Forbidden()
+        return row
+
+    def create_user(self, username, email, password):
+        with self._lock:
+            if any(u["username"] == username or u["email"] == email for u in self._users.values()):
+                raise Conflict("Username or email already taken")
+            user_id = next(self._ids["users"])
+            self._users[user_id] = {"id": user_id, "username": username, "email": email,
+                                    "password": password, "created_at": _now()}
+            return {"id": user_id, "username": username, "email": email}
+
+    def get_user(self, user_id):
+        with self._lock:
+            user = self._users.get(user_id)
+            return {"id": user["id"], "username": user["username"], "email": user["email"]} if user else None
+
+    def get_user_by_username(self, username):
+        with self._lock:
+            for user in self._users.values():
+                if user["username"] == username:
+                    return {"id": user["id"], "username": user["username"], "password": user["password"]}
+            return None
+
+    def delete_user(self, user_id):
+        with self._lock:
+            if self._users.pop(user_id, None) is None:
+                raise NotFound()
+            for table in (self._sessions, self._goals):
+                for row_id in [row_id for row_id, row in table.items() if row["user_id"] == user_id]:
+                    del table[row_id]
+            return None
+
+    def set_password(self, user_id, password):
+        with self._lock:
+            if user_id not in self._users:
+                raise NotFound()
+            self._users[user_id]["password"] = password
+
+    def list_subjects(self, fields=None):
+        columns = _columns(fields, SUBJECT_COLUMNS)
+        with self._lock:
+            return _project(sorted(self._subjects.values(), key=lambda s: s["name"]), columns)
+
+    def _name_taken(self, name: str, subject_id: Optional[int] = None) -> bool:
+        return any(s["name"] == name and s["id"] != subject_id for s in self._subjects.values())
+
+    def create_subject(self, name):
+        with self._lock:
+            if self._name_taken(name):
+                raise Conflict("Subject name already exists")
+            subject_id = next(self._ids["subjects"])
+            self._subjects[subject_id] = {"id": subject_id, "name": name}
+            return dict(self._subjects[subject_id])
+
+    def update_subject(self, subject_id, name):
+        with self._lock:
+            if subject_id not in self._subjects:
+                raise NotFound("Subject not found")
+            if self._name_taken(name, subject_id):
+                raise Conflict("Subject name already exists")
+            self._subjects[subject_id]["name"] = name
+            return dict(self._subjects[subject_id])
+
+    def delete_subject(self, subject_id):
+        with self._lock:
+            if self._subjects.pop(subject_id, None) is None:
+                raise NotFound("Subject not found")
+
+    def _bump(self, user_id: int):
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def _add_goal_minutes(self, user_id: int, subject_id: int, minutes: int, session_date: str):
+        for goal in self._goals.values():
+            if (goal["user_id"] == user_id and goal["subject_id"] == subject_id
+                    and goal["linked_since"] <= session_date):
+                goal["logged_minutes"] += minutes
+                goal["progress"] = goal_progress.progress_for(goal["logged_minutes"], goal["target_minutes"])
+
+    def _link(self, goal: Dict):
+        """Start counting now, including sessions already logged this second."""
+        goal["linked_since"] = _now()
+        goal["logged_minutes"] = sum(
+            s["duration"] for s in self._sessions.values()
+            if s["user_id"] == goal["user_id"] and s["subject_id"] == goal["subject_id"]
+            and s["session_date"] >= goal["linked_since"]
+        )
+
+    def create_session(self, user_id, subject_id, duration, notes=None):
+        with self._lock:
+            session_id = next(self._ids["sessions"])
+            self._sessions[session_id] = {"id": session_id, "user_id": user_id, "subject_id": subject_id,
+                                          "duration": duration, "notes": notes, "session_date": _now()}
+            self._add_goal_minutes(user_id, subject_id, duration, self._sessions[session_id]["session_date"])
+            self._bump(user_id)
+            return session_id
+
+    def get_session(self, user_id, session_id):
+        with self._lock:
+            return dict(self._owned(self._sessions, session_id, user_id))
+
+    def list_sessions(self, user_id, fields=None):
+        columns = _columns(fields, SESSION_COLUMNS)
+        with self._lock:
+            rows = [dict(s) for s in self._sessions.values() if s["user_id"] == user_id]
+        rows.sort(key=lambda s: (s["session_date"], s["id"]), reverse=True)
+        return _project(rows, columns)
+
+    def session_days(self, user_id):
+        with self._lock:
+            return [(_day_number(s["session_date"]), s["subject_id"], s["duration"])
+                    for s in self._sessions.values() if s["user_id"] == user_id]
+
+    def data_version(self, user_id):
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def update_session(self, user_id, session_id, changes):
+        _check_fields(changes, SESSION_FIELDS)
+        with self._lock:
+            session = self._owned(self._sessions, session_id, user_id)
+            self._add_goal_minutes(user_id, session["subject_id"], -session["duration"], session["session_date"])
+            session.update(changes)
+            self._add_goal_minutes(user_id, session["subject_id"], session["duration"], session["session_date"])
+            self._bump(user_id)
+
+    def delete_session(self, user_id, session_id):
+        with self._lock:
+            session = self._owned(self._sessions, session_id, user_id)
+            self._add_goal_minutes(user_id, session["subject_id"], -session["duration"], session["session_date"])
+            del self._sessions[session_id]
+            self._bump(user_id)
+
+    def create_goal(self, user_id, title, category=None, progress=0, target_date=None, type="milestone",
+                    subject_id=None, target_minutes=None, remind_at=None):
+        linked = subject_id is not None
+        with self._lock:
+            goal_id = next(self._ids["goals"])
+            self._goals[goal_id] = {"id": goal_id, "user_id": user_id, "title": title, "category": category,
+                                    "progress": 0 if linked else progress, "target_date": target_date,
+                                    "type": type, "streak": 0, "last_done": None,
+                                    "subject_id": subject_id, "target_minutes": target_minutes,
+                                    "logged_minutes": 0, "linked_since": None, "remind_at": remind_at}
+            if linked:
+                self._link(self._goals[goal_id])
+                self._goals[goal_id]["progress"] = goal_progress.progress_for(
+                    self._goals[goal_id]["logged_minutes"], target_minutes)
+            self._bump(user_id)
+            return goal_id
+
+    def get_goal(self, user_id, goal_id):
+        with self._lock:
+            return dict(self._owned(self._goals, goal_id, user_id))
+
+    def list_goals(self, user_id, fields=None):
+        columns = _columns(fields, GOAL_COLUMNS)
+        with self._lock:
+            rows = [dict(g) for g in self._goals.values() if g["user_id"] == user_id]
+        # type ascending, target_date descending with NULL last (as SQLite sorts), id ascending
+        rows.sort(key=lambda g: g["id"])
+        rows.sort(key=lambda g: (g["target_date"] is not None, g["target_date"] or ""), reverse=True)
+        rows.sort(key=lambda g: g["type"])
+        return _project(rows, columns)
+
+    def update_goal(self, user_id, goal_id, changes):
+        _check_fields(changes, GOAL_FIELDS)
+        with self._lock:
+            goal = self._owned(self._goals, goal_id, user_id)
+            relinked = changes.get("subject_id", goal["subject_id"]) != goal["subject_id"]
+            goal.update(changes)
+            if relinked:
+                self._link(goal)
+            if (("subject_id" in changes or "target_minutes" in changes)
+                    and goal["subject_id"] is not None and goal["target_minutes"]):
+                goal["progress"] = goal_progress.progress_for(goal["logged_minutes"], goal["target_minutes"])
+            self._bump(user_id)
+
+    def delete_goal(self, user_id, goal_id):
+        with self._lock:
+            self._owned(self._goals, goal_id, user_id)
+            del self._goals[goal_id]
+            self._bump(user_id)
+
+
+# ────────────────────────────────────────────────
+# The process-wide backend
+# ────────────────────────────────────────────────
+BACKENDS = {"sqlite": SQLiteStorage, "memory": MemoryStorage}
+
+_backend: Optional[Storage] = None
+
+
+def get_storage() -> Storage:
+    """The configured backend (settings.storage_backend), created on first use."""
+    global _backend
+    if _backend is None:
+        _backend = BACKENDS[settings.storage_backend]()
+    return _backend
+
+
+def set_storage(backend: Storage) -> Storage:
+    """Swaps the backend, e.g. a fresh MemoryStorage per test; returns the old one."""
+    global _backend
+    previous, _backend = _backend, backend
+    return previous
@@ -0,0 +1,322 @@
+# storage_conformance.py
+#
+# Runs the storage contract (see storage.py) against every backend and
+# times it, so a new backend can be checked and compared on the same
+# workload. Each check gets a fresh MemoryStorage; the SQLite backend runs
+# on a throwaway database in a temp directory unless STUDY_DB_PATH is set.
+#
+#   python storage_conformance.py                  # all backends
+#   python storage_conformance.py memory --rounds 20
+import os
+import sys
+import tempfile
+
+if "STUDY_DB_PATH" not in os.environ:
+    os.environ["STUDY_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="study-conformance-"), "study.db")
+
+import argparse
+import itertools
+import time
+import traceback
+from datetime import date
+
+import storage
+from database import close_pools, init_db
+from storage import Conflict, Forbidden, NotFound
+
+_names = itertools.count(1)
+
+
+def unique(prefix: str) -> str:
+    """Names that don't collide across checks sharing one SQLite file."""
+    return f"{prefix}-{os.getpid()}-{next(_names)}"
+
+
+def new_user(store) -> int:
+    name = unique("user")
+    return store.create_user(name, f"{name}@example.com", "secret")["id"]
+
+
+def raises(kinds, fn, *args):
+    try:
+        fn(*args)
+    except kinds:
+        return
+    raise AssertionError(f"{fn.__name__}{args} did not raise {kinds}")
+
+
+# ────────────────────────────────────────────────
+# Checks
+# ────────────────────────────────────────────────
+def check_users(store):
+    name = unique("user")
+    user = store.create_user(name, f"{name}@example.com", "pw")
+    assert user == {"id": user["id"], "username": name, "email": f"{name}@example.com"}
+    assert store.get_user(user["id"]) == user
+    assert store.get_user_by_username(name) == {"id": user["id"], "username": name, "password": "pw"}
+    assert store.get_user_by_username(unique("nobody")) is None
+    assert store.get_user(user["id"] + 10**9) is None
+    store.set_password(user["id"], "new")
+    assert store.get_user_by_username(name)["password"] == "new"
+    raises(NotFound, store.set_password, user["id"] + 10**9, "new")
+
+
+def check_user_uniqueness(store):
+    name = unique("user")
+    first = store.create_user(name, f"{name}@example.com", "pw")
+    raises(Conflict, store.create_user, name, f"other-{name}@example.com", "pw")
+    raises(Conflict, store.create_user, f"other-{name}", f"{name}@example.com", "pw")
+    # usernames are case-sensitive, and a failed insert leaves nothing behind
+    second = store.create_user(name.upper(), f"upper-{name}@example.com", "pw")
+    assert second["id"] > first["id"]
+    assert store.get_user_by_username(f"other-{name}") is None
+
+
+def check_delete_user(store):
+    name = unique("user")
+    user_id = store.create_user(name, f"{name}@example.com", "pw")["id"]
+    subject = store.create_subject(unique("subject"))["id"]
+    store.create_session(user_id, subject, 30)
+    store.create_goal(user_id, "goal")
+    store.delete_user(user_id)
+    assert store.get_user(user_id) is None and store.get_user_by_username(name) is None
+    raises(NotFound, store.delete_user, user_id)
+    # name and email are free again
+    assert store.create_user(name, f"{name}@example.com", "pw")["id"] != user_id
+
+
+def check_subjects(store):
+    a, b = unique("b-subject"), unique("a-subject")
+    first = store.create_subject(a)
+    second = store.create_subject(b)
+    assert first["name"] == a and second["id"] != first["id"]
+    raises(Conflict, store.create_subject, a)
+    names = [s["name"] for s in store.list_subjects()]
+    assert names == sorted(names) and b in names
+
+    renamed = unique("c-subject")
+    assert store.update_subject(first["id"], renamed) == {"id": first["id"], "name": renamed}
+    assert store.update_subject(first["id"], renamed)["name"] == renamed  # own name is no conflict
+    raises(Conflict, store.update_subject, first["id"], b)
+    raises(NotFound, store.update_subject, first["id"] + 10**9, unique("x"))
+
+    store.delete_subject(first["id"])
+    raises(NotFound, store.delete_subject, first["id"])
+    assert first["id"] not in [s["id"] for s in store.list_subjects()]
+    assert store.create_subject(unique("d-subject"))["id"] > second["id"]  # ids are not reused
+
+
+def check_sessions(store):
+    user, other = new_user(store), new_user(store)
+    subject = store.create_subject(unique("subject"))["id"]
+    ids = [store.create_session(user, subject, minutes, f"note {minutes}") for minutes in (10, 20, 30)]
+    store.create_session(other, subject, 99)
+
+    sessions = store.list_sessions(user)
+    assert [s["id"] for s in sessions] == sorted(ids, reverse=True)  # newest first
+    assert {s["user_id"] for s in sessions} == {user}
+    session = store.get_session(user, ids[0])
+    assert session["duration"] == 10 and session["notes"] == "note 10"
+    assert len(session["session_date"]) == 19 and session["session_date"][10] == " "
+
+    store.update_session(user, ids[0], {"duration": 45, "notes": None})
+    updated = store.get_session(user, ids[0])
+    assert updated["duration"] == 45 and updated["notes"] is None
+    assert updated["session_date"] == session["session_date"]
+    raises(ValueError, store.update_session, user, ids[0], {"user_id": other})
+
+    store.delete_session(user, ids[1])
+    raises(NotFound, store.get_session, user, ids[1])
+    raises(NotFound, store.delete_session, user, ids[1])
+    assert [s["id"] for s in store.list_sessions(user)] == [ids[2], ids[0]]
+    assert len(store.list_sessions(other)) == 1
+
+    day = (date.fromisoformat(session["session_date"][:10]) - date(1970, 1, 1)).days
+    assert sorted(store.session_days(user)) == [(day, subject, 30), (day, subject, 45)]
+
+
+def check_projection(store):
+    user = new_user(store)
+    subject = store.create_subject(unique("p-subject"))["id"]
+    store.create_session(user, subject, 30, "long notes " * 100)
+    store.create_goal(user, "goal", subject_id=subject, target_minutes=60)
+
+    full = store.list_sessions(user)
+    sessions = store.list_sessions(user, ["duration", "id"])
+    assert sessions == [{"id": s["id"], "duration": s["duration"]} for s in full]
+    assert list(sessions[0]) == ["id", "duration"]  # column order, not request order
+    goals = store.list_goals(user, ["progress", "logged_minutes"])
+    assert goals == [{"progress": 50, "logged_minutes": 30}]
+    assert all(set(s) == {"id"} for s in store.list_subjects(["id"]))
+    raises(ValueError, store.list_sessions, user, ["id", "password"])
+    raises(ValueError, store.list_subjects, ["name", "user_id"])
+
+
+def check_session_ownership(store):
+    owner, intruder = new_user(store), new_user(store)
+    subject = store.create_subject(unique("subject"))["id"]
+    session_id = store.create_session(owner, subject, 25)
+    raises((Forbidden, NotFound), store.get_session, intruder, session_id)
+    raises((Forbidden, NotFound), store.update_session, intruder, session_id, {"duration": 1})
+    raises((Forbidden, NotFound), store.delete_session, intruder, session_id)
+    assert store.get_session(owner, session_id)["duration"] == 25
+    assert store.list_sessions(intruder) == []
+
+
+def check_goals(store):
+    user = new_user(store)
+    late = store.create_goal(user, "late", "math", 10, "2026-12-01")
+    undated = store.create_goal(user, "undated")
+    early = store.create_goal(user, "early", None, 0, "2026-06-01")
+    daily = store.create_goal(user, "daily", None, 0, None, "daily")
+    same_day = store.create_goal(user, "same day", None, 0, "2026-06-01")
+
+    order = [g["id"] for g in store.list_goals(user)]
+    assert order == [daily, late, early, same_day, undated], order
+    goal = store.get_goal(user, late)
+    assert (goal["title"], goal["category"], goal["progress"], goal["streak"], goal["last_done"]) == \
+        ("late", "math", 10, 0, None)
+
+    store.update_goal(user, daily, {"streak": 3, "last_done": "2026-06-02"})
+    store.update_goal(user, late, {"progress": 50, "title": "later"})
+    assert store.get_goal(user, daily)["streak"] == 3
+    assert store.get_goal(user, late)["title"] == "later"
+    raises(ValueError, store.update_goal, user, late, {"type": "daily"})
+
+    store.delete_goal(user, undated)
+    raises(NotFound, store.get_goal, user, undated)
+    assert len(store.list_goals(user)) == 4
+
+
+def check_linked_goals(store):
+    user, other = new_user(store), new_user(store)
+    math, art, music = (store.create_subject(unique("subject"))["id"] for _ in range(3))
+    goal_id = store.create_goal(user, "math hours", progress=40, subject_id=math, target_minutes=200)
+    plain = store.create_goal(user, "by hand", progress=40)
+    state = lambda: (lambda g: (g["logged_minutes"], g["progress"]))(store.get_goal(user, goal_id))
+    assert state() == (0, 0)  # progress is derived, not taken from the caller
+
+    session_id = store.create_session(user, math, 30)
+    store.create_session(user, art, 45)
+    store.create_session(other, math, 60)
+    assert state() == (30, 15)
+    store.update_session(user, session_id, {"duration": 50})
+    assert state() == (50, 25)
+    store.update_session(user, session_id, {"subject_id": art})
+    assert state() == (0, 0)
+    store.update_session(user, session_id, {"subject_id": math, "duration": 500})
+    assert state() == (500, 100)  # capped
+    store.update_goal(user, goal_id, {"target_minutes": 1000})
+    assert state() == (500, 50)
+    store.update_goal(user, goal_id, {"subject_id": math, "title": "same link"})
+    assert state() == (500, 50)
+    store.delete_session(user, session_id)
+    assert state() == (0, 0)
+
+    store.create_session(user, math, 100)
+    store.update_goal(user, goal_id, {"subject_id": music})  # relinked: the count starts again
+    assert state() == (0, 0)
+    assert store.get_goal(user, plain)["progress"] == 40
+    store.update_goal(user, plain, {"target_minutes": 100})  # no subject: nothing to derive progress from
+    assert store.get_goal(user, plain)["progress"] == 40
+
+
+def check_goal_ownership(store):
+    owner, intruder = new_user(store), new_user(store)
+    goal_id = store.create_goal(owner, "mine")
+    raises((Forbidden, NotFound), store.get_goal, intruder, goal_id)
+    raises((Forbidden, NotFound), store.update_goal, intruder, goal_id, {"title": "theirs"})
+    raises((Forbidden, NotFound), store.delete_goal, intruder, goal_id)
+    assert store.get_goal(owner, goal_id)["title"] == "mine"
+    assert store.list_goals(intruder) == []
+
+
+def check_data_version(store):
+    user, other = new_user(store), new_user(store)
+    subject = store.create_subject(unique("v-subject"))["id"]
+    seen = [store.data_version(user)]
+    session_id = store.create_session(user, subject, 20)
+    seen.append(store.data_version(user))
+    goal_id = store.create_goal(user, "versioned")
+    seen.append(store.data_version(user))
+    store.update_session(user, session_id, {"duration": 25})
+    seen.append(store.data_version(user))
+    store.update_goal(user, goal_id, {"title": "renamed"})
+    seen.append(store.data_version(user))
+    store.delete_session(user, session_id)
+    seen.append(store.data_version(user))
+    store.delete_goal(user, goal_id)
+    seen.append(store.data_version(user))
+    assert seen == sorted(set(seen)), seen  # every write moves it forward
+
+    raises(NotFound, store.delete_session, user, session_id)  # failed writes don't
+    raises((Forbidden, NotFound), store.update_goal, other, goal_id, {"title": "x"})
+    assert store.data_version(user) == seen[-1]
+    assert store.data_version(other) == 0
+
+
+CHECKS = [
+    check_users,
+    check_user_uniqueness,
+    check_delete_user,
+    check_subjects,
+    check_sessions,
+    check_projection,
+    check_session_ownership,
+    check_goals,
+    check_linked_goals,
+    check_goal_ownership,
+    check_data_version,
+]
+
+
+# ────────────────────────────────────────────────
+# Runner
+# ────────────────────────────────────────────────
+def run(backend: str, rounds: int) -> bool:
+    if backend == "sqlite":
+        init_db()
+        shared = storage.SQLiteStorage()
+        make = lambda: shared
+    else:
+        make = storage.BACKENDS[backend]
+
+    failures = 0
+    for check in CHECKS:
+        try:
+            check(make())
+        except Exception:
+            failures += 1
+            print(f"  FAIL {check.__name__}", file=sys.stderr)
+            traceback.print_exc()
+    if failures:
+        print(f"{backend}: {failures} of {len(CHECKS)} checks failed")
+        return False
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for check in CHECKS:
+            check(make())
+    elapsed = time.perf_counter() - started
+    runs = rounds * len(CHECKS)
+    print(f"{backend:>8}: {len(CHECKS)} checks passed; {runs} runs in {elapsed:.2f}s "
+          f"({runs / elapsed:,.0f} checks/s)")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage contract checks and timings")
+    parser.add_argument("backends", nargs="*",
+                        help=f"any of {', '.join(storage.BACKENDS)} (default: all)")
+    parser.add_argument("--rounds", type=int, default=5, help="timed repetitions of the whole suite")
+    args = parser.parse_args()
+    for backend in args.backends:
+        if backend not in storage.BACKENDS:
+            parser.error(f"unknown backend {backend!r}")
+    ok = all([run(backend, args.rounds) for backend in args.backends or storage.BACKENDS])
+    close_pools()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
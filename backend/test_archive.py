@@ -0,0 +1,68 @@
+# test_archive.py
+#
+# Archived sessions are read, edited and deleted by id like hot ones, and
+# their notes stay searchable (archive.py, storage.py, search.py).
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import archive
+import database
+import goal_progress
+import search
+import storage
+from storage import get_storage
+
+
+@pytest.fixture
+def archived():
+    database.init_db()
+    search.init_search()
+    store = get_storage()
+    user_id = store.create_user("archived", "archived@example.com", "secret123")["id"]
+    math, art = (store.create_subject(name)["id"] for name in ("Archive math", "Archive art"))
+    goal_id = store.create_goal(user_id, "old math", subject_id=math, target_minutes=1000)
+    old = datetime.now(timezone.utc) - timedelta(days=200)
+    db = database.get_db(user_id)
+    session_ids = [
+        db.execute(
+            "INSERT INTO study_sessions (user_id, subject_id, duration, notes, session_date) VALUES (?, ?, ?, ?, ?)",
+            (user_id, math, 30 + i, notes, f"{(old + timedelta(days=i)).date()} 12:00:00")
+        ).lastrowid
+        for i, notes in enumerate(["eigenvalue drills", None, "chain rule"])
+    ]
+    db.execute("UPDATE goals SET linked_since = '2000-01-01 00:00:00' WHERE id = ?", (goal_id,))
+    db.commit()
+    db.close()
+    archive.run(archive.MIN_AGE_DAYS)
+    goal_progress.reconcile(user_id)
+    return store, user_id, (math, art), session_ids
+
+
+def found(user_id, query):
+    return [hit["id"] for hit in search.search(user_id, query)["sessions"]]
+
+
+def test_archived_sessions_by_id(archived):
+    store, user_id, (math, art), (first, second, third) = archived
+    assert {s["id"] for s in store.list_sessions(user_id)} == {first, second, third}
+    assert store.get_session(user_id, first)["notes"] == "eigenvalue drills"
+    assert found(user_id, "eigenvalue") == [first]
+    hit = search.search(user_id, "chain")["sessions"][0]
+    assert (hit["id"], hit["subject_id"], hit["duration"]) == (third, math, 32)
+
+    store.update_session(user_id, first, {"subject_id": art, "duration": 50, "notes": "matrix norms"})
+    store.update_session(user_id, second, {"notes": "limits"})
+    assert store.get_session(user_id, first)["duration"] == 50
+    assert found(user_id, "eigenvalue") == [] and found(user_id, "norms") == [first]
+    assert found(user_id, "limits") == [second]
+
+    store.delete_session(user_id, third)
+    with pytest.raises(storage.NotFound):
+        store.get_session(user_id, third)
+    assert found(user_id, "chain") == []
+
+    # rollups, month totals and linked goals followed the edits
+    assert archive.verify() == []
+    assert goal_progress.reconcile(user_id)["repaired"] == 0
+    assert sorted(s["duration"] for s in store.list_sessions(user_id)) == [31, 50]
@@ -0,0 +1,44 @@
+# test_forecasting.py
+#
+# forecast() on hand-made session arrays: unlinked goals are fitted on the
+# user's study overall, and untracked only without any session to fit on.
+import numpy as np
+
+from analytics import SessionArrays
+from forecasting import FIT_DAYS, GOAL_MINUTES, forecast
+
+TODAY = 20_000
+
+
+def goal(goal_id, progress=0, subject_id=None, target_minutes=None, logged_minutes=0, target_date=None):
+    return {"id": goal_id, "title": f"goal {goal_id}", "progress": progress, "target_date": target_date,
+            "type": "milestone", "subject_id": subject_id, "target_minutes": target_minutes,
+            "logged_minutes": logged_minutes}
+
+
+def arrays(days, subjects, minutes):
+    return SessionArrays(np.array(days), np.array(subjects), np.array(minutes))
+
+
+def test_unlinked_goals_use_overall_pace():
+    # 30 min/day on subject 1 and 10 min/day on subject 2 over the whole window
+    days = np.arange(TODAY - FIT_DAYS + 1, TODAY + 1)
+    history = arrays(np.concatenate([days, days]), [1] * FIT_DAYS + [2] * FIT_DAYS, [30] * FIT_DAYS + [10] * FIT_DAYS)
+    linked, by_hand, sized = forecast([
+        goal(1, subject_id=1, target_minutes=300),
+        goal(2, progress=60),
+        goal(3, progress=50, target_minutes=200),
+    ], history, TODAY)
+
+    assert (linked["basis"], linked["pace"], linked["remaining_minutes"]) == ("subject", 30.0, 300)
+    assert (by_hand["basis"], by_hand["pace"]) == ("overall", 40.0)
+    assert by_hand["remaining_minutes"] == GOAL_MINUTES * 40 // 100
+    assert by_hand["status"] == "no_deadline" and by_hand["estimated_completion"] is not None
+    assert sized["remaining_minutes"] == 100
+    assert sized["estimated_completion"] == str(np.datetime64(TODAY + 2, "D"))  # 100 min at 40/day, today included
+
+
+def test_untracked_only_without_sessions():
+    quiet = arrays([TODAY - FIT_DAYS - 5], [1], [60])  # only before the window
+    (by_hand,) = forecast([goal(1, progress=10, target_date=str(np.datetime64(TODAY + 30, "D")))], quiet, TODAY)
+    assert (by_hand["status"], by_hand["basis"], by_hand["estimated_completion"]) == ("untracked", None, None)
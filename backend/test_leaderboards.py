@@ -0,0 +1,109 @@
+# test_leaderboards.py
+#
+# "My rank" read from the rank counts matches counting the members ahead,
+# through session writes, edits and a member leaving, and reconcile()
+# repairs a board that missed an update (leaderboards.py).
+import random
+
+import pytest
+
+import database
+import leaderboards
+from storage import get_storage
+
+
+@pytest.fixture
+def group(request):
+    tag = request.node.name[-8:]
+    database.init_db()
+    store = get_storage()
+    members = [store.create_user(f"{tag}{i}", f"{tag}{i}@example.com", "secret123")["id"] for i in range(12)]
+    subjects = [store.create_subject(f"{tag} {name}")["id"] for name in ("math", "art")]
+    db = database.get_db()
+    cursor = db.cursor()
+    cursor.execute("INSERT INTO study_groups (name, owner_id, created_at) VALUES ('board', ?, datetime('now'))",
+                   (members[0],))
+    group_id = cursor.lastrowid
+    for user_id in members:
+        cursor.execute("INSERT INTO group_members (group_id, user_id, joined_at) VALUES (?, ?, datetime('now'))",
+                       (group_id, user_id))
+        leaderboards.backfill_member(cursor, group_id, user_id)
+    db.commit()
+    db.close()
+    return store, group_id, members, subjects
+
+
+def check_ranks(group_id, members, subject_id=leaderboards.ALL_SUBJECTS):
+    db = database.get_db()
+    try:
+        period = leaderboards.current_period("week")
+        scores = dict(db.execute(
+            "SELECT user_id, minutes FROM leaderboard_scores WHERE group_id = ? AND period = ? AND subject_id = ?",
+            (group_id, period, subject_id)
+        ).fetchall())
+        for user_id in members:
+            me = leaderboards.get_leaderboard(db.cursor(), group_id, user_id, period, subject_id)["me"]
+            mine = scores.get(user_id, 0)
+            assert me["minutes"] == mine
+            assert me["rank"] == 1 + sum(minutes > mine for minutes in scores.values())
+    finally:
+        db.close()
+    return scores
+
+
+def counts(db):
+    return [tuple(row) for row in db.execute(
+        "SELECT group_id, period, subject_id, node, members FROM leaderboard_counts WHERE members != 0 ORDER BY 1, 2, 3, 4"
+    )]
+
+
+def test_rank_counts_follow_session_writes(group):
+    store, group_id, members, subjects = group
+    rng = random.Random(7)
+    sessions = []
+    for _ in range(40):
+        user_id = rng.choice(members)
+        subject_id = rng.choice(subjects)
+        # few distinct durations, so members tie
+        sessions.append((user_id, store.create_session(user_id, subject_id, rng.choice([15, 30, 45]))))
+    check_ranks(group_id, members)
+    check_ranks(group_id, members, subjects[0])
+
+    for user_id, session_id in sessions[:10]:
+        store.update_session(user_id, session_id, {"duration": rng.choice([20, 30]), "subject_id": subjects[1]})
+    for user_id, session_id in sessions[10:15]:
+        store.delete_session(user_id, session_id)
+    db = database.get_db()
+    leaderboards.remove_member(db.cursor(), group_id, members[-1])
+    db.execute("DELETE FROM group_members WHERE group_id = ? AND user_id = ?", (group_id, members[-1]))
+    db.commit()
+    db.close()
+    check_ranks(group_id, members[:-1], subjects[1])
+    check_ranks(group_id, members[:-1])
+
+    # the maintained counts are the ones rebuilt from the scores
+    db = database.get_db()
+    try:
+        maintained = counts(db)
+        database.rebuild_leaderboard_counts(db)
+        assert counts(db) == maintained
+        db.rollback()
+    finally:
+        db.close()
+
+
+def test_reconcile_repairs_missed_updates(group):
+    store, group_id, members, subjects = group
+    for user_id, minutes in zip(members, (30, 60, 90)):
+        store.create_session(user_id, subjects[0], minutes)
+    # a board update lost after its session committed
+    db = database.get_db(members[1])
+    db.execute("INSERT INTO study_sessions (user_id, subject_id, duration, session_date) VALUES (?, ?, 45, datetime('now'))",
+               (members[1], subjects[0]))
+    db.commit()
+    db.close()
+
+    result = leaderboards.reconcile()
+    assert result["user_ids"] == [members[1]]
+    assert check_ranks(group_id, members)[members[1]] == 105
+    assert leaderboards.reconcile()["repaired"] == 0
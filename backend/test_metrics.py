@@ -0,0 +1,57 @@
+# test_metrics.py
+#
+# SQLITE_BUSY handling of InstrumentedConnection: waits where SQLite's own
+# busy handler would, raises at once where waiting cannot help.
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def conns(tmp_path):
+    path = str(tmp_path / "busy.db")
+    a, b = (sqlite3.connect(path, timeout=0, check_same_thread=False, factory=metrics.InstrumentedConnection)
+            for _ in range(2))
+    a.execute("CREATE TABLE t (x)")
+    a.commit()
+    metrics.registry.reset()
+    yield a, b
+    a.close()
+    b.close()
+
+
+def test_waits_at_transaction_start(conns):
+    a, b = conns
+    a.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.2, a.commit).start()
+    b.execute("INSERT INTO t VALUES (1)")
+    b.commit()
+    assert metrics.registry.busy_retries > 0 and metrics.registry.busy_conflicts == 0
+
+
+def test_upgrade_deadlock_raises_at_once(conns):
+    a, b = conns
+    b.execute("BEGIN")
+    b.execute("SELECT COUNT(*) FROM t").fetchone()
+    a.execute("BEGIN IMMEDIATE")
+    started = time.perf_counter()
+    with pytest.raises(sqlite3.OperationalError):
+        b.execute("INSERT INTO t VALUES (1)")
+    assert time.perf_counter() - started < 0.5
+    assert metrics.registry.busy_conflicts == 1 and metrics.registry.busy_retries == 0
+
+
+def test_stale_wal_snapshot_raises_at_once(conns):
+    a, b = conns
+    a.execute("PRAGMA journal_mode = WAL").fetchone()
+    b.execute("BEGIN")
+    b.execute("SELECT COUNT(*) FROM t").fetchone()
+    a.execute("INSERT INTO t VALUES (1)")
+    a.commit()
+    with pytest.raises(sqlite3.OperationalError):
+        b.execute("INSERT INTO t VALUES (2)")
+    assert metrics.registry.busy_conflicts == 1
@@ -0,0 +1,65 @@
+# test_planner.py
+#
+# The study plan and the goal forecasts read the same pace for a linked
+# goal's subject, so they must give it the same finish date (planner.py,
+# forecasting.py).
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import database
+import forecasting
+import planner
+from storage import get_storage
+
+
+@pytest.fixture
+def user():
+    database.init_db()
+    store = get_storage()
+    user_id = store.create_user("planner", "planner@example.com", "secret123")["id"]
+    math, art = (store.create_subject(name)["id"] for name in ("Plan math", "Plan art"))
+    today = datetime.now(timezone.utc).date()
+    db = database.get_db(user_id)
+    # a rising trend on math, a flat one on art, over the fitting window
+    db.executemany(
+        "INSERT INTO study_sessions (user_id, subject_id, duration, session_date) VALUES (?, ?, ?, ?)",
+        [(user_id, math, 20 + days, f"{today - timedelta(days=days)} 12:00:00") for days in range(1, 21, 2)]
+        + [(user_id, art, 35, f"{today - timedelta(days=days)} 12:00:00") for days in range(1, 28, 3)]
+    )
+    database.bump_data_version(db, user_id)
+    db.commit()
+    db.close()
+
+    goals = {
+        "soon": store.create_goal(user_id, "soon", subject_id=math, target_minutes=300,
+                                  target_date=str(today + timedelta(days=20))),
+        "later": store.create_goal(user_id, "later", subject_id=math, target_minutes=2000,
+                                   target_date=str(today + timedelta(days=90))),
+        "art": store.create_goal(user_id, "art", subject_id=art, target_minutes=500),
+        "by hand": store.create_goal(user_id, "by hand", progress=30),
+    }
+    yield user_id, goals
+    planner.invalidate(user_id)
+    forecasting.invalidate(user_id)
+
+
+def test_plan_and_forecast_agree_on_linked_goals(user):
+    user_id, goals = user
+    plan = planner.get_plan(user_id, days=60)
+    forecasts = {f["goal_id"]: f for f in forecasting.user_forecasts(user_id)}
+    planned = {g["goal_id"]: g for g in plan["goals"]}
+
+    for name in ("soon", "later", "art"):
+        goal_id = goals[name]
+        assert forecasts[goal_id]["estimated_completion"] is not None
+        assert planned[goal_id]["finish_date"] == forecasts[goal_id]["estimated_completion"], name
+        assert planned[goal_id]["remaining_minutes"] == forecasts[goal_id]["remaining_minutes"]
+    pace = {p["subject_id"]: p["minutes_per_day"] for p in plan["pace"]}
+    assert sorted(pace.values()) == sorted({forecasts[goals[n]]["pace"] for n in ("soon", "art")})
+
+    # the schedule puts math's minutes under the goal due first until its finish date
+    finish = planned[goals["soon"]]["finish_date"]
+    scheduled = [sum(b["minutes"] for b in day["blocks"] if b["goal_id"] == goals["soon"])
+                 for day in plan["days"] if day["date"] <= finish]
+    assert sum(scheduled[:-1]) < 300 <= sum(scheduled)
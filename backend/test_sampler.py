@@ -0,0 +1,70 @@
+# test_sampler.py
+#
+# The practice sampler's banks: the NumPy-built tree, and banks shared
+# between workers through sampler_banks and cards.last_reviewed
+# (sampler.py).
+import random
+import time
+
+import numpy as np
+import pytest
+
+import database
+import quizzes
+import sampler
+from fenwick import FenwickTree, build_tree
+from storage import get_storage
+
+
+@pytest.mark.parametrize("n", [0, 1, 2, 3, 7, 8, 9, 1000])
+def test_build_tree_matches_fenwick_tree(n):
+    values = [random.random() for _ in range(n)]
+    assert np.allclose(build_tree(np.array(values)), FenwickTree(values).tree)
+
+
+@pytest.fixture
+def bank():
+    database.init_db()
+    store = get_storage()
+    user_id = store.create_user("sampler", "sampler@example.com", "secret123")["id"]
+    subject_id = store.create_subject("Sampling")["id"]
+    db = database.get_db(user_id)
+    deck_id = db.execute(
+        "INSERT INTO decks (user_id, subject_id, name, created_at) VALUES (?, ?, 'd', datetime('now'))",
+        (user_id, subject_id)
+    ).lastrowid
+    db.executemany(
+        "INSERT INTO cards (deck_id, user_id, front, back, next_due) VALUES (?, ?, 'q', 'a', datetime('now'))",
+        [(deck_id, user_id)] * 20
+    )
+    database.bump_card_version(db, user_id)
+    db.commit()
+    card_ids = [row[0] for row in db.execute("SELECT id FROM cards WHERE deck_id = ? ORDER BY id", (deck_id,))]
+    db.close()
+    yield user_id, subject_id, card_ids
+    sampler._samplers.clear()
+
+
+def test_other_workers_see_answers_and_card_changes(bank):
+    user_id, subject_id, card_ids = bank
+    assert len(sampler.sample_cards(user_id, subject_id, 5)) == 5
+    quizzes.record_reviews(user_id, [(card_ids[0], 1), (card_ids[1], 5)])
+
+    # a worker that never drew: loads the stored bank, then reads the answers back
+    sampler._samplers.clear()
+    sampler.sample_cards(user_id, subject_id, 1)
+    loaded = sampler._samplers[(user_id, subject_id)]
+    weights = [loaded.weights[loaded.position(card_id)] for card_id in card_ids[:3]]
+    assert weights == pytest.approx([2 / 3 * sampler.MIN_RECENCY, 1 / 3 * sampler.MIN_RECENCY, 0.5])
+    assert loaded.tree.total() == pytest.approx(sum(loaded.weights))
+
+    # cards changed elsewhere: the stale bank is rebuilt in the background
+    db = database.get_db(user_id)
+    database.bump_card_version(db, user_id)
+    db.commit()
+    db.close()
+    sampler.sample_cards(user_id, subject_id, 1)
+    deadline = time.monotonic() + 5
+    while sampler._samplers[(user_id, subject_id)] is loaded and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sampler._samplers[(user_id, subject_id)].version == loaded.version + 1
@@ -0,0 +1,43 @@
+# test_search.py
+#
+# build_match on awkward user input, run against a scratch FTS5 table with
+# the same tokenizer as the real indexes (search.py).
+import sqlite3
+
+import pytest
+
+from search import build_match
+
+ROWS = [(1, "integrals by parts"), (2, 'quoted foo"bar here'), (3, 'say "hi there'), (4, "c++ draft x")]
+
+# (query, prefix, ids of ROWS it must find)
+CASES = [
+    ("integrals", False, {1}),
+    ("integ", True, {1}),
+    ("integ*", False, {1}),
+    ('foo"bar', False, {2}),
+    ('"foo"bar"', False, {2}),
+    ('say "hi', False, {3}),
+    ("AND OR NOT", False, set()),
+    ("notes: NEAR(a b)", False, set()),
+    ("c++ (draft) -x", False, {4}),
+    ('* " **', False, set()),
+]
+
+
+@pytest.fixture(scope="module")
+def fts():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE VIRTUAL TABLE t USING fts5(notes, tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+    conn.executemany("INSERT INTO t (rowid, notes) VALUES (?, ?)", ROWS)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("query, prefix, expected", CASES)
+def test_build_match(fts, query, prefix, expected):
+    match = build_match(query, prefix)
+    found = set()
+    if match:
+        found = {row[0] for row in fts.execute("SELECT rowid FROM t WHERE t MATCH ?", (f"notes : ({match})",))}
+    assert found == expected, match
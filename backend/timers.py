@@ -0,0 +1,379 @@
+# timers.py
+#
+# Live study timers: start, heartbeat, pause, resume, stop.
+#
+# Each user has at most one timer, held in this process's memory. Open timer
+# pages send a heartbeat every few seconds; a heartbeat only moves the
+# timer's last_beat under a lock and never touches SQLite. A running timer
+# counts time up to its last beat (or up to the stop or pause), so a closed
+# tab stops counting by itself.
+#
+# Persistence, in live_timers on the global shard:
+#   - start, pause and resume write the timer's row through (they are rare)
+#   - a worker thread checkpoints, every settings.timer_checkpoint_s, the
+#     last_beat of timers that beat since the previous checkpoint, in one
+#     executemany
+#   - recover() reloads the rows at startup, so a crash loses at most one
+#     checkpoint interval of heartbeats
+#
+# Stop, or settings.timer_idle_timeout_s without a heartbeat (checked by
+# the same worker), turns the timer into one study_sessions row through the
+# storage layer, so linked goals and leaderboards follow as for POST
+# /study/. The time is rounded to whole minutes, and under half a minute
+# leaves no session. The timer's row is deleted first, and an idle timer is
+# finalized only if its row holds no newer beat than this process has seen,
+# so a timer becomes a session at most once, however many processes
+# recovered it. Heartbeats must reach the process holding the timer: run
+# one API worker, or route each user to the same worker.
+#
+#   python timers.py list        # checkpointed timers
+#   python timers.py sweep       # finalize idle checkpointed timers (e.g. with the API down)
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import analytics
+import database
+import metrics
+import planner
+from config import settings
+from storage import get_storage
+
+COLUMNS = "user_id, subject_id, notes, started_at, elapsed_s, segment_start, last_beat"
+
+
+class AlreadyRunning(Exception):
+    pass
+
+
+class NoTimer(Exception):
+    pass
+
+
+class Timer:
+    """One user's timer. Times are epoch seconds (time.time()), so they outlive the process."""
+
+    __slots__ = ("user_id", "subject_id", "notes", "started_at", "elapsed", "segment_start", "last_beat", "beaten")
+
+    def __init__(self, user_id: int, subject_id: int, notes: Optional[str], started_at: str,
+                 elapsed: float, segment_start: Optional[float], last_beat: float):
+        self.user_id = user_id
+        self.subject_id = subject_id
+        self.notes = notes
+        self.started_at = started_at
+        self.elapsed = elapsed              # counted before the current run
+        self.segment_start = segment_start  # start of the current run; None while paused
+        self.last_beat = last_beat
+        self.beaten = False                 # heartbeats since the last checkpoint
+
+    @property
+    def running(self) -> bool:
+        return self.segment_start is not None
+
+    def counted(self, until: float) -> float:
+        """Seconds counted if the timer ended at `until`."""
+        if not self.running:
+            return self.elapsed
+        return self.elapsed + max(0.0, until - self.segment_start)
+
+    def describe(self, now: float) -> Dict:
+        return {
+            "subject_id": self.subject_id,
+            "notes": self.notes,
+            "started_at": self.started_at,
+            "state": "running" if self.running else "paused",
+            "elapsed_seconds": int(self.counted(now)),
+        }
+
+    def row(self) -> tuple:
+        return (self.user_id, self.subject_id, self.notes, self.started_at,
+                self.elapsed, self.segment_start, self.last_beat)
+
+
+_timers: Dict[int, Timer] = {}
+_lock = threading.Lock()     # _timers and the timers in it; held for memory updates only
+_io_lock = threading.Lock()  # keeps live_timers writes in the order of the changes they record
+
+
+def _persistent() -> bool:
+    return settings.storage_backend == "sqlite" and settings.timer_checkpoint_s > 0
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _save(row: tuple):
+    if not _persistent():
+        return
+    db = database.get_db()
+    try:
+        db.execute(f"INSERT OR REPLACE INTO live_timers ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _claim(timers: List[Timer], idle: bool) -> List[Timer]:
+    """
+    Deletes the timers' rows; returns the timers this process may finalize.
+    An idle timer whose row has a newer beat is alive elsewhere and is left alone.
+    """
+    if not _persistent():
+        return timers
+    db = database.get_db()
+    try:
+        claimed = []
+        for timer in timers:
+            if idle:
+                cursor = db.execute("DELETE FROM live_timers WHERE user_id = ? AND last_beat <= ?",
+                                    (timer.user_id, timer.last_beat))
+            else:
+                cursor = db.execute("DELETE FROM live_timers WHERE user_id = ?", (timer.user_id,))
+            if cursor.rowcount or not idle:
+                claimed.append(timer)
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+
+def _restore(timer: Timer):
+    """Put back a timer whose session could not be written, so it is finalized later."""
+    with _io_lock:
+        with _lock:
+            _timers.setdefault(timer.user_id, timer)
+        _save(timer.row())
+
+
+def _finalize(timer: Timer, seconds: float, reason: str) -> Dict:
+    minutes = round(seconds / 60)
+    session_id = None
+    try:
+        if minutes >= 1:
+            session_id = get_storage().create_session(timer.user_id, timer.subject_id, minutes, timer.notes)
+            planner.record_session(timer.user_id, minutes, timer.subject_id)
+            analytics.invalidate(timer.user_id)
+    except Exception:
+        _restore(timer)
+        raise
+    metrics.registry.timer_finalized(reason)
+    return {"session_id": session_id, "duration": minutes, "elapsed_seconds": int(seconds)}
+
+
+# ────────────────────────────────────────────────
+# Timer operations
+# ────────────────────────────────────────────────
+def start(user_id: int, subject_id: int, notes: Optional[str] = None) -> Dict:
+    now = time.time()
+    with _io_lock:
+        with _lock:
+            if user_id in _timers:
+                raise AlreadyRunning()
+            timer = _timers[user_id] = Timer(user_id, subject_id, notes, _utc_now(), 0.0, now, now)
+        try:
+            _save(timer.row())
+        except Exception:
+            with _lock:
+                _timers.pop(user_id, None)
+            raise
+    return timer.describe(now)
+
+
+def heartbeat(user_id: int) -> Dict:
+    """Memory only; checkpoint() saves the latest beat."""
+    now = time.time()
+    with _lock:
+        timer = _timers.get(user_id)
+        if timer is None:
+            raise NoTimer()
+        timer.last_beat = now
+        timer.beaten = True
+        return timer.describe(now)
+
+
+def _change(user_id: int, running: bool) -> Dict:
+    now = time.time()
+    with _io_lock:
+        with _lock:
+            timer = _timers.get(user_id)
+            if timer is None:
+                raise NoTimer()
+            if timer.running and not running:
+                timer.elapsed = timer.counted(now)
+                timer.segment_start = None
+            elif running and not timer.running:
+                timer.segment_start = now
+            timer.last_beat = now
+            row, described = timer.row(), timer.describe(now)
+        _save(row)
+    return described
+
+
+def pause(user_id: int) -> Dict:
+    return _change(user_id, running=False)
+
+
+def resume(user_id: int) -> Dict:
+    return _change(user_id, running=True)
+
+
+def stop(user_id: int) -> Dict:
+    """Ends the timer; {session_id (None if under half a minute), duration in minutes, elapsed_seconds}."""
+    now = time.time()
+    with _io_lock:
+        with _lock:
+            timer = _timers.pop(user_id, None)
+            if timer is None:
+                raise NoTimer()
+        try:
+            _claim([timer], idle=False)
+        except Exception:
+            with _lock:
+                _timers.setdefault(user_id, timer)
+            raise
+    return _finalize(timer, timer.counted(now), "stop")
+
+
+def current(user_id: int) -> Dict:
+    with _lock:
+        timer = _timers.get(user_id)
+        if timer is None:
+            raise NoTimer()
+        return timer.describe(time.time())
+
+
+def discard(user_id: int):
+    """Forget the user's timer without a session (the user was deleted)."""
+    with _lock:
+        _timers.pop(user_id, None)
+
+
+# ────────────────────────────────────────────────
+# Checkpoints, idle timeout, recovery
+# ────────────────────────────────────────────────
+def checkpoint() -> int:
+    """Saves the last beat of timers that beat since the previous checkpoint; returns how many."""
+    started = time.perf_counter()
+    beats = []
+    with _io_lock:
+        with _lock:
+            active = len(_timers)
+            for timer in _timers.values():
+                if timer.beaten:
+                    beats.append((timer.last_beat, timer.user_id))
+                    timer.beaten = False
+        if beats and _persistent():
+            db = database.get_db()
+            try:
+                db.executemany("UPDATE live_timers SET last_beat = ? WHERE user_id = ?", beats)
+                db.commit()
+            except Exception:
+                with _lock:
+                    for _, user_id in beats:
+                        if user_id in _timers:
+                            _timers[user_id].beaten = True
+                raise
+            finally:
+                db.close()
+    metrics.registry.timer_checkpoint(active, time.perf_counter() - started)
+    return len(beats)
+
+
+def sweep(now: Optional[float] = None) -> int:
+    """Finalizes timers without a heartbeat for settings.timer_idle_timeout_s; returns how many."""
+    now = time.time() if now is None else now
+    cutoff = now - settings.timer_idle_timeout_s
+    with _io_lock:
+        with _lock:
+            idle = [timer for timer in _timers.values() if timer.last_beat < cutoff]
+            for timer in idle:
+                del _timers[timer.user_id]
+        try:
+            claimed = _claim(idle, idle=True)
+        except Exception:
+            with _lock:
+                for timer in idle:
+                    _timers.setdefault(timer.user_id, timer)
+            raise
+
+    finalized = 0
+    for timer in claimed:
+        try:
+            _finalize(timer, timer.counted(timer.last_beat), "idle")
+            finalized += 1
+        except Exception as e:
+            # _finalize put it back; the next sweep tries again
+            print(f"Timer of user {timer.user_id}: {e}", file=sys.stderr)
+    return finalized
+
+
+def recover() -> int:
+    """Loads the checkpointed timers (at startup); returns how many."""
+    if not _persistent():
+        return 0
+    db = database.get_db()
+    try:
+        rows = db.execute(f"SELECT {COLUMNS} FROM live_timers").fetchall()
+    finally:
+        db.close()
+    with _lock:
+        for row in rows:
+            _timers.setdefault(row["user_id"], Timer(*row))
+    return len(rows)
+
+
+_worker: Optional[threading.Thread] = None
+
+
+def start_worker():
+    """Checkpoints and sweeps on a daemon thread."""
+    global _worker
+    if _worker is not None:
+        return
+    intervals = [settings.timer_checkpoint_s, settings.timer_idle_timeout_s / 4]
+    tick = min(i for i in intervals if i > 0)
+
+    def loop():
+        last_checkpoint = time.monotonic()
+        while True:
+            time.sleep(tick)
+            try:
+                if _persistent() and time.monotonic() - last_checkpoint >= settings.timer_checkpoint_s:
+                    last_checkpoint = time.monotonic()
+                    checkpoint()
+                sweep()
+            except Exception as e:
+                # e.g. the database was locked past the busy timeout; try again next tick
+                print(f"Timer worker: {e}", file=sys.stderr)
+
+    _worker = threading.Thread(target=loop, name="timer-worker", daemon=True)
+    _worker.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live study timers")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list")
+    commands.add_parser("sweep")
+    args = parser.parse_args()
+    database.init_db()
+
+    if args.command == "list":
+        recover()
+        now = time.time()
+        with _lock:
+            rows = [dict(timer.describe(now), user_id=timer.user_id, idle_seconds=int(now - timer.last_beat))
+                    for timer in _timers.values()]
+        print(json.dumps(rows, indent=2))
+    elif args.command == "sweep":
+        recover()
+        print(f"finalized {sweep()} idle timer(s)")
+
+
+if __name__ == "__main__":
+    main()
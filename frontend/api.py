@@ -0,0 +1,7 @@
+# api.py
+#
+# Where the pages find the backend. Override with STUDY_API_BASE, e.g.
+#   STUDY_API_BASE=http://api.internal:8000 streamlit run app.py
+import os
+
+API_BASE = os.environ.get("STUDY_API_BASE", "http://127.0.0.1:8000").rstrip("/")
@@ -1,7 +1,7 @@
 import streamlit as st
 import requests
 
-API_BASE = "http://127.0.0.1:8000"
+from api import API_BASE
 
 st.title("Welcome to Study & Goal Manager!")
 st.markdown("Log in or create an account.")
@@ -1,9 +1,7 @@
 import streamlit as st
 import requests
-import pandas as pd
-import matplotlib.pyplot as plt
 
-API_BASE = "http://127.0.0.1:8000"
+from api import API_BASE
 
 # ────────────────────────────────────────────────
 # Auto-login for development (remove later)
@@ -19,18 +17,24 @@ if "user_id" not in st.session_state:
 user_id = st.session_state["user_id"]
 
 # ────────────────────────────────────────────────
-# Fetch subjects for name mapping
+# Fetch everything the page shows in one request
 # ────────────────────────────────────────────────
+PAGE_SIZE = 50
+
 subject_map = {}
+sessions = []
+stats = None
 try:
-    r = requests.get(f"{API_BASE}/subjects/")
+    r = requests.get(f"{API_BASE}/dashboard", params={"limit": PAGE_SIZE}, headers={"X-User-Id": str(user_id)})
     if r.status_code == 200:
-        subjects = r.json()
-        subject_map = {s["id"]: s["name"] for s in subjects}
+        dashboard = r.json()
+        subject_map = {s["id"]: s["name"] for s in dashboard["subjects"]}
+        sessions = dashboard["sessions"]
+        stats = dashboard["stats"]
     else:
-        st.warning("Could not load subject names")
+        st.error(f"Could not load the dashboard ({r.status_code})")
 except Exception as e:
-    st.warning(f"Error loading subjects: {e}")
+    st.error(f"Connection error: {e}")
 
 # ────────────────────────────────────────────────
 # Sidebar with logout
@@ -46,6 +50,31 @@ with st.sidebar:
 st.title("Study Dashboard")
 st.caption(f"User ID: {user_id}")
 
+# ────────────────────────────────────────────────
+# Search notes and goals
+# ────────────────────────────────────────────────
+query = st.text_input("Search your notes and goals", placeholder="e.g. derivatives")
+if query.strip():
+    try:
+        r = requests.get(
+            f"{API_BASE}/search",
+            params={"q": query, "prefix": True},
+            headers={"X-User-Id": str(user_id)}
+        )
+        if r.status_code == 200:
+            results = r.json()
+            if not results["sessions"] and not results["goals"]:
+                st.info("No matches.")
+            for hit in results["goals"]:
+                st.markdown(f"🎯 {hit['title']} ({hit['type']} goal)")
+            for hit in results["sessions"]:
+                subject = subject_map.get(hit["subject_id"], hit["subject_id"])
+                st.markdown(f"📝 {hit['session_date'][:16]} • {subject} • {hit['duration']} min — {hit['snippet']}")
+        else:
+            st.warning(f"Search failed ({r.status_code})")
+    except Exception as e:
+        st.warning(f"Search error: {e}")
+
 # ────────────────────────────────────────────────
 # Add new study session form
 # ────────────────────────────────────────────────
@@ -90,23 +119,14 @@ with st.form("new_session_form", clear_on_submit=True):
             except Exception as e:
                 st.error(f"Could not reach the API: {e}")
 
-# ────────────────────────────────────────────────
-# Fetch sessions
-# ────────────────────────────────────────────────
-sessions = []
-try:
-    r = requests.get(f"{API_BASE}/study", headers={"X-User-Id": str(user_id)})
-    if r.status_code == 200:
-        sessions = r.json() if isinstance(r.json(), list) else r.json().get("sessions", [])
-    else:
-        st.error(f"Could not load sessions ({r.status_code})")
-except Exception as e:
-    st.error(f"Connection error: {e}")
-
 # ────────────────────────────────────────────────
 # Display sessions
 # ────────────────────────────────────────────────
 if sessions:
+    # pandas and matplotlib are imported where they are first needed, so
+    # the page (and users without sessions or charts) doesn't pay for them
+    import pandas as pd
+
     df = pd.DataFrame(sessions)
     df["session_date"] = pd.to_datetime(df["session_date"])
     df = df.sort_values("session_date", ascending=False)
@@ -128,14 +148,15 @@ if sessions:
         use_container_width=True
     )
 
+    if stats["sessions"] > len(sessions):
+        st.caption(f"Latest {len(sessions)} of {stats['sessions']} sessions")
+
     # Stats
-    total_min = int(df["duration"].sum())
-    session_count = len(df)
     last_session = df["session_date"].max().strftime("%d.%m.%Y %H:%M")
 
     c1, c2, c3 = st.columns(3)
-    c1.metric("Total time", f"{total_min} min")
-    c2.metric("Sessions", session_count)
+    c1.metric("Total time", f"{stats['total_minutes']} min")
+    c2.metric("Sessions", stats["sessions"])
     c3.metric("Last session", last_session)
 
     # ────────────────────────────────────────────────-
@@ -143,56 +164,62 @@ if sessions:
     # ────────────────────────────────────────────────-
     st.subheader("Progress Charts")
 
-    # Bar chart - dark gray bars, off-white background
-    time_by_subject = df.groupby("subject_name")["duration"].sum().reset_index()
-
-    fig1, ax1 = plt.subplots(figsize=(12, 6))
-    ax1.bar(time_by_subject["subject_name"], time_by_subject["duration"], color="#202020", width=0.5)
-    ax1.set_title("Total Study Time per Subject", fontsize=25, pad=25)
-    ax1.set_xlabel("Subject", fontsize=15, labelpad=12)
-    ax1.set_ylabel("Minutes", fontsize=15, labelpad=12)
-    ax1.tick_params(axis='both', which='major', labelsize=11)
-
-    # Darker background
-    ax1.set_facecolor("#B3B1B1")
-    fig1.set_facecolor("#B3B1B1")
-
-    # Clean spines
-    ax1.spines['top'].set_visible(False)
-    ax1.spines['right'].set_visible(False)
-    ax1.spines['left'].set_color("#000000")
-    ax1.spines['bottom'].set_color("#000000")
-
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    st.pyplot(fig1)
-
-    # Line chart - dark line, light fill, off-white background
-    daily = df.groupby(df["session_date"].dt.date)["duration"].sum().reset_index()
-    daily["session_date"] = pd.to_datetime(daily["session_date"])
-
-    fig2, ax2 = plt.subplots(figsize=(14, 6))
-    ax2.plot(daily["session_date"], daily["duration"], color="#020A1B", linewidth=3)
-    ax2.fill_between(daily["session_date"], daily["duration"], color="#000000", alpha=0.5)
-
-    ax2.set_title("Daily Study Time", fontsize=25, pad=25)
-    ax2.set_xlabel("Date", fontsize=1, labelpad=12)
-    ax2.set_ylabel("Minutes", fontsize=15, labelpad=12)
-    ax2.tick_params(axis='both', which='major', labelsize=11)
-
-    # Darker background
-    ax2.set_facecolor('#f8f9fa')
-    fig2.set_facecolor('#f8f9fa')
-
-    # Clean spines
-    ax2.spines['top'].set_visible(False)
-    ax2.spines['right'].set_visible(False)
-    ax2.spines['left'].set_color("#000000")
-    ax2.spines['bottom'].set_color("#000000")
-
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    st.pyplot(fig2)
+    if st.toggle("Show progress charts", key="show_charts"):
+        import matplotlib.pyplot as plt
+
+        # Bar chart - dark gray bars, off-white background
+        subject_names = [subject_map.get(s["subject_id"], str(s["subject_id"])) for s in stats["subjects"]]
+        subject_minutes = [s["minutes"] for s in stats["subjects"]]
+
+        fig1, ax1 = plt.subplots(figsize=(12, 6))
+        ax1.bar(subject_names, subject_minutes, color="#202020", width=0.5)
+        ax1.set_title("Total Study Time per Subject", fontsize=25, pad=25)
+        ax1.set_xlabel("Subject", fontsize=15, labelpad=12)
+        ax1.set_ylabel("Minutes", fontsize=15, labelpad=12)
+        ax1.tick_params(axis='both', which='major', labelsize=11)
+
+        # Darker background
+        ax1.set_facecolor("#B3B1B1")
+        fig1.set_facecolor("#B3B1B1")
+
+        # Clean spines
+        ax1.spines['top'].set_visible(False)
+        ax1.spines['right'].set_visible(False)
+        ax1.spines['left'].set_color("#000000")
+        ax1.spines['bottom'].set_color("#000000")
+
+        plt.xticks(rotation=45, ha='right')
+        plt.tight_layout()
+        st.pyplot(fig1)
+
+        # Line chart - dark line, light fill, off-white background
+        days = pd.to_datetime([d["date"] for d in stats["daily"]])
+        daily_minutes = [d["minutes"] for d in stats["daily"]]
+
+        fig2, ax2 = plt.subplots(figsize=(14, 6))
+        ax2.plot(days, daily_minutes, color="#020A1B", linewidth=3)
+        ax2.fill_between(days, daily_minutes, color="#000000", alpha=0.5)
+        ax2.plot(days, [d["rolling_avg"] for d in stats["daily"]], color="#6c757d", linewidth=2, label="7-day average")
+        ax2.legend(frameon=False)
+
+        ax2.set_title(f"Daily Study Time (last {len(days)} days)", fontsize=25, pad=25)
+        ax2.set_xlabel("Date", fontsize=1, labelpad=12)
+        ax2.set_ylabel("Minutes", fontsize=15, labelpad=12)
+        ax2.tick_params(axis='both', which='major', labelsize=11)
+
+        # Darker background
+        ax2.set_facecolor('#f8f9fa')
+        fig2.set_facecolor('#f8f9fa')
+
+        # Clean spines
+        ax2.spines['top'].set_visible(False)
+        ax2.spines['right'].set_visible(False)
+        ax2.spines['left'].set_color("#000000")
+        ax2.spines['bottom'].set_color("#000000")
+
+        plt.xticks(rotation=45, ha='right')
+        plt.tight_layout()
+        st.pyplot(fig2)
 
 else:
     st.info("No study sessions yet. Add your first one above.")
@@ -2,7 +2,7 @@ import streamlit as st
 import requests
 from datetime import datetime
 
-API_BASE = "http://127.0.0.1:8000"
+from api import API_BASE
 
 # Auto-login fallback (remove later)
 if "user_id" not in st.session_state:
@@ -25,16 +25,43 @@ with st.sidebar:
 
 st.title("My Goals")
 
-# Fetch goals
+# Fetch goals, and subjects for goals that track study time, in one request
+GOALS_PAGE = 200
+
 goals = []
+subjects = []
 try:
-    r = requests.get(f"{API_BASE}/goals/", headers={"X-User-Id": str(user_id)})
+    r = requests.get(f"{API_BASE}/dashboard", params={"limit": GOALS_PAGE, "days": 1},
+                     headers={"X-User-Id": str(user_id)})
     if r.status_code == 200:
-        goals = r.json()
-    else:
+        dashboard = r.json()
+        goals = dashboard["goals"]
+        subjects = dashboard["subjects"]
+        if dashboard["goals_total"] > len(goals):
+            r = requests.get(f"{API_BASE}/goals/", headers={"X-User-Id": str(user_id)})
+            if r.status_code == 200:
+                goals = r.json()
+    if r.status_code != 200:
         st.error(f"Could not load goals ({r.status_code})")
 except Exception as e:
     st.error(f"Connection error: {e}")
+subject_names = {s["id"]: s["name"] for s in subjects}
+
+# Completion forecasts for all milestone goals (cached server-side until a write)
+forecasts = {}
+try:
+    r = requests.get(f"{API_BASE}/goals/forecast", headers={"X-User-Id": str(user_id)})
+    if r.status_code == 200:
+        forecasts = {f["goal_id"]: f for f in r.json()}
+except Exception:
+    pass  # badges are optional
+
+BADGES = {
+    "on_track": "🟢 On track",
+    "at_risk": "🟠 At risk",
+    "overdue": "🔴 Overdue",
+    "done": "✅ Done",
+}
 
 # ────────────────────────────────────────────────
 # Add Milestone Goal
@@ -43,7 +70,13 @@ with st.expander("Add Milestone Goal", expanded=False):
     with st.form("add_milestone_form"):
         title = st.text_input("Goal Title", placeholder="e.g. Finish Python course")
         category = st.selectbox("Category", options=["Study", "Health", "Productivity", "Other"], index=0)
-        progress = st.slider("Current Progress (%)", 0, 100, 0)
+        linked_subject = st.selectbox(
+            "Track study time for subject (optional)",
+            options=[None] + list(subject_names),
+            format_func=lambda sid: "— set progress by hand —" if sid is None else subject_names[sid]
+        )
+        target_minutes = st.number_input("Target minutes (for a tracked subject)", min_value=1, value=600, step=30)
+        progress = st.slider("Current Progress (%)", 0, 100, 0, help="Ignored when tracking a subject")
         target_date = st.date_input("Target Date (optional)", value=None)
 
         submitted = st.form_submit_button("Create Milestone Goal", type="primary")
@@ -56,7 +89,9 @@ with st.expander("Add Milestone Goal", expanded=False):
                     "category": category,
                     "progress": progress,
                     "target_date": str(target_date) if target_date else None,
-                    "type": "milestone"
+                    "type": "milestone",
+                    "subject_id": linked_subject,
+                    "target_minutes": int(target_minutes) if linked_subject is not None else None
                 }
                 r = requests.post(f"{API_BASE}/goals/", json=payload, headers={"X-User-Id": str(user_id)})
                 if r.status_code in (200, 201):
@@ -74,6 +109,7 @@ with st.expander("Add Daily Goal", expanded=False):
     with st.form("add_daily_form"):
         title = st.text_input("Daily Goal Title", placeholder="e.g. Drink 2L of water")
         category = st.selectbox("Category", options=["Study", "Health", "Productivity", "Other"], index=0)
+        remind_at = st.time_input("Remind me at (optional, if not done yet)", value=None, step=900)
 
         submitted = st.form_submit_button("Create Daily Goal", type="primary")
 
@@ -85,7 +121,8 @@ with st.expander("Add Daily Goal", expanded=False):
                     "category": category,
                     "progress": 0,
                     "target_date": None,
-                    "type": "daily"
+                    "type": "daily",
+                    "remind_at": remind_at.strftime("%H:%M") if remind_at else None
                 }
                 r = requests.post(f"{API_BASE}/goals/", json=payload, headers={"X-User-Id": str(user_id)})
                 if r.status_code in (200, 201):
@@ -126,8 +163,30 @@ if goals:
             else:
                 color = "#4CAF50"  # green
 
+            linked = goal.get("subject_id") is not None
+
             st.markdown(f"**{title}** ({category}) — Target: {target}")
-            st.progress(progress / 100, text=f"{progress}%")
+            forecast = forecasts.get(goal["id"])
+            if forecast and forecast["status"] in BADGES:
+                detail = ""
+                if forecast["estimated_completion"]:
+                    detail = f" — expected {forecast['estimated_completion']} at {forecast['pace']:.0f} min/day"
+                if forecast["status"] == "at_risk" and forecast["required_pace"]:
+                    detail += f", needs {forecast['required_pace']:.0f} min/day"
+                if forecast["basis"] == "overall" and detail:
+                    detail += " (estimated from all your study)"
+                st.caption(BADGES[forecast["status"]] + detail)
+            elif forecast and forecast["status"] == "no_deadline" and forecast["estimated_completion"]:
+                estimated = " (estimated from all your study)" if forecast["basis"] == "overall" else ""
+                st.caption(f"Expected {forecast['estimated_completion']} at {forecast['pace']:.0f} min/day{estimated}")
+            if linked:
+                subject = subject_names.get(goal["subject_id"], f"Subject {goal['subject_id']}")
+                st.progress(
+                    progress / 100,
+                    text=f"{progress}% — {goal.get('logged_minutes', 0)} / {goal['target_minutes']} min of {subject}"
+                )
+            else:
+                st.progress(progress / 100, text=f"{progress}%")
 
             # Custom color override
             st.markdown(
@@ -158,7 +217,15 @@ if goals:
                             index=["Study", "Health", "Productivity", "Other"].index(category) if category in ["Study", "Health", "Productivity", "Other"] else 0,
                             key=f"cat_{goal['id']}"
                         )
-                        new_progress = st.slider("Progress (%)", 0, 100, progress, key=f"prog_{goal['id']}")
+                        if linked:
+                            new_progress = progress  # ignored by the API: follows logged study time
+                            new_target_minutes = st.number_input(
+                                "Target minutes", min_value=1, value=int(goal["target_minutes"]),
+                                step=30, key=f"tmin_{goal['id']}"
+                            )
+                        else:
+                            new_progress = st.slider("Progress (%)", 0, 100, progress, key=f"prog_{goal['id']}")
+                            new_target_minutes = None
                         new_target = st.date_input(
                             "Target Date",
                             value=datetime.strptime(goal['target_date'], "%Y-%m-%d") if goal['target_date'] and goal['target_date'] != "No deadline" else None,
@@ -174,7 +241,8 @@ if goals:
                                         "title": new_title,
                                         "category": new_category,
                                         "progress": new_progress,
-                                        "target_date": str(new_target) if new_target else None
+                                        "target_date": str(new_target) if new_target else None,
+                                        "target_minutes": new_target_minutes
                                     }
                                     r = requests.put(f"{API_BASE}/goals/{goal['id']}", json=payload, headers={"X-User-Id": str(user_id)})
                                     if r.status_code in (200, 204):
@@ -217,7 +285,8 @@ if goals:
 
             done_today = last_done == datetime.now().date().isoformat()
 
-            st.markdown(f"**{title}** ({category}) — Streak: **{streak}** 🔥")
+            st.markdown(f"**{title}** ({category}) — Streak: **{streak}** 🔥"
+                        + (f" — reminder at {goal['remind_at']}" if goal.get("remind_at") else ""))
 
             if done_today:
                 st.success("Done today ✓")
@@ -250,6 +319,12 @@ if goals:
                             index=["Study", "Health", "Productivity", "Other"].index(category) if category in ["Study", "Health", "Productivity", "Other"] else 0,
                             key=f"cat_{goal['id']}"
                         )
+                        new_remind_at = st.time_input(
+                            "Remind me at (optional)",
+                            value=datetime.strptime(goal["remind_at"], "%H:%M").time() if goal.get("remind_at") else None,
+                            step=900,
+                            key=f"remind_{goal['id']}"
+                        )
 
                         col_save, col_cancel = st.columns(2)
                         with col_save:
@@ -260,7 +335,8 @@ if goals:
                                         "title": new_title,
                                         "category": new_category,
                                         "progress": 0,
-                                        "target_date": None
+                                        "target_date": None,
+                                        "remind_at": new_remind_at.strftime("%H:%M") if new_remind_at else ""
                                     }
                                     r = requests.put(f"{API_BASE}/goals/{goal['id']}", json=payload, headers={"X-User-Id": str(user_id)})
                                     if r.status_code in (200, 204):
@@ -0,0 +1,208 @@
+import streamlit as st
+import requests
+
+from api import API_BASE
+
+# Auto-login fallback (remove later)
+if "user_id" not in st.session_state:
+    st.session_state["user_id"] = 1
+    st.info("Dev mode: auto-logged in as user ID 1")
+
+if "user_id" not in st.session_state:
+    st.warning("Please log in first.")
+    st.stop()
+
+user_id = st.session_state["user_id"]
+headers = {"X-User-Id": str(user_id)}
+
+# Sidebar
+with st.sidebar:
+    st.markdown(f"**Logged in** as User ID: {user_id}")
+    if st.button("Log out", type="secondary", use_container_width=True):
+        st.session_state.clear()
+        st.switch_page("app.py")
+        st.rerun()
+
+st.title("Quizzes")
+
+# ────────────────────────────────────────────────
+# Fetch subjects and decks
+# ────────────────────────────────────────────────
+subject_map = {}
+decks = []
+try:
+    r = requests.get(f"{API_BASE}/subjects/")
+    if r.status_code == 200:
+        subject_map = {s["id"]: s["name"] for s in r.json()}
+    r = requests.get(f"{API_BASE}/decks/", headers=headers)
+    if r.status_code == 200:
+        decks = r.json()
+    else:
+        st.error(f"Could not load decks ({r.status_code})")
+except Exception as e:
+    st.error(f"Connection error: {e}")
+
+# ────────────────────────────────────────────────
+# Add deck / card
+# ────────────────────────────────────────────────
+with st.expander("New Deck", expanded=not decks):
+    with st.form("add_deck_form", clear_on_submit=True):
+        name = st.text_input("Deck name", placeholder="e.g. Derivatives")
+        if subject_map:
+            subject_name = st.selectbox("Subject", options=list(subject_map.values()))
+            subject_id = next((k for k, v in subject_map.items() if v == subject_name), 1)
+        else:
+            subject_id = st.number_input("Subject ID (fallback)", min_value=1, value=1)
+
+        if st.form_submit_button("Create Deck", type="primary") and name.strip():
+            try:
+                r = requests.post(
+                    f"{API_BASE}/decks/",
+                    json={"subject_id": subject_id, "name": name.strip()},
+                    headers=headers
+                )
+                if r.status_code == 201:
+                    st.success("Deck created!")
+                    st.rerun()
+                else:
+                    st.error(r.text)
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+if decks:
+    with st.expander("Add Card", expanded=False):
+        with st.form("add_card_form", clear_on_submit=True):
+            deck_labels = {f"{d['name']} ({subject_map.get(d['subject_id'], d['subject_id'])})": d["id"] for d in decks}
+            deck_label = st.selectbox("Deck", options=list(deck_labels.keys()))
+            front = st.text_area("Question", height=80)
+            back = st.text_area("Answer", height=80)
+
+            if st.form_submit_button("Add Card", type="primary") and front.strip() and back.strip():
+                try:
+                    r = requests.post(
+                        f"{API_BASE}/decks/{deck_labels[deck_label]}/cards",
+                        json={"front": front.strip(), "back": back.strip()},
+                        headers=headers
+                    )
+                    if r.status_code == 201:
+                        st.success("Card added!")
+                        st.rerun()
+                    else:
+                        st.error(r.text)
+                except Exception as e:
+                    st.error(f"Error: {e}")
+
+    st.subheader("Your Decks")
+    for deck in decks:
+        subject = subject_map.get(deck["subject_id"], deck["subject_id"])
+        col1, col2 = st.columns([3, 1])
+        col1.markdown(f"**{deck['name']}** ({subject}) — {deck['card_count']} cards, {deck['due_count']} due")
+        confirm = col2.checkbox("Confirm delete", key=f"confirm_deck_{deck['id']}")
+        if col2.button("Delete", disabled=not confirm, key=f"del_deck_{deck['id']}"):
+            try:
+                r = requests.delete(f"{API_BASE}/decks/{deck['id']}", headers=headers)
+                if r.status_code in (200, 204):
+                    st.success("Deck deleted!")
+                    st.rerun()
+                else:
+                    st.error(r.text)
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+# ────────────────────────────────────────────────
+# Review session
+#
+# Grades are collected locally and sent as one batch when the queue is
+# finished (or when the user stops early).
+# ────────────────────────────────────────────────
+st.subheader("Review")
+
+if "review_queue" not in st.session_state:
+    st.session_state["review_queue"] = []
+    st.session_state["review_grades"] = []
+    st.session_state["review_revealed"] = False
+
+
+def submit_grades():
+    grades = st.session_state["review_grades"]
+    if not grades:
+        return
+    try:
+        r = requests.post(f"{API_BASE}/quizzes/reviews", json=grades, headers=headers)
+        if r.status_code == 200:
+            st.success(f"Saved {len(grades)} reviews.")
+            st.session_state["review_grades"] = []
+        else:
+            st.error(r.text)
+    except Exception as e:
+        st.error(f"Error saving reviews: {e}")
+
+
+queue = st.session_state["review_queue"]
+
+if not queue:
+    submit_grades()
+    if st.button("Start Review", type="primary", disabled=not decks):
+        try:
+            r = requests.get(f"{API_BASE}/quizzes/due", params={"limit": 20}, headers=headers)
+            if r.status_code == 200:
+                st.session_state["review_queue"] = r.json()
+                st.session_state["review_revealed"] = False
+                if not r.json():
+                    st.info("Nothing due right now. Come back later!")
+                else:
+                    st.rerun()
+            else:
+                st.error(r.text)
+        except Exception as e:
+            st.error(f"Error: {e}")
+
+    # Practice draws cards weighted toward past mistakes, whether due or not
+    practice_subjects = {subject_map.get(d["subject_id"], str(d["subject_id"])): d["subject_id"] for d in decks}
+    if practice_subjects:
+        col1, col2 = st.columns([3, 1])
+        practice_name = col1.selectbox("Practice a subject", options=list(practice_subjects.keys()))
+        practice_n = col2.number_input("Questions", min_value=1, max_value=100, value=10)
+        if st.button("Start Practice"):
+            try:
+                r = requests.get(
+                    f"{API_BASE}/quizzes/practice",
+                    params={"subject_id": practice_subjects[practice_name], "n": practice_n},
+                    headers=headers
+                )
+                if r.status_code == 200:
+                    st.session_state["review_queue"] = r.json()
+                    st.session_state["review_revealed"] = False
+                    if not r.json():
+                        st.info("No cards for this subject yet.")
+                    else:
+                        st.rerun()
+                else:
+                    st.error(r.text)
+            except Exception as e:
+                st.error(f"Error: {e}")
+else:
+    card = queue[0]
+    st.caption(f"{len(queue)} card(s) left in this round")
+    st.markdown(f"### {card['front']}")
+
+    if not st.session_state["review_revealed"]:
+        if st.button("Show Answer", type="primary"):
+            st.session_state["review_revealed"] = True
+            st.rerun()
+    else:
+        st.markdown(card["back"])
+        st.caption("How well did you remember it?")
+        labels = ["Blackout", "Wrong", "Hard wrong", "Hard", "Good", "Easy"]
+        cols = st.columns(6)
+        for grade, (col, label) in enumerate(zip(cols, labels)):
+            if col.button(f"{grade} · {label}", key=f"grade_{card['id']}_{grade}"):
+                st.session_state["review_grades"].append({"card_id": card["id"], "grade": grade})
+                st.session_state["review_queue"] = queue[1:]
+                st.session_state["review_revealed"] = False
+                st.rerun()
+
+    if st.button("Stop and save", type="secondary"):
+        st.session_state["review_queue"] = []
+        submit_grades()
+        st.rerun()
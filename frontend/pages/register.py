@@ -2,7 +2,7 @@ import streamlit as st
 import requests
 
 
-API_BASE = "http://127.0.0.1:8000"
+from api import API_BASE
 
 st.title("Create Account")
 
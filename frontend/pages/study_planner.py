@@ -0,0 +1,98 @@
+import streamlit as st
+import requests
+
+from api import API_BASE
+
+# Auto-login fallback (remove later)
+if "user_id" not in st.session_state:
+    st.session_state["user_id"] = 1
+    st.info("Dev mode: auto-logged in as user ID 1")
+
+if "user_id" not in st.session_state:
+    st.warning("Please log in first.")
+    st.stop()
+
+user_id = st.session_state["user_id"]
+
+# Sidebar
+with st.sidebar:
+    st.markdown(f"**Logged in** as User ID: {user_id}")
+    if st.button("Log out", type="secondary", use_container_width=True):
+        st.session_state.clear()
+        st.switch_page("app.py")
+        st.rerun()
+
+st.title("Study Planner")
+st.caption("Open milestone goals scheduled earliest deadline first.")
+
+# ────────────────────────────────────────────────
+# Plan settings
+# ────────────────────────────────────────────────
+with st.expander("Plan settings", expanded=False):
+    use_pace = st.checkbox("Use my recent study pace as daily availability", value=True)
+    daily_minutes = st.number_input(
+        "Daily availability (minutes)", min_value=0, step=15, value=60, disabled=use_pace
+    )
+    goal_minutes = st.number_input(
+        "Estimated effort per goal (minutes)", min_value=30, step=30, value=600
+    )
+    days = st.slider("Days to show", 7, 60, 14)
+
+params = {"goal_minutes": goal_minutes, "days": days}
+if not use_pace:
+    params["daily_minutes"] = daily_minutes
+
+# ────────────────────────────────────────────────
+# Fetch plan
+# ────────────────────────────────────────────────
+plan = None
+try:
+    r = requests.get(f"{API_BASE}/planner/", params=params, headers={"X-User-Id": str(user_id)})
+    if r.status_code == 200:
+        plan = r.json()
+    else:
+        st.error(f"Could not load plan ({r.status_code})")
+except Exception as e:
+    st.error(f"Connection error: {e}")
+
+if plan:
+    goals = plan["goals"]
+
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Daily availability", f"{plan['daily_minutes']} min")
+    c2.metric("Open goals", len(goals))
+    c3.metric("At risk", sum(1 for g in goals if not g["on_track"]))
+
+    if not goals:
+        st.info("No open milestone goals. Add one on the Goals page.")
+    else:
+        # ────────────────────────────────────────────────
+        # Goal outlook
+        # ────────────────────────────────────────────────
+        st.subheader("Goal Outlook")
+        st.dataframe(
+            [
+                {
+                    "Goal": g["title"],
+                    "Target": g["target_date"] or "No deadline",
+                    "Remaining": f"{g['remaining_minutes']} min",
+                    "Planned finish": g["finish_date"] or "Beyond a year",
+                    "Status": "On track" if g["on_track"] else "At risk",
+                }
+                for g in goals
+            ],
+            hide_index=True,
+            use_container_width=True
+        )
+
+        # ────────────────────────────────────────────────
+        # Day-by-day schedule
+        # ────────────────────────────────────────────────
+        st.subheader("Schedule")
+        if not plan["days"]:
+            st.info("Nothing scheduled in this window. Increase your daily availability.")
+        for day in plan["days"]:
+            total = sum(b["minutes"] for b in day["blocks"])
+            with st.expander(f"{day['date']} • {total} min", expanded=day is plan["days"][0]):
+                for block in day["blocks"]:
+                    st.markdown(f"- **{block['title']}** — {block['minutes']} min")